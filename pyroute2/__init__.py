@@ -8,12 +8,14 @@
 import sys
 import struct
 import logging
+from pyroute2 import config
 from pyroute2.ipdb.exceptions import (DeprecationException,
                                       CommitException,
                                       CreateException,
                                       PartialCommitException)
 from pyroute2.netlink.exceptions import (NetlinkError,
-                                         NetlinkDecodeError)
+                                         NetlinkDecodeError,
+                                         NetlinkTimeoutError)
 from pyroute2.netlink.rtnl.req import (IPRouteRequest,
                                        IPLinkRequest)
 from pyroute2.iproute import (IPRoute,
@@ -49,6 +51,17 @@ try:
     HAS_CONSOLE = True
 except ImportError:
     HAS_CONSOLE = False
+#
+# The pool works on top of the Linux IPRoute only
+if config.uname[0] == 'Linux':
+    from pyroute2.iproute import IPRoutePool
+#
+# The asyncio API requires Python >= 3.6
+try:
+    from pyroute2.iproute.aio import AsyncIPRoute
+    HAS_ASYNCIO = True
+except (ImportError, SyntaxError):
+    HAS_ASYNCIO = False
 
 
 log = logging.getLogger(__name__)
@@ -76,6 +89,7 @@ except:
 # reexport exceptions
 exceptions = [NetlinkError,
               NetlinkDecodeError,
+              NetlinkTimeoutError,
               DeprecationException,
               CommitException,
               CreateException,
@@ -113,6 +127,12 @@ if HAS_CONSOLE:
 else:
     log.warning("Couldn't import the Console class")
 
+if config.uname[0] == 'Linux':
+    classes.append(IPRoutePool)
+
+if HAS_ASYNCIO:
+    classes.append(AsyncIPRoute)
+
 __all__ = []
 
 
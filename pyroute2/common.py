@@ -485,6 +485,73 @@ class AddrPool(object):
                 self.addr_map[base] ^= 1 << bit
 
 
+class SeqPool(object):
+    '''
+    Sequence number pool for the request path, the same API as
+    `AddrPool`, but O(1): numbers are allocated from a ring, so
+    a freed number is reused as late as possible, and banned
+    numbers are released by the alloc() counter buckets w/o scans.
+
+    * minaddr, maxaddr -- the range, inclusive
+    * release -- ban every allocated number for so many allocs,
+      no need to call free()
+    * callback -- is called with the number, when its ban ends
+    '''
+
+    def __init__(self,
+                 minaddr=0xf,
+                 maxaddr=0xffffff,
+                 release=False,
+                 callback=None):
+        if release and not isinstance(release, int):
+            raise TypeError()
+        self.minaddr = minaddr
+        self.maxaddr = maxaddr
+        self.release = release
+        self.callback = callback
+        self.size = maxaddr - minaddr + 1
+        self.cursor = minaddr
+        self.used = set()
+        self.ban = {}       # {alloc counter: [addr, ...]}
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    @property
+    def allocated(self):
+        return len(self.used)
+
+    def alloc(self):
+        with self.lock:
+            self.counter += 1
+            released = self.ban.pop(self.counter, ())
+            for addr in released:
+                self.used.discard(addr)
+            if len(self.used) >= self.size:
+                raise KeyError('no free address available')
+            addr = self.cursor
+            while addr in self.used:
+                addr = addr + 1 if addr < self.maxaddr else self.minaddr
+            self.cursor = addr + 1 if addr < self.maxaddr else self.minaddr
+            self.used.add(addr)
+            if self.release:
+                self.ban.setdefault(self.counter + self.release,
+                                    []).append(addr)
+        # run the callback w/o the lock
+        if self.callback is not None:
+            for banned in released:
+                self.callback(banned)
+        return addr
+
+    def free(self, addr, ban=0):
+        with self.lock:
+            if addr not in self.used:
+                raise KeyError('address is not allocated')
+            if ban != 0:
+                self.ban.setdefault(self.counter + ban, []).append(addr)
+            else:
+                self.used.discard(addr)
+
+
 def _fnv1_python2(data):
     '''
     FNV1 -- 32bit hash, python2 version
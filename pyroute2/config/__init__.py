@@ -9,6 +9,8 @@ MpQueue = multiprocessing.Queue
 MpProcess = multiprocessing.Process
 ipdb_nl_async = True
 nlm_generator = False
+# free-list size per message class, see nlmsg_base.release()
+nlm_pool_size = 1024
 
 commit_barrier = 0
 gc_timeout = 60
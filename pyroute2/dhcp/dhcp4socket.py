@@ -3,7 +3,7 @@ IPv4 DHCP socket
 ================
 
 '''
-from pyroute2.common import AddrPool
+from pyroute2.common import SeqPool
 from pyroute2.protocols import udpmsg
 from pyroute2.protocols import udp4_pseudo_header
 from pyroute2.protocols import ethmsg
@@ -52,7 +52,7 @@ class DHCP4Socket(RawSocket):
         #
         # Every allocated xid will be released automatically after 1024
         # alloc() calls, there is no need to call free(). Minimal xid == 16
-        self.xid_pool = AddrPool(minaddr=16, release=1024)
+        self.xid_pool = SeqPool(minaddr=16, release=1024)
 
     def __enter__(self):
         return self
@@ -1150,8 +1150,9 @@ class InterfacesDict(Dotkeys):
         self._event_map = {'RTM_NEWLINK': self._new,
                            'RTM_DELLINK': self._del}
 
-    def _register(self):
-        links = self.ipdb.nl.get_links()
+    def _register(self, links=None):
+        if links is None:
+            links = self.ipdb.nl.get_links()
         # iterate twice to map port/master relations
         for link in links:
             self._new(link, skip_master=True)
@@ -1162,6 +1163,20 @@ class InterfacesDict(Dotkeys):
         for link in links:
             self._new(link)
 
+    def _resync(self):
+        # reload the interfaces and detach the ones, that
+        # were removed while the events were lost
+        links = self.ipdb.nl.get_links()
+        self._register(links)
+        indices = set([x['index'] for x in links])
+        for index in [x for x in self.keys() if isinstance(x, int)]:
+            target = self.get(index)
+            if index in indices or target is None or \
+                    getattr(target, '_freeze', None) or \
+                    target.get('ipdb_scope') != 'system':
+                continue
+            self._detach(None, index)
+
     def add(self, kind, ifname, reuse=False, **kwarg):
         '''
         Create new network interface
@@ -1347,6 +1362,9 @@ class AddressesDict(dict):
         for msg in self.ipdb.nl.get_addr():
             self._new(msg)
 
+    def _resync(self):
+        self.reload()
+
     def reload(self):
         # Reload addresses from the kernel.
         # (This is a workaround to reorder primary and secondary addresses.)
@@ -1405,6 +1423,16 @@ class NeighboursDict(dict):
         for msg in self.ipdb.nl.get_neighbours():
             self._new(msg)
 
+    def _resync(self):
+        msgs = self.ipdb.nl.get_neighbours()
+        present = set([(x['ifindex'], x.get_attr('NDA_DST')) for x in msgs])
+        for (index, neighbours) in tuple(self.items()):
+            for key in tuple(neighbours):
+                if (index, key) not in present:
+                    neighbours.remove(key)
+        for msg in msgs:
+            self._new(msg)
+
     def _new(self, msg):
         if msg['family'] == AF_BRIDGE:
             return
@@ -715,7 +715,10 @@ from pyroute2 import config
 from pyroute2.common import uuid32
 from pyroute2.common import basestring
 from pyroute2.iproute import IPRoute
+from pyroute2.netlink import NLMSG_OVERRUN
+from pyroute2.netlink import rtnl
 from pyroute2.netlink.rtnl import RTM_GETLINK, RTMGRP_DEFAULTS
+from pyroute2.netlink.nlsocket import CallbackIndex
 from pyroute2.netlink.rtnl.ifinfmsg import ifinfmsg
 from pyroute2.ipdb import rules
 from pyroute2.ipdb import routes
@@ -731,25 +734,38 @@ log = logging.getLogger(__name__)
 
 
 class Watchdog(object):
+    # the names to index the watchdogs by, see `CallbackIndex`
+    index_keys = ('ifname', 'index', 'dst', 'table')
+
     def __init__(self, ipdb, action, kwarg):
         self.event = threading.Event()
         self.is_set = False
         self.ipdb = ipdb
 
-        def cb(ipdb, msg, _action):
-            if _action != action:
-                return
+        def predicate(msg):
+            if msg.get('event') != action:
+                return False
 
             for key in kwarg:
                 if (msg.get(key, None) != kwarg[key]) and \
                         (msg.get_attr(msg.name2nla(key)) != kwarg[key]):
-                    return
+                    return False
+            return True
 
+        def cb(msg):
             self.is_set = True
             self.event.set()
         self.cb = cb
-        # register callback prior to other things
-        self.uuid = self.ipdb.register_callback(self.cb)
+        # index the watchdog by the message type and one of the
+        # keys, so only the relevant watchdogs are checked
+        key = None
+        for name in self.index_keys:
+            if isinstance(kwarg.get(name), (int, basestring)):
+                key = (name, kwarg[name])
+                break
+        # watchdogs run prior to other callbacks
+        self.ipdb._watchdogs.append((predicate, cb, (),
+                                     getattr(rtnl, action, None), key))
 
     def wait(self, timeout=SYNC_TIMEOUT):
         ret = self.event.wait(timeout=timeout)
@@ -757,7 +773,7 @@ class Watchdog(object):
         return ret
 
     def cancel(self):
-        self.ipdb.unregister_callback(self.uuid)
+        self.ipdb._watchdogs.remove(self.cb)
 
 
 class _evq_context(object):
@@ -847,6 +863,7 @@ class IPDB(object):
         # see also 'register_callback'
         self._post_callbacks = {}
         self._pre_callbacks = {}
+        self._watchdogs = CallbackIndex()
 
         # local event queues
         # - callbacks event queue
@@ -950,6 +967,8 @@ class IPDB(object):
                 if self.nl is not None:
                     self.nl.close()
                 self.nl = IPRoute(sndbuf=self._sndbuf, rcvbuf=self._rcvbuf)
+                # restart the initial dumps torn by concurrent changes
+                self.nl.dump_retries = 3
             # setup monitoring socket
             if self.mnl is not None:
                 self._flush_mnl()
@@ -988,6 +1007,22 @@ class IPDB(object):
                     tx.setDaemon(True)
                     tx.start()
 
+    def _resync(self, groups):
+        # Some events of the groups are lost, so reload the
+        # affected objects instead of the complete initdb()
+        log.warning('Resync IPDB objects after the socket overrun')
+        for module in self._plugins:
+            if not module.groups & groups:
+                continue
+            for plugin in module.spec:
+                if plugin['name'] not in self._loaded:
+                    continue
+                obj = getattr(self, plugin['name'])
+                if hasattr(obj, '_resync'):
+                    obj._resync()
+                elif hasattr(obj, '_register'):
+                    obj._register()
+
     def __getattribute__(self, name):
         deferred = super(IPDB, self).__getattribute__('_deferred')
         if name in deferred:
@@ -1382,6 +1417,12 @@ class IPDB(object):
                 return
             elif isinstance(msg, Exception):
                 raise msg
+            for cr in self._watchdogs.match(msg):
+                try:
+                    if cr[0](msg):
+                        cr[1](msg, *cr[2])
+                except:
+                    pass
             for cb in tuple(self._post_callbacks.values()):
                 try:
                     cb(self, msg, msg['event'])
@@ -1437,6 +1478,8 @@ class IPDB(object):
 
                 with self.exclusive:
                     event = msg.get('event', None)
+                    if msg['header'].get('type') == NLMSG_OVERRUN:
+                        self._resync(msg['groups'])
                     if event in self._event_map:
                         for func in self._event_map[event]:
                             func(msg)
@@ -9,6 +9,8 @@ so several classes with almost the same API are available:
     * `IPRoute` -- simple RTNL API
     * `NetNS` -- RTNL API in a network namespace
     * `IPBatch` -- RTNL packet compiler
+    * `AsyncIPRoute` -- RTNL API as coroutines, see `pyroute2.iproute.aio`
+    * `IPRoutePool` -- thread safe pool of `IPRoute` sockets
     * `ShellIPR` -- run RTNL in a (remote) shell
 
 Responses as lists
@@ -134,6 +136,7 @@ from pyroute2.iproute.linux import IPBatch
 if config.uname[0] == 'Linux':
     from pyroute2.iproute.linux import IPRoute
     from pyroute2.iproute.linux import RawIPRoute
+    from pyroute2.iproute.pool import IPRoutePool
 elif config.uname[0][-3:] == 'BSD':
     from pyroute2.iproute.bsd import IPRoute
     from pyroute2.iproute.bsd import RawIPRoute
@@ -144,3 +147,6 @@ classes = [RTNL_API,
            IPBatch,
            IPRoute,
            RawIPRoute]
+
+if config.uname[0] == 'Linux':
+    classes.append(IPRoutePool)
@@ -0,0 +1,153 @@
+'''
+AsyncIPRoute
+------------
+
+`AsyncIPRoute` provides the `RTNL_API` methods as coroutines,
+running over an `AsyncNetlinkSocket`::
+
+    import asyncio
+    from pyroute2 import AsyncIPRoute
+
+    async def main():
+        ipr = AsyncIPRoute()
+        for link in await ipr.get_links():
+            print(link.get_attr('IFLA_IFNAME'))
+        await ipr.addr('add', index=1, address='10.0.0.1', mask=24)
+        ipr.close()
+
+    asyncio.get_event_loop().run_until_complete(main())
+
+The methods are the same `RTNL_API` code: a method runs once, in
+a thread of the loop's default executor, and every request of the
+method is sent and awaited in the event loop, so the socket itself
+is used from the loop only. Most methods send only one request.
+
+The methods accept a `timeout` for the whole method, all the
+requests included, and fail with `NetlinkTimeoutError` on expiry::
+
+    await ipr.route('add', dst='10.0.0.0/24', gateway='10.1.0.1',
+                    timeout=0.5)
+
+Broadcast messages are available via `events()`::
+
+    ipr.bind()
+    async for msg in ipr.events():
+        ...
+
+.. note::
+    The module requires Python >= 3.6
+'''
+import types
+import asyncio
+import concurrent.futures
+
+from pyroute2.iproute.linux import RTNL_API
+from pyroute2.netlink import NLM_F_DUMP
+from pyroute2.netlink import NLM_F_REQUEST
+from pyroute2.netlink.aio import AsyncNetlinkSocket
+from pyroute2.netlink.exceptions import NetlinkTimeoutError
+from pyroute2.netlink.rtnl.iprsocket import IPRSocketMixin
+
+
+class RTNLProxy(RTNL_API):
+    '''
+    Run an `RTNL_API` method in an executor thread; the requests
+    are sent by the socket in the event loop
+    '''
+
+    def __init__(self, sock, loop):
+        super(RTNLProxy, self).__init__()
+        self.sock = sock
+        self.loop = loop
+        self.pending = None
+        self.cancelled = False
+
+    def call(self, coro):
+        # is called in the executor thread: run the coroutine
+        # in the loop and wait for the result
+        if self.cancelled:
+            coro.close()
+            raise concurrent.futures.CancelledError()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        self.pending = future
+        if self.cancelled:
+            future.cancel()
+        try:
+            return future.result()
+        finally:
+            self.pending = None
+
+    def cancel(self):
+        # is called in the loop: stop the method on the next request
+        self.cancelled = True
+        pending = self.pending
+        if pending is not None:
+            pending.cancel()
+
+    def nlm_request(self, msg, msg_type,
+                    msg_flags=NLM_F_REQUEST | NLM_F_DUMP,
+                    terminate=None,
+                    callback=None,
+                    nla_filter=None,
+                    msg_filter=None):
+        return self.call(self.sock.nlm_request(msg, msg_type, msg_flags,
+                                               terminate, callback,
+                                               nla_filter, msg_filter))
+
+    def nlm_stream(self, *argv, **kwarg):
+        # the whole response is awaited anyway
+        return self.nlm_request(*argv, **kwarg)
+
+    async def _put(self, *argv, **kwarg):
+        return self.sock.put(*argv, **kwarg)
+
+    def put(self, *argv, **kwarg):
+        return self.call(self._put(*argv, **kwarg))
+
+    def invoke(self, name, argv, kwarg):
+        ret = getattr(self, name)(*argv, **kwarg)
+        if isinstance(ret, types.GeneratorType):
+            ret = tuple(ret)
+        return ret
+
+    async def run(self, name, *argv, **kwarg):
+        try:
+            return await self.loop.run_in_executor(None, self.invoke,
+                                                   name, argv, kwarg)
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+
+
+class AsyncIPRSocket(IPRSocketMixin, AsyncNetlinkSocket):
+    pass
+
+
+def rtnl_coroutine(name):
+
+    async def method(self, *argv, **kwarg):
+        timeout = kwarg.pop('timeout', None)
+        proxy = RTNLProxy(self, asyncio.get_event_loop())
+        if timeout is None:
+            return await proxy.run(name, *argv, **kwarg)
+        try:
+            return await asyncio.wait_for(proxy.run(name, *argv, **kwarg),
+                                          timeout)
+        except asyncio.TimeoutError:
+            raise NetlinkTimeoutError('%s expired' % name)
+
+    method.__name__ = name
+    method.__doc__ = getattr(RTNL_API, name).__doc__
+    return method
+
+
+class AsyncIPRoute(AsyncIPRSocket):
+    '''
+    `RTNL_API` methods as coroutines, see the module docs
+    '''
+    pass
+
+
+for name in dir(RTNL_API):
+    if not name.startswith('_') and callable(getattr(RTNL_API, name)):
+        setattr(AsyncIPRoute, name, rtnl_coroutine(name))
@@ -70,7 +70,7 @@ from pyroute2.netlink.rtnl.ifinfmsg import ifinfmsg
 from pyroute2.netlink.rtnl.ifaddrmsg import ifaddrmsg
 from pyroute2.netlink.rtnl.ndmsg import ndmsg
 from pyroute2.netlink.rtnl.rtmsg import rtmsg
-from pyroute2.common import AddrPool
+from pyroute2.common import SeqPool
 from pyroute2.common import Namespace
 from pyroute2.proxy import NetlinkProxy
 try:
@@ -90,7 +90,7 @@ class IPRoute(object):
         self._arp = ARP(cmd=self._ssh + ['arp', '-an'])
         self._route = Route(cmd=self._ssh + ['netstat', '-rn'])
         self.marshal = MarshalRtnl()
-        send_ns = Namespace(self, {'addr_pool': AddrPool(0x10000, 0x1ffff),
+        send_ns = Namespace(self, {'addr_pool': SeqPool(0x10000, 0x1ffff),
                                    'monitor': False})
         self._sproxy = NetlinkProxy(policy='return', nl=send_ns)
         self._mon_th = None
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import types
+import errno
 import logging
 from socket import AF_INET
 from socket import AF_INET6
@@ -16,6 +17,8 @@ from pyroute2.netlink import NLM_F_DUMP
 from pyroute2.netlink import NLM_F_CREATE
 from pyroute2.netlink import NLM_F_EXCL
 from pyroute2.netlink import NLM_F_APPEND
+from pyroute2.netlink.columns import Columns
+from pyroute2.netlink.exceptions import NetlinkError
 from pyroute2.netlink.rtnl import RTM_NEWADDR
 from pyroute2.netlink.rtnl import RTM_GETADDR
 from pyroute2.netlink.rtnl import RTM_DELADDR
@@ -116,12 +119,13 @@ class RTNL_API(object):
         ipr.link('set', index=dev, state='up')
     '''
     def __init__(self, *argv, **kwarg):
+        # the generator version is used by streamed requests
+        self._genmatch = self._match
         if not config.nlm_generator:
 
             def _match(*argv, **kwarg):
                 return tuple(self._genmatch(*argv, **kwarg))
 
-            self._genmatch = self._match
             self._match = _match
 
         super(RTNL_API, self).__init__(*argv, **kwarg)
@@ -129,45 +133,149 @@ class RTNL_API(object):
     def _match(self, match, msgs):
         # filtered results, the generator version
         for msg in msgs:
-            if hasattr(match, '__call__'):
-                if match(msg):
-                    yield msg
-            elif isinstance(match, dict):
-                matches = []
-                for key in match:
-                    KEY = msg.name2nla(key)
-                    if isinstance(match[key], types.FunctionType):
-                        if msg.get(key) is not None:
-                            matches.append(match[key](msg.get(key)))
-                        elif msg.get_attr(KEY) is not None:
-                            matches.append(match[key](msg.get_attr(KEY)))
-                        else:
-                            matches.append(False)
+            if self._match_msg(match, msg):
+                yield msg
+
+    def _match_msg(self, match, msg):
+        if hasattr(match, '__call__'):
+            return match(msg)
+        elif isinstance(match, dict):
+            matches = []
+            for key in match:
+                KEY = msg.name2nla(key)
+                if isinstance(match[key], types.FunctionType):
+                    if msg.get(key) is not None:
+                        matches.append(match[key](msg.get(key)))
+                    elif msg.get_attr(KEY) is not None:
+                        matches.append(match[key](msg.get_attr(KEY)))
                     else:
-                        matches.append(msg.get(key) == match[key] or
-                                       msg.get_attr(KEY) ==
-                                       match[key])
-                if all(matches):
-                    yield msg
+                        matches.append(False)
+                else:
+                    matches.append(msg.get(key) == match[key] or
+                                   msg.get_attr(KEY) ==
+                                   match[key])
+            return all(matches)
+        return False
+
+    def _msg_filter(self, match, columns=None):
+        # the dict match works on lazy message views as well,
+        # so apply it before decoding, see `Marshal.parse()`;
+        # columns take the data and drop the messages
+        if columns is not None:
+            def msg_filter(msg):
+                if match and not self._match_msg(match, msg):
+                    return False
+                return columns.append(msg)
+            # restarted dumps drop the collected rows, see nlm_request()
+            rows = columns.rows
+            msg_filter.reset = lambda: columns.truncate(rows)
+            return msg_filter
+        if isinstance(match, dict) and match:
+            return lambda msg: self._match_msg(match, msg)
+        return None
+
+    def _columns(self, msg, columns):
+        if columns is None or isinstance(columns, Columns):
+            return columns
+        return Columns(type(msg), columns)
+
+    def _nla_filter(self, msg, nla_filter, match=None):
+        # NLA names to decode in the response, see `nlm_request()`;
+        # NLA used by the dict match are decoded as well
+        if nla_filter is None:
+            return None
+        ret = set([msg.name2nla(x) for x in nla_filter])
+        if isinstance(match, dict):
+            ret.update([msg.name2nla(x) for x in match])
+        return ret
+
+    def _dump_request(self, msg, match=None, fields=(), nla=()):
+        # the dump request, that passes the kernel strict check,
+        # see `NETLINK_GET_STRICT_CHK` in `NetlinkSocket`: only the
+        # family, the listed header fields and NLA are kept, and
+        # the kernel filters the dump by them; the values are
+        # taken from the message or from the dict match
+        #
+        # the kernels without the strict check ignore the filters,
+        # so the client-side match is applied to the dump anyway
+        if not isinstance(match, dict):
+            match = {}
+        req = type(msg)()
+        for field in req.fields:
+            req[field[0]] = 0
+        req['family'] = msg['family']
+        for name in fields:
+            value = msg[name] or match.get(name)
+            if isinstance(value, int):
+                req[name] = value
+        req['attrs'] = []
+        for name in nla:
+            NLA = req.name2nla(name)
+            value = msg.get_attr(NLA)
+            if value is None:
+                value = match.get(name, match.get(NLA))
+            if isinstance(value, int) and value:
+                req['attrs'].append([NLA, value])
+        return req
+
+    def _nlm_dump(self, msg, stream=False, **kwarg):
+        # dumps filtered by a missing interface fail with ENODEV,
+        # return nothing instead, like the client-side match; with
+        # `config.nlm_generator` the error is raised on iteration
+        if stream:
+            return self._nlm_dump_stream(self.nlm_stream, msg, **kwarg)
+        if config.nlm_generator:
+            return self._nlm_dump_stream(self.nlm_request, msg, **kwarg)
+        try:
+            return self.nlm_request(msg, **kwarg)
+        except NetlinkError as e:
+            if e.code != errno.ENODEV or \
+                    kwarg['msg_flags'] & NLM_F_DUMP != NLM_F_DUMP:
+                raise
+            return ()
+
+    def _nlm_dump_stream(self, request, msg, **kwarg):
+        try:
+            for msg in request(msg, **kwarg):
+                yield msg
+        except NetlinkError as e:
+            if e.code != errno.ENODEV or \
+                    kwarg['msg_flags'] & NLM_F_DUMP != NLM_F_DUMP:
+                raise
+
+    def _request(self, msg, stream=False, **kwarg):
+        # with `stream` the response is a generator, regardless
+        # of `config.nlm_generator`, see `NetlinkMixin.nlm_stream()`
+        if stream:
+            return self.nlm_stream(msg, **kwarg)
+        return self.nlm_request(msg, **kwarg)
+
+    def _stream(self, match, ret):
+        # the streamed response, filtered by the match
+        if match:
+            return self._genmatch(match, ret)
+        return ret
 
     # 8<---------------------------------------------------------------
     #
     # Listing methods
     #
-    def get_qdiscs(self, index=None):
+    def get_qdiscs(self, index=None, stream=False):
         '''
         Get all queue disciplines for all interfaces or for specified
         one.
         '''
         msg = tcmsg()
         msg['family'] = AF_UNSPEC
-        ret = self.nlm_request(msg, RTM_GETQDISC)
+        ret = self._request(msg, stream, msg_type=RTM_GETQDISC)
         if index is None:
             return ret
+        elif stream:
+            return (x for x in ret if x['index'] == index)
         else:
             return [x for x in ret if x['index'] == index]
 
-    def get_filters(self, index=0, handle=0, parent=0):
+    def get_filters(self, index=0, handle=0, parent=0, stream=False):
         '''
         Get filters for specified interface, handle and parent.
         '''
@@ -176,16 +284,16 @@ class RTNL_API(object):
         msg['index'] = index
         msg['handle'] = handle
         msg['parent'] = parent
-        return self.nlm_request(msg, RTM_GETTFILTER)
+        return self._request(msg, stream, msg_type=RTM_GETTFILTER)
 
-    def get_classes(self, index=0):
+    def get_classes(self, index=0, stream=False):
         '''
         Get classes for specified interface.
         '''
         msg = tcmsg()
         msg['family'] = AF_UNSPEC
         msg['index'] = index
-        return self.nlm_request(msg, RTM_GETTCLASS)
+        return self._request(msg, stream, msg_type=RTM_GETTCLASS)
 
     def get_vlans(self, **kwarg):
         '''
@@ -201,11 +309,13 @@ class RTNL_API(object):
         #
         # maybe place it as mapping into ifinfomsg.py?
         #
+        stream = kwarg.pop('stream', False)
         match = kwarg.get('match', None) or kwarg or None
         return self.link('dump',
                          family=AF_BRIDGE,
                          ext_mask=2,
-                         match=match)
+                         match=match,
+                         stream=stream)
 
     def get_links(self, *argv, **kwarg):
         '''
@@ -221,8 +331,36 @@ class RTNL_API(object):
 
             interfaces = [1, 2, 3]
             ip.get_links(*interfaces)
+
+        The `nla_filter` keyword limits the decoded NLA, the
+        rest of the NLA are skipped by the decoder; NLA names
+        can be used in the short form::
+
+            ip.get_links(nla_filter=('ifname', 'stats64'))
+
+        The same keyword is accepted by `get_addr()`,
+        `get_routes()` and `get_neighbours()`.
+
+        With the `columns` keyword the methods return the data
+        as `pyroute2.netlink.columns.Columns`, without decoding
+        the messages::
+
+            ip.get_links(columns=('index', 'ifname', 'mtu'))
+
+        With `stream=True` the dump methods return a generator,
+        regardless of `config.nlm_generator`. The messages are
+        decoded as they are received, so only one receive buffer
+        is kept in memory. The consumer may stop early, then the
+        rest of the dump is dropped, see `NetlinkMixin.nlm_stream()`::
+
+            for route in ip.get_routes(stream=True):
+                if route.get_attr('RTA_DST') == '10.0.0.0':
+                    break
         '''
         result = []
+        if kwarg.get('columns') is not None:
+            result = kwarg['columns'] = self._columns(ifinfmsg(),
+                                                      kwarg['columns'])
         links = argv or [0]
         if links[0] == 'all':  # compat syntax
             links = [0]
@@ -232,12 +370,25 @@ class RTNL_API(object):
         else:
             cmd = 'get'
 
+        if kwarg.get('stream') and kwarg.get('columns') is None:
+
+            def stream():
+                for index in links:
+                    kwarg['index'] = index
+                    for msg in self.link(cmd, **kwarg):
+                        yield msg
+            return stream()
+
         for index in links:
             kwarg['index'] = index
-            result.extend(self.link(cmd, **kwarg))
+            ret = self.link(cmd, **kwarg)
+            if ret is not result:
+                result.extend(ret)
         return result
 
-    def get_neighbours(self, family=AF_UNSPEC, match=None, **kwarg):
+    def get_neighbours(self, family=AF_UNSPEC, match=None,
+                       nla_filter=None, columns=None, stream=False,
+                       **kwarg):
         '''
         Dump ARP cache records.
 
@@ -263,17 +414,23 @@ class RTNL_API(object):
             # and filter them by a function:
             ip.get_neighbours(AF_BRIDGE, match=lambda x: x['state'] == 2)
         '''
-        return self.neigh('dump', family=family, match=match or kwarg)
-
-    def get_ntables(self, family=AF_UNSPEC):
+        return self.neigh('dump',
+                          family=family,
+                          match=match or kwarg,
+                          nla_filter=nla_filter,
+                          columns=columns,
+                          stream=stream)
+
+    def get_ntables(self, family=AF_UNSPEC, stream=False):
         '''
         Get neighbour tables
         '''
         msg = ndtmsg()
         msg['family'] = family
-        return self.nlm_request(msg, RTM_GETNEIGHTBL)
+        return self._request(msg, stream, msg_type=RTM_GETNEIGHTBL)
 
-    def get_addr(self, family=AF_UNSPEC, match=None, **kwarg):
+    def get_addr(self, family=AF_UNSPEC, match=None,
+                 nla_filter=None, columns=None, stream=False, **kwarg):
         '''
         Dump addresses.
 
@@ -300,9 +457,15 @@ class RTNL_API(object):
 
             ip.get_addr(match=lambda x: x['index'] == 1)
         '''
-        return self.addr('dump', family=family, match=match or kwarg)
+        return self.addr('dump',
+                         family=family,
+                         match=match or kwarg,
+                         nla_filter=nla_filter,
+                         columns=columns,
+                         stream=stream)
 
-    def get_rules(self, family=AF_UNSPEC, match=None, **kwarg):
+    def get_rules(self, family=AF_UNSPEC, match=None, stream=False,
+                  **kwarg):
         '''
         Get all rules. By default return all rules. To explicitly
         request the IPv4 rules use `family=AF_INET`.
@@ -314,14 +477,21 @@ class RTNL_API(object):
         return self.rule((RTM_GETRULE,
                           NLM_F_REQUEST | NLM_F_ROOT | NLM_F_ATOMIC),
                          family=family,
-                         match=match or kwarg)
+                         match=match or kwarg,
+                         stream=stream)
 
-    def get_routes(self, family=255, match=None, **kwarg):
+    def get_routes(self, family=255, match=None,
+                   nla_filter=None, columns=None, stream=False, **kwarg):
         '''
         Get all routes. You can specify the table. There
-        are 255 routing classes (tables), and the kernel
-        returns all the routes on each request. So the
-        routine filters routes from full output.
+        are 255 routing classes (tables); the routine filters
+        routes from the kernel output. With the strict dump
+        check, `IPRoute(strict_check=True)` on kernels >= 4.20,
+        the `table` and `oif` filters are applied by the kernel
+        as well, so only the matching routes are transferred.
+        Please notice, that strict route dumps include the route
+        exceptions (the cached routes) only with
+        `flags=RTM_F_CLONED`, like `ip route show cache`.
 
         Example::
 
@@ -337,25 +507,34 @@ class RTNL_API(object):
         '''
         # get a particular route?
         if isinstance(kwarg.get('dst'), basestring):
-            return self.route('get', dst=kwarg['dst'])
+            return self.route('get',
+                              dst=kwarg['dst'],
+                              nla_filter=nla_filter,
+                              columns=columns,
+                              stream=stream)
         else:
             return self.route('dump',
                               family=family,
-                              match=match or kwarg)
+                              match=match or kwarg,
+                              nla_filter=nla_filter,
+                              columns=columns,
+                              stream=stream)
     # 8<---------------------------------------------------------------
 
     # 8<---------------------------------------------------------------
     #
     # Shortcuts
     #
-    def get_default_routes(self, family=AF_UNSPEC, table=DEFAULT_TABLE):
+    def get_default_routes(self, family=AF_UNSPEC, table=DEFAULT_TABLE,
+                           stream=False):
         '''
         Get default routes
         '''
         # according to iproute2/ip/iproute.c:print_route()
-        return [x for x in self.get_routes(family, table=table)
-                if (x.get_attr('RTA_DST', None) is None and
-                    x['dst_len'] == 0)]
+        ret = (x for x in self.get_routes(family, table=table, stream=stream)
+               if (x.get_attr('RTA_DST', None) is None and
+                   x['dst_len'] == 0))
+        return ret if stream else list(ret)
 
     def link_lookup(self, **kwarg):
         '''
@@ -456,6 +635,7 @@ class RTNL_API(object):
         Possible keywords are NLA names for the `protinfo_bridge` class,
         without the prefix and in lower letters.
         '''
+        stream = kwarg.pop('stream', False)
         if (command in ('dump', 'show')) and ('match' not in kwarg):
             match = kwarg
         else:
@@ -476,9 +656,11 @@ class RTNL_API(object):
         msg['family'] = AF_BRIDGE
         protinfo = IPBrPortRequest(kwarg)
         msg['attrs'].append(('IFLA_PROTINFO', protinfo, 0x8000))
-        ret = self.nlm_request(msg,
-                               msg_type=command,
-                               msg_flags=msg_flags)
+        ret = self._request(msg, stream,
+                            msg_type=command,
+                            msg_flags=msg_flags)
+        if stream:
+            return self._stream(match, ret)
         if match is not None:
             ret = self._match(match, ret)
 
@@ -762,6 +944,9 @@ class RTNL_API(object):
 
             ip.neigh('dump')
         '''
+        nla_filter = kwarg.pop('nla_filter', None)
+        columns = kwarg.pop('columns', None)
+        stream = kwarg.pop('stream', False)
         if (command == 'dump') and ('match' not in kwarg):
             match = kwarg
         else:
@@ -801,9 +986,22 @@ class RTNL_API(object):
             if kwarg[key] is not None:
                 msg['attrs'].append([nla, kwarg[key]])
 
-        ret = self.nlm_request(msg,
-                               msg_type=command,
-                               msg_flags=flags)
+        if command == RTM_GETNEIGH:
+            msg = self._dump_request(msg, match, nla=('ifindex', 'master'))
+
+        columns = self._columns(msg, columns)
+        ret = self._request(msg, stream and columns is None,
+                            msg_type=command,
+                            msg_flags=flags,
+                            nla_filter=self._nla_filter(msg,
+                                                        nla_filter,
+                                                        match),
+                            msg_filter=self._msg_filter(match, columns))
+        if columns is not None:
+            tuple(ret)
+            return columns
+        if stream:
+            return self._stream(match, ret)
         if match is not None:
             ret = self._match(match, ret)
 
@@ -1050,6 +1248,9 @@ class RTNL_API(object):
         These command names are confusing and thus are deprecated.
         Use `IPRoute.vlan_filter()`.
         '''
+        nla_filter = kwarg.pop('nla_filter', None)
+        columns = kwarg.pop('columns', None)
+        stream = kwarg.pop('stream', False)
         if (command == 'dump') and ('match' not in kwarg):
             match = kwarg
         else:
@@ -1109,9 +1310,23 @@ class RTNL_API(object):
             if kwarg[key] is not None:
                 msg['attrs'].append([nla, kwarg[key]])
 
-        ret = self.nlm_request(msg,
-                               msg_type=command,
-                               msg_flags=msg_flags)
+        if command == RTM_GETLINK and msg_flags & NLM_F_DUMP == NLM_F_DUMP:
+            # link dumps can not be filtered by the index
+            msg = self._dump_request(msg, nla=('ext_mask', 'master'))
+
+        columns = self._columns(msg, columns)
+        ret = self._request(msg, stream and columns is None,
+                            msg_type=command,
+                            msg_flags=msg_flags,
+                            nla_filter=self._nla_filter(msg,
+                                                        nla_filter,
+                                                        match),
+                            msg_filter=self._msg_filter(match, columns))
+        if columns is not None:
+            tuple(ret)
+            return columns
+        if stream:
+            return self._stream(match, ret)
         if match is not None:
             ret = self._match(match, ret)
 
@@ -1179,6 +1394,9 @@ class RTNL_API(object):
         (command, flags) = commands.get(command, command)
 
         # fetch args
+        nla_filter = kwarg.pop('nla_filter', None)
+        columns = kwarg.pop('columns', None)
+        stream = kwarg.pop('stream', False)
         index = index or kwarg.pop('index', 0)
         family = family or kwarg.pop('family', None)
         prefixlen = mask or kwarg.pop('mask', 0) or kwarg.pop('prefixlen', 0)
@@ -1221,11 +1439,24 @@ class RTNL_API(object):
             if kwarg[key] is not None:
                 msg['attrs'].append([nla, kwarg[key]])
 
-        ret = self.nlm_request(msg,
-                               msg_type=command,
-                               msg_flags=flags,
-                               terminate=lambda x: x['header']['type'] ==
-                               NLMSG_ERROR)
+        if command == RTM_GETADDR:
+            msg = self._dump_request(msg, match, fields=('index', ))
+
+        columns = self._columns(msg, columns)
+        ret = self._nlm_dump(msg, stream and columns is None,
+                             msg_type=command,
+                             msg_flags=flags,
+                             terminate=lambda x: x['header']['type'] ==
+                             NLMSG_ERROR,
+                             nla_filter=self._nla_filter(msg,
+                                                         nla_filter,
+                                                         match),
+                             msg_filter=self._msg_filter(match, columns))
+        if columns is not None:
+            tuple(ret)
+            return columns
+        if stream:
+            return self._stream(match, ret)
         if match:
             ret = self._match(match, ret)
 
@@ -1495,6 +1726,9 @@ class RTNL_API(object):
         if command in ('add', 'set', 'replace', 'change'):
             kwarg['proto'] = kwarg.get('proto', 'static') or 'static'
             kwarg['type'] = kwarg.get('type', 'unicast') or 'unicast'
+        nla_filter = kwarg.pop('nla_filter', None)
+        columns = kwarg.pop('columns', None)
+        stream = kwarg.pop('stream', False)
         kwarg = IPRouteRequest(kwarg)
         if 'match' not in kwarg and command in ('dump', 'show'):
             match = kwarg
@@ -1554,10 +1788,27 @@ class RTNL_API(object):
                                     attr[1].find(':') >= 0 else AF_INET
                                 break
 
-        ret = self.nlm_request(msg,
-                               msg_type=command,
-                               msg_flags=flags,
-                               callback=callback)
+        if command == RTM_GETROUTE and flags == flags_dump:
+            # the header table is a filter as well, but it
+            # defaults to 254, so use RTA_TABLE
+            msg = self._dump_request(msg, match,
+                                     fields=('flags', 'proto'),
+                                     nla=('table', 'oif'))
+
+        columns = self._columns(msg, columns)
+        ret = self._nlm_dump(msg, stream and columns is None,
+                             msg_type=command,
+                             msg_flags=flags,
+                             callback=callback,
+                             nla_filter=self._nla_filter(msg,
+                                                         nla_filter,
+                                                         match),
+                             msg_filter=self._msg_filter(match, columns))
+        if columns is not None:
+            tuple(ret)
+            return columns
+        if stream:
+            return self._stream(match, ret)
         if match:
             ret = self._match(match, ret)
 
@@ -1654,6 +1905,7 @@ class RTNL_API(object):
                      'iifname', 'oifname']
             kwarg.update(dict(zip(names, argv)))
 
+        stream = kwarg.pop('stream', False)
         kwarg = IPRuleRequest(kwarg)
         msg = fibmsg()
         table = kwarg.get('table', 0)
@@ -1672,10 +1924,16 @@ class RTNL_API(object):
             if kwarg[key] is not None:
                 msg['attrs'].append([nla, kwarg[key]])
 
-        ret = self.nlm_request(msg,
-                               msg_type=command,
-                               msg_flags=flags)
+        if command == RTM_GETRULE and flags & NLM_F_ROOT:
+            # rule dumps have no kernel-side filters
+            msg = self._dump_request(msg)
+
+        ret = self._request(msg, stream,
+                            msg_type=command,
+                            msg_flags=flags)
 
+        if stream:
+            return self._stream(kwarg.get('match'), ret)
         if 'match' in kwarg:
             ret = self._match(kwarg['match'], ret)
 
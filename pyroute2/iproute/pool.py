@@ -0,0 +1,297 @@
+'''
+IPRoutePool
+-----------
+
+One `IPRoute` serializes concurrent callers, and a socket per thread
+wastes file descriptors and netlink ports. `IPRoutePool` is a thread
+safe facade that runs every `RTNL_API` call on an idle socket from
+the pool::
+
+    from pyroute2 import IPRoutePool
+
+    ipr = IPRoutePool(max_size=8)
+    # safe to call from any thread
+    ipr.get_links()
+    ipr.addr('add', index=1, address='10.0.0.1', mask=24)
+    ipr.close()
+
+The pool creates sockets on demand up to `max_size`; when all the
+sockets are busy, the call waits for a free one for `timeout`
+seconds, and fails with `PoolTimeout`. The sockets that are idle
+longer than `idle_timeout` are closed, but the pool keeps at least
+`min_size` sockets open.
+
+To run several calls on the same socket, check it out explicitly::
+
+    with ipr.socket() as sock:
+        sock.link('set', index=idx, state='down')
+        sock.link('set', index=idx, ifname='eth1')
+
+Generators returned by the calls, see `config.nlm_generator`, keep
+the socket until they are exhausted, closed or garbage collected.
+
+Deadlines, see `NetlinkMixin.deadline()`, work per thread as well,
+and include the time spent waiting for a free socket::
+
+    with ipr.deadline(0.5):
+        ipr.route('add', dst='10.0.0.0/24', gateway='10.1.0.1')
+
+The pool sockets are not bound to any multicast group, use a
+separate `IPRoute` to monitor the broadcast messages.
+'''
+import types
+import threading
+from contextlib import contextmanager
+
+from pyroute2.iproute.linux import IPRoute
+from pyroute2.netlink.exceptions import NetlinkError
+from pyroute2.netlink.exceptions import NetlinkTimeoutError
+from pyroute2.netlink.nlsocket import monotonic
+
+
+class PoolTimeout(Exception):
+    '''
+    Raised when there is no free socket in the pool
+    '''
+    pass
+
+
+class PoolStream(object):
+    '''
+    The generator returned by a pool call, holds the socket until
+    exhausted or closed. A generator that is never started doesn't
+    run its `finally` block, so the socket is returned by `close()`,
+    that is called on the garbage collection as well.
+
+    The deadline of the call, if any, applies to every step.
+    '''
+
+    def __init__(self, pool, sock, ret, deadline=None):
+        self.pool = pool
+        self.sock = sock
+        self.ret = ret
+        self.deadline = deadline
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.sock is None:
+            raise StopIteration()
+        try:
+            if self.deadline is None:
+                return next(self.ret)
+            with self.sock.deadline(max(0, self.deadline - monotonic())):
+                return next(self.ret)
+        except (StopIteration, NetlinkError):
+            self._release(False)
+            raise
+        except Exception:
+            self._release(True)
+            raise
+
+    next = __next__
+
+    def _release(self, discard):
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            self.pool.release(sock, discard)
+
+    def close(self):
+        '''
+        Stop the call and return the socket to the pool
+        '''
+        if self.sock is None:
+            return
+        discard = False
+        try:
+            # cancels the request, see `NetlinkMixin.nlm_stream()`
+            self.ret.close()
+        except Exception:
+            discard = True
+        self._release(discard)
+
+    def __del__(self):
+        self.close()
+
+
+class IPRoutePool(object):
+    '''
+    Thread safe pool of `IPRoute` sockets
+
+    * min_size -- sockets to keep open, even if idle
+    * max_size -- max sockets in the pool
+    * timeout -- seconds to wait for a free socket, None to wait forever
+    * idle_timeout -- close idle sockets after that many seconds
+    * factory -- the socket class, `IPRoute` by default
+
+    Other keyword arguments are passed to the factory.
+    '''
+
+    def __init__(self, min_size=0, max_size=16, timeout=30,
+                 idle_timeout=60, factory=IPRoute, **kwarg):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError('invalid pool size')
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.factory = factory
+        self.kwarg = kwarg
+        self.closed = False
+        # (socket, release time), the most recently used is the last
+        self.idle = []
+        self.size = 0
+        self.cond = threading.Condition()
+        self.local = threading.local()
+        for _ in range(min_size):
+            self.idle.append((self.factory(**self.kwarg), monotonic()))
+            self.size += 1
+
+    def acquire(self, timeout=None):
+        '''
+        Check out an idle socket, or create a new one. The socket
+        must be returned with `release()`.
+        '''
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else monotonic() + timeout
+        with self.cond:
+            while True:
+                if self.closed:
+                    raise RuntimeError('the pool is closed')
+                if self.idle:
+                    return self.idle.pop()[0]
+                if self.size < self.max_size:
+                    # reserve the slot, create the socket w/o the lock
+                    self.size += 1
+                    break
+                if deadline is None:
+                    self.cond.wait()
+                else:
+                    left = deadline - monotonic()
+                    if left <= 0:
+                        raise PoolTimeout('no free socket in the pool')
+                    self.cond.wait(left)
+        try:
+            return self.factory(**self.kwarg)
+        except Exception:
+            with self.cond:
+                self.size -= 1
+                self.cond.notify()
+            raise
+
+    def release(self, sock, discard=False):
+        '''
+        Return the socket to the pool. Discarded sockets are closed,
+        e.g. when a call failed with an unexpected exception and the
+        socket state is not known.
+        '''
+        expired = []
+        with self.cond:
+            now = monotonic()
+            if discard or self.closed:
+                expired.append(sock)
+            else:
+                self.idle.append((sock, now))
+            # shrink the pool, starting from the least recently used
+            while len(self.idle) > self.min_size and \
+                    now - self.idle[0][1] > self.idle_timeout:
+                expired.append(self.idle.pop(0)[0])
+            self.size -= len(expired)
+            self.cond.notify()
+        for sock in expired:
+            sock.close()
+
+    @contextmanager
+    def socket(self, timeout=None):
+        '''
+        Check out a socket for several calls::
+
+            with pool.socket() as sock:
+                sock.get_links()
+        '''
+        sock = self.acquire(timeout)
+        discard = False
+        try:
+            yield sock
+        except NetlinkError:
+            raise
+        except Exception:
+            discard = True
+            raise
+        finally:
+            self.release(sock, discard)
+
+    @contextmanager
+    def deadline(self, timeout):
+        '''
+        Run the calls of this thread with a deadline
+        '''
+        outer = getattr(self.local, 'deadline', None)
+        deadline = monotonic() + timeout
+        if outer is not None:
+            deadline = min(outer, deadline)
+        self.local.deadline = deadline
+        try:
+            yield
+        finally:
+            self.local.deadline = outer
+
+    def _call(self, name, *argv, **kwarg):
+        deadline = getattr(self.local, 'deadline', None)
+        if deadline is None:
+            sock = self.acquire()
+        else:
+            try:
+                sock = self.acquire(max(0, deadline - monotonic()))
+            except PoolTimeout:
+                raise NetlinkTimeoutError('no free socket in the pool')
+        discard = False
+        try:
+            if deadline is None:
+                ret = getattr(sock, name)(*argv, **kwarg)
+            else:
+                with sock.deadline(max(0, deadline - monotonic())):
+                    ret = getattr(sock, name)(*argv, **kwarg)
+            if isinstance(ret, types.GeneratorType):
+                # the generator holds the socket until it is done
+                sock, ret = None, PoolStream(self, sock, ret, deadline)
+            return ret
+        except NetlinkError:
+            raise
+        except Exception:
+            discard = True
+            raise
+        finally:
+            if sock is not None:
+                self.release(sock, discard)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or \
+                not callable(getattr(self.factory, name, None)):
+            raise AttributeError(name)
+
+        def wrapper(*argv, **kwarg):
+            return self._call(name, *argv, **kwarg)
+        wrapper.__name__ = name
+        return wrapper
+
+    def close(self):
+        '''
+        Close the idle sockets; the sockets in use are closed
+        when released.
+        '''
+        with self.cond:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+            self.cond.notify_all()
+        for sock, _ in idle:
+            sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -16,6 +16,17 @@ from pyroute2.netlink.rtnl.rtmsg import rtmsg
 from pyroute2.netlink.rtnl.rtmsg import nh
 
 
+class Resync(object):
+    '''
+    The event to reconcile the table with the dump, after the
+    events were lost on the socket overrun
+    '''
+
+    def __init__(self, table, msgs):
+        self.table = table
+        self.msgs = msgs
+
+
 class DBSchema(object):
 
     connection = None
@@ -401,6 +412,37 @@ class DBSchema(object):
         # ... or work on a regular route
         self.load_netlink("routes", target, event)
 
+    def resync(self, target, event):
+        #
+        # Delete the objects, that are missing in the dump,
+        # and load the dump as usual
+        if self.thread != id(threading.current_thread()):
+            return
+        table = event.table
+        keys = self.indices[table]
+        present = set()
+        for msg in event.msgs:
+            values = []
+            for key in keys:
+                value = msg.get(key) or msg.get_attr(key)
+                if value is None:
+                    value = self.key_defaults[table][key]
+                values.append(value)
+            present.add(tuple(values))
+        fields = ','.join(['f_%s' % x for x in keys])
+        conditions = ' AND '.join(['f_target = %s' % self.plch] +
+                                  ['f_%s = %s' % (x, self.plch)
+                                   for x in keys])
+        for row in self.execute('SELECT %s FROM %s WHERE f_target = %s'
+                                % (fields, table, self.plch),
+                                (target, )).fetchall():
+            if tuple(row) not in present:
+                self.execute('DELETE FROM %s WHERE %s' % (table, conditions),
+                             [target] + list(row))
+        for msg in event.msgs:
+            for handler in self.event_map[self.classes[table]]:
+                handler(target, msg)
+
     def log_netlink(self, table, target, event, ctable=None):
         #
         # RTNL Logs
@@ -506,4 +548,5 @@ def init(connection, mode, rtnl_log, tid):
         types = dict([(x[1], x[0]) for x in ret.classes.items()])
         for msg_type, handlers in ret.event_map.items():
             handlers.append(partial(ret.log_netlink, types[msg_type]))
+    ret.event_map[Resync] = [ret.resync]
     return ret
@@ -52,6 +52,8 @@ import traceback
 from functools import partial
 from pyroute2 import config
 from pyroute2 import IPRoute
+from pyroute2.netlink import rtnl
+from pyroute2.netlink import NLMSG_OVERRUN
 from pyroute2.ndb import dbschema
 from pyroute2.ndb.interface import Interface
 from pyroute2.ndb.address import Address
@@ -78,6 +80,23 @@ def target_adapter(value):
 sqlite3.register_adapter(list, target_adapter)
 
 
+# the tables to reload on the socket overrun, with the
+# corresponding RTNL groups and the dump methods
+resync_map = (('interfaces',
+               rtnl.RTMGRP_LINK,
+               'get_links'),
+              ('addresses',
+               rtnl.RTMGRP_IPV4_IFADDR | rtnl.RTMGRP_IPV6_IFADDR,
+               'get_addr'),
+              ('neighbours',
+               rtnl.RTMGRP_NEIGH,
+               'get_neighbours'),
+              ('routes',
+               rtnl.RTMGRP_IPV4_ROUTE | rtnl.RTMGRP_IPV6_ROUTE |
+               rtnl.RTMGRP_MPLS_ROUTE,
+               'get_routes'))
+
+
 class ShutdownException(Exception):
     pass
 
@@ -296,6 +315,7 @@ class NDB(object):
                 self.nl = {'localhost': self._nl.clone()}
             for target in self.nl:
                 self.nl[target].get_timeout = 300
+                self.nl[target].dump_retries = 3
                 self.nl[target].bind(async_cache=True)
             #
             # close the current db
@@ -335,7 +355,18 @@ class NDB(object):
                         if msg[0]['header']['error'] and \
                                 msg[0]['header']['error'].code == 104:
                                     return
-                        event_queue.put((target, msg))
+                        events = []
+                        for event in msg:
+                            if event['header']['type'] != NLMSG_OVERRUN:
+                                events.append(event)
+                                continue
+                            # the events are lost, reconcile the tables
+                            for (table, groups, method) in resync_map:
+                                if event['groups'] & groups:
+                                    dump = getattr(channel, method)()
+                                    events.append(dbschema.Resync(table,
+                                                                  dump))
+                        event_queue.put((target, events))
 
                 th = threading.Thread(target=t,
                                       args=(self._event_queue,
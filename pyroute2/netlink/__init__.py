@@ -400,6 +400,7 @@ from socket import inet_ntop
 from socket import AF_INET
 from socket import AF_INET6
 from socket import AF_UNSPEC
+from pyroute2 import config
 from pyroute2.common import AF_MPLS
 from pyroute2.common import hexdump
 from pyroute2.common import basestring
@@ -510,6 +511,8 @@ NLM_F_REQUEST = 1    # It is request message.
 NLM_F_MULTI = 2    # Multipart message, terminated by NLMSG_DONE
 NLM_F_ACK = 4    # Reply with ack, with zero or error code
 NLM_F_ECHO = 8    # Echo this request
+NLM_F_DUMP_INTR = 0x10    # Dump was inconsistent due to sequence change
+NLM_F_DUMP_FILTERED = 0x20    # Dump was filtered as requested
 # Modifiers to GET request
 NLM_F_ROOT = 0x100    # specify tree    root
 NLM_F_MATCH = 0x200    # return all matching
@@ -520,6 +523,9 @@ NLM_F_REPLACE = 0x100    # Override existing
 NLM_F_EXCL = 0x200    # Do not touch, if it exists
 NLM_F_CREATE = 0x400    # Create, if it does not exist
 NLM_F_APPEND = 0x800    # Add to end of list
+# Flags for ACK message
+NLM_F_CAPPED = 0x100    # request was capped
+NLM_F_ACK_TLVS = 0x200    # extended ACK TLVs were included
 
 NLMSG_NOOP = 0x1    # Nothing
 NLMSG_ERROR = 0x2    # Error
@@ -564,6 +570,17 @@ NETLINK_RX_RING = 6
 NETLINK_TX_RING = 7
 
 NETLINK_LISTEN_ALL_NSID = 8
+NETLINK_CAP_ACK = 10
+NETLINK_EXT_ACK = 11
+NETLINK_GET_STRICT_CHK = 12
+
+# extended ACK TLVs, see NETLINK_EXT_ACK
+NLMSGERR_ATTR_MSG = 1
+NLMSGERR_ATTR_OFFS = 2
+NLMSGERR_ATTR_COOKIE = 3
+NLMSGERR_ATTR_POLICY = 4
+NLMSGERR_ATTR_MISS_TYPE = 5
+NLMSGERR_ATTR_MISS_NEST = 6
 
 clean_cbs = {}
 
@@ -572,6 +589,33 @@ clean_cbs = {}
 cache_fmt = {}
 cache_hdr = {}
 cache_jit = {}
+cache_hplan = {}
+cache_view = {}
+cache_pool = {}
+
+
+def load_wire(msg_class, data, state):
+    '''
+    Restore a message pickled in the wire format: the raw message
+    bytes, the class and the keys that are not in the buffer, see
+    `nlmsg_base.wire_state()`. The NLA chain is not decoded here,
+    the NLA are decoded on the first access as usual.
+
+    The wire format is used by `pickle` automatically, if the
+    message is not changed after `decode()`::
+
+        msg = ipr.get_links()[0]
+        data = pickle.dumps(msg)  # no dump() call
+    '''
+    (header, fields, header_extra, extra) = state
+    msg = msg_class.acquire(bytearray(data))
+    msg.decode()
+    if header:
+        msg['header'].update(zip([x[0] for x in msg.header], header))
+        msg['header'].update(header_extra)
+    msg.update(zip([x[0] for x in msg.fields], fields))
+    msg.update(extra)
+    return msg
 
 
 class nlmsg_base(dict):
@@ -614,6 +658,7 @@ class nlmsg_base(dict):
         "_nla_init",
         "_nla_array",
         "_nla_flags",
+        "_nla_filter",
         "value",
         "_ft_decode",
         "_r_value_map",
@@ -647,20 +692,20 @@ class nlmsg_base(dict):
         self._nla_init = init
         self._nla_array = False
         self._nla_flags = self.nla_flags
-        self['attrs'] = []
+        self._nla_filter = None
+        self['attrs'] = nla_list()
         self['value'] = NotInitialized
         self.value = NotInitialized
         # work only on non-empty mappings
         if self.nla_map and not self.__class__.__compiled_nla:
             self.compile_nla()
         # compile fast-track for particular types
-        if id(self.__class__) in cache_jit:
-            self._ft_decode = cache_jit[id(self.__class__)]['ft_decode']
-        else:
+        jit = cache_jit.get(id(self.__class__))
+        if jit is None:
             self.compile_ft()
-        self._r_value_map = dict([
-            (x[1], x[0]) for x in self.value_map.items()
-        ])
+            jit = cache_jit[id(self.__class__)]
+        self._ft_decode = jit['ft_decode']
+        self._r_value_map = jit['r_value_map']
         if self.header:
             self['header'] = {}
 
@@ -715,6 +760,56 @@ class nlmsg_base(dict):
         self.offset = 0
         self.decoded = False
 
+    @classmethod
+    def acquire(cls, *argv, **kwarg):
+        '''
+        Return an instance of the class from the free-list, or a new
+        one, if the free-list is empty. The arguments are the same as
+        for the constructor.
+
+        Instances get into the free-list only by `release()`.
+        '''
+        pool = cache_pool.get(id(cls))
+        if pool:
+            try:
+                msg = pool.pop()
+            except IndexError:
+                # emptied by another thread
+                return cls(*argv, **kwarg)
+            msg.__init__(*argv, **kwarg)
+            return msg
+        return cls(*argv, **kwarg)
+
+    def release(self):
+        '''
+        Put the message and all the NLA objects into the free-list
+        to reuse them in `acquire()`, e.g. in a monitoring loop::
+
+            while True:
+                for msg in ipr.get():
+                    process(msg)
+                    msg.release()
+
+        After the call the message and the values returned by
+        `get_attr()` and `get_nested()` must not be used.
+
+        The free-list size per class is limited by
+        `pyroute2.config.nlm_pool_size`.
+        '''
+        if self.data is None:
+            # already released
+            return
+        for cell in self.get('attrs', ()):
+            if isinstance(cell, nla_slot):
+                cell.cell[1].release()
+        dict.clear(self)
+        self.data = None
+        self.parent = None
+        self.value = NotInitialized
+        pool = cache_pool.setdefault(id(self.__class__), [])
+        if len(pool) < config.nlm_pool_size:
+            pool.append(self)
+
     def register_clean_cb(self, cb):
         global clean_cbs
         if self.parent is not None:
@@ -971,6 +1066,10 @@ class nlmsg_base(dict):
         if clean_cbs:
             self.unregister_clean_cb()
         self.decoded = True
+        # the NLA chain is the same as in the buffer, unless filtered
+        attrs = self.get('attrs')
+        if isinstance(attrs, nla_list) and self._nla_filter is None:
+            attrs.wire = True
 
     def encode(self):
         '''
@@ -992,8 +1091,9 @@ class nlmsg_base(dict):
         diff = 0
         # reserve space for the header
         if self.header is not None:
-            hsize = struct.calcsize(''.join([x[1] for x in self.header]))
-            self.data.extend([0] * hsize)
+            hplan = self.compile_header(self.header)
+            hsize = hplan[0]
+            self.data.extend(b'\0' * hsize)
             offset += hsize
 
         # handle the array case
@@ -1010,50 +1110,48 @@ class nlmsg_base(dict):
                 cell.encode()
                 offset += (cell.length + 4 - 1) & ~ (4 - 1)
         elif self.getvalue() is not None:
-            for name, fmt in self.fields:
+            data = self.data
+            fields, plan, fsize = cache_jit[id(self.__class__)]['ft_encode']
+            if fields is not self.fields:
+                fields, plan, fsize = self.compile_encoder(self.fields)
+            # fixed size fields: reserve the space at once
+            if fsize is not None:
+                data.extend(b'\0' * fsize)
+
+            for name, fmt, packer, length in plan:
                 value = self[name]
 
-                if fmt == 's':
-                    length = len(value)
-                    efmt = '%is' % (length)
-                elif fmt == 'z':
-                    length = len(value) + 1
-                    efmt = '%is' % (length)
-                else:
-                    length = struct.calcsize(fmt)
-                    efmt = fmt
-
-                self.data.extend([0] * length)
-
-                # in python3 we should force it
-                if sys.version[0] == '3':
-                    if isinstance(value, str):
-                        value = bytes(value, 'utf-8')
-                    elif isinstance(value, float):
-                        value = int(value)
-                elif sys.version[0] == '2':
-                    if isinstance(value, unicode):
-                        value = value.encode('utf-8')
+                # force text to be encoded; on Python 3
+                # `unicode` is an alias for `str`
+                if isinstance(value, unicode):
+                    value = value.encode('utf-8')
+                elif isinstance(value, float):
+                    value = int(value)
 
                 try:
-                    if fmt[-1] == 'x':
-                        struct.pack_into(efmt, self.data, offset)
+                    if packer is None:
+                        # variable length field, 's' or 'z'
+                        length = len(value) + (fmt == 'z')
+                        data.extend(b'\0' * length)
+                        struct.pack_into('%is' % (length), data, offset, value)
+                    elif fmt[-1] == 'x':
+                        packer.pack_into(data, offset)
                     elif type(value) in (list, tuple, set):
-                        struct.pack_into(efmt, self.data, offset, *value)
+                        packer.pack_into(data, offset, *value)
                     else:
-                        struct.pack_into(efmt, self.data, offset, value)
+                        packer.pack_into(data, offset, value)
                 except struct.error:
                     log.error(''.join(traceback.format_stack()))
                     log.error(traceback.format_exc())
                     log.error("error pack: %s %s %s" %
-                              (efmt, value, type(value)))
+                              (fmt, value, type(value)))
                     raise
 
                 offset += length
 
             diff = ((offset + 4 - 1) & ~ (4 - 1)) - offset
             offset += diff
-            self.data.extend([0] * diff)
+            data.extend(b'\0' * diff)
         # write NLA chain
         if self.nla_map:
             offset = self.encode_nlas(offset)
@@ -1063,18 +1161,18 @@ class nlmsg_base(dict):
                                                       self.offset -
                                                       diff)
             offset = self.offset
-            for name, fmt in self.header:
-                struct.pack_into(fmt,
-                                 self.data,
+            header = self['header']
+            for packer, size, names in hplan[1]:
+                packer.pack_into(self.data,
                                  offset,
-                                 self['header'].get(name, 0))
-                offset += struct.calcsize(fmt)
+                                 *[header.get(name, 0) for name in names])
+                offset += size
 
     def setvalue(self, value):
         if isinstance(value, dict):
             self.update(value)
             if 'attrs' in value:
-                self['attrs'] = []
+                self['attrs'] = nla_list()
                 for nla in value['attrs']:
                     nlv = nlmsg_base()
                     nlv.setvalue(nla[1])
@@ -1092,7 +1190,7 @@ class nlmsg_base(dict):
         '''
         Return the first encoded NLA by name
         '''
-        cells = [i[1] for i in self['attrs'] if i[0] == attr]
+        cells = self.get_attrs(attr)
         if cells:
             return cells[0]
 
@@ -1112,26 +1210,95 @@ class nlmsg_base(dict):
         Return the first NLA with that name or None
         '''
         try:
-            attrs = self.get_attrs(attr)
+            attrs = self['attrs']
         except KeyError:
             return default
-        if attrs:
-            return attrs[0]
-        else:
+        if isinstance(attrs, nla_list):
+            cells = attrs.lookup(attr)
+            if cells:
+                return cells[0][1]
             return default
+        for cell in attrs:
+            if cell[0] == attr:
+                return cell[1]
+        return default
 
     def get_attrs(self, attr):
         '''
         Return attrs by name or an empty list
         '''
-        return [i[1] for i in self['attrs'] if i[0] == attr]
+        attrs = self['attrs']
+        if isinstance(attrs, nla_list):
+            return [i[1] for i in attrs.lookup(attr)]
+        return [i[1] for i in attrs if i[0] == attr]
 
     def __setstate__(self, state):
         return self.load(state)
 
     def __reduce__(self):
+        data = self.wire_data()
+        if data is not None:
+            return (load_wire, (type(self), data, self.wire_state()))
         return (type(self), (), self.dump())
 
+    def wire_intact(self):
+        '''
+        Check if the NLA chain, including decoded nested NLA, is
+        not changed since `decode()`. Changes of NLA values made
+        in place are not tracked.
+        '''
+        attrs = self.get('attrs')
+        if not isinstance(attrs, nla_list) or not attrs.wire:
+            return False
+        for cell in attrs:
+            if not isinstance(cell, nla_slot):
+                return False
+            nla = cell.cell[1]
+            if nla.decoded and not nla.wire_intact():
+                return False
+        return True
+
+    def wire_data(self):
+        '''
+        Return the message bytes as received, or None if the message
+        was not decoded from a buffer, or is changed since, see
+        `wire_intact()`. Only top level messages are supported.
+        '''
+        if not self.decoded or \
+                self.data is None or \
+                self.parent is not None or \
+                self._nla_array or \
+                self.length < 4 or \
+                not self.wire_intact():
+            return None
+        return bytes(memoryview(self.data)[self.offset:
+                                           self.offset + self.length])
+
+    def wire_state(self):
+        '''
+        Return the values to restore after the message is decoded
+        from `wire_data()`::
+
+            (header values, field values, extra header keys, extra keys)
+
+        Header and field values are tuples in the `header` and
+        `fields` order, so changes made after `decode()` are kept.
+        Extra keys are the keys set after `decode()`, like `event`
+        or `error` in the header.
+        '''
+        header = self.get('header') or {}
+        names = [x[0] for x in self.header or ()]
+        fields = [x[0] for x in self.fields]
+        extra = {}
+        for (k, v) in self.items():
+            if k not in fields and k not in ('header', 'attrs', 'value'):
+                extra[k] = v
+        return (tuple([header.get(x) for x in names]),
+                tuple([self.get(x) for x in fields]),
+                dict([(k, v) for (k, v) in header.items()
+                      if k not in names]),
+                extra)
+
     def load(self, dump):
         '''
         Load packet from a dict::
@@ -1145,12 +1312,15 @@ class nlmsg_base(dict):
 
         The same methods -- `dump()`/`load()` -- implement the
         pickling protocol for the nlmsg class, see `__reduce__()`
-        and `__setstate__()`.
+        and `__setstate__()`, if the message can not be pickled
+        in the wire format, see `load_wire()`.
         '''
         if isinstance(dump, dict):
             for (k, v) in dump.items():
                 if k == 'header':
                     self['header'].update(dump['header'])
+                elif k == 'attrs':
+                    self[k] = nla_list(v)
                 else:
                     self[k] = v
         else:
@@ -1211,17 +1381,7 @@ class nlmsg_base(dict):
                                             offset)
 
     @staticmethod
-    def _ft_decode_packed(self, offset):
-        names = []
-        fmt = ''
-        for field in self.fields:
-            names.append(field[0])
-            fmt += field[1]
-        value = struct.unpack_from(fmt, self.data, offset)
-        values = list(value)
-        for name in names:
-            if name[0] != '_':
-                self[name] = values.pop(0)
+    def _ft_decode_tail(self, offset):
         # read NLA chain
         if self.nla_map:
             offset = (offset + 4 - 1) & ~ (4 - 1)
@@ -1235,6 +1395,20 @@ class nlmsg_base(dict):
         if self['value'] is NotInitialized:
             del self['value']
 
+    @staticmethod
+    def _ft_decode_packed(self, offset):
+        names = []
+        fmt = ''
+        for field in self.fields:
+            names.append(field[0])
+            fmt += field[1]
+        value = struct.unpack_from(fmt, self.data, offset)
+        values = list(value)
+        for name in names:
+            if name[0] != '_':
+                self[name] = values.pop(0)
+        self._ft_decode_tail(self, offset)
+
     @staticmethod
     def _ft_decode_generic(self, offset):
         global cache_fmt
@@ -1255,18 +1429,191 @@ class nlmsg_base(dict):
                 self[name] = value[0]
             else:
                 self[name] = value
-        # read NLA chain
-        if self.nla_map:
-            offset = (offset + 4 - 1) & ~ (4 - 1)
-            try:
-                self.decode_nlas(offset)
-            except Exception as e:
-                log.warning(traceback.format_exc())
-                raise NetlinkNLADecodeError(e)
+        self._ft_decode_tail(self, offset)
+
+    @classmethod
+    def compile_fields(cls, fields=None):
+        '''
+        Compile the `fields` description (or any other description
+        in the same format, e.g. `header`) into a list of decoding
+        segments. Every segment is a tuple::
+
+            (struct.Struct, size, names, slices)
+
+        Consecutive fields with the same byte order are merged
+        into one precompiled `struct.Struct`, so usually there is
+        only one segment per class. `names` is a tuple of field
+        names to be assigned directly from the unpacked values, or
+        `None`, if some fields produce not exactly one value --
+        then `slices` is used: `(name, start, stop)`, where `stop`
+        is `None` for single values and `start` is `None` for
+        padding fields.
+
+        Native format fields, that can not be merged without
+        implicit alignment, get their own segments. So the
+        compiled layout is always the same as if the fields
+        were decoded one by one.
+        '''
+        if fields is None:
+            fields = cls.fields
+        layout = []
+        for name, fmt in fields:
+            if fmt[:1] in ('@', '=', '<', '>', '!'):
+                order, body = fmt[0], fmt[1:]
+            else:
+                order, body = '@', fmt
+            if order == '!':
+                order = '>'
+            elif order == '@' and \
+                    struct.calcsize(body) == struct.calcsize('=' + body):
+                order = '='
+            size = struct.calcsize(fmt)
+            count = len(struct.unpack(fmt, b'\0' * size))
+            if layout and order != '@' and layout[-1][0] == order:
+                layout[-1][1].append(body)
+                layout[-1][2].append((name, count))
+            else:
+                layout.append((order, [body], [(name, count)]))
+
+        segments = []
+        for order, bodies, entries in layout:
+            compiled = struct.Struct(order + ''.join(bodies))
+            slices = []
+            index = 0
+            for name, count in entries:
+                if count == 0:
+                    slices.append((name, None, None))
+                elif count == 1:
+                    slices.append((name, index, None))
+                else:
+                    slices.append((name, index, index + count))
+                index += count
+            if all([x[2] is None and x[1] is not None for x in slices]):
+                names = tuple([x[0] for x in entries])
+            else:
+                names = None
+            segments.append((compiled, compiled.size, names, tuple(slices)))
+        return tuple(segments)
+
+    @classmethod
+    def compile_decoder(cls):
+        '''
+        Generate the fast-track decoder function for the class.
+
+        The decoder unpacks all the fixed fields with precompiled
+        `struct.Struct` objects and assigns the results directly,
+        without iterating `fields` and calculating formats on
+        every message.
+        '''
+        tail = cls._ft_decode_tail
+
+        if cls.pack == 'struct':
+            compiled = struct.Struct(''.join([x[1] for x in cls.fields]))
+            names = tuple([x[0] for x in cls.fields if x[0][0] != '_'])
+
+            def decoder(self, offset):
+                self.update(zip(names, compiled.unpack_from(self.data,
+                                                            offset)))
+                tail(self, offset)
+            return decoder
+
+        segments = cls.compile_fields()
+
+        if not segments:
+
+            def decoder(self, offset):
+                tail(self, offset)
+
+        elif len(segments) == 1 and segments[0][2] is not None:
+            # the most common case: one struct, one value per field
+            compiled, size, names, slices = segments[0]
+            if len(names) == 1:
+                name = names[0]
+
+                def decoder(self, offset):
+                    self[name] = compiled.unpack_from(self.data, offset)[0]
+                    tail(self, offset + size)
+            else:
+
+                def decoder(self, offset):
+                    self.update(zip(names, compiled.unpack_from(self.data,
+                                                                offset)))
+                    tail(self, offset + size)
         else:
-            del self['attrs']
-        if self['value'] is NotInitialized:
-            del self['value']
+
+            def decoder(self, offset):
+                data = self.data
+                for (compiled, size, names, slices) in segments:
+                    values = compiled.unpack_from(data, offset)
+                    if names is not None:
+                        self.update(zip(names, values))
+                    else:
+                        for (name, start, stop) in slices:
+                            if start is None:
+                                self[name] = ()
+                            elif stop is None:
+                                self[name] = values[start]
+                            else:
+                                self[name] = values[start:stop]
+                    offset += size
+                tail(self, offset)
+
+        return decoder
+
+    @classmethod
+    def compile_encoder(cls, fields=None):
+        '''
+        Compile the encoding plan for the fixed fields. Returns a
+        tuple::
+
+            (fields, plan, size)
+
+        where `plan` is a tuple of `(name, fmt, struct.Struct, size)`
+        for every field, and `size` is the total size of all the
+        fields, or `None`, if there are variable length fields
+        (`s` or `z` formats). For the variable length fields the
+        struct and the size in the plan are `None` and 0, they are
+        calculated in runtime from the value.
+        '''
+        if fields is None:
+            fields = cls.fields
+        plan = []
+        size = 0
+        for name, fmt in fields:
+            if fmt in ('s', 'z'):
+                plan.append((name, fmt, None, 0))
+                size = None
+            else:
+                packer = struct.Struct(fmt)
+                plan.append((name, fmt, packer, packer.size))
+                if size is not None:
+                    size += packer.size
+        return (fields, tuple(plan), size)
+
+    @classmethod
+    def compile_header(cls, header):
+        '''
+        Return the header encoding plan::
+
+            (size, ((struct.Struct, size, names), ...))
+
+        Plans are cached by the header description, since there
+        are only few header types -- nlmsg, NLA and array cells.
+        '''
+        try:
+            return cache_hplan[header]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable header description, don't cache it
+            header = tuple(header)
+        plan = []
+        hsize = 0
+        for (packer, size, names, slices) in cls.compile_fields(header):
+            plan.append((packer, size, names or tuple(x[0] for x in slices)))
+            hsize += size
+        cache_hplan[header] = ret = (hsize, tuple(plan))
+        return ret
 
     def compile_ft(self):
         global cache_jit
@@ -1274,11 +1621,24 @@ class nlmsg_base(dict):
             self._ft_decode = self._ft_decode_string
         elif self.fields and self.fields[0][1] == 'z':
             self._ft_decode = self._ft_decode_zstring
-        elif self.pack == 'struct':
-            self._ft_decode = self._ft_decode_packed
         else:
-            self._ft_decode = self._ft_decode_generic
-        cache_jit[id(self.__class__)] = {'ft_decode': self._ft_decode}
+            try:
+                self._ft_decode = self.compile_decoder()
+            except struct.error:
+                # unsupported format, use the interpreted decoders
+                if self.pack == 'struct':
+                    self._ft_decode = self._ft_decode_packed
+                else:
+                    self._ft_decode = self._ft_decode_generic
+        try:
+            ft_encode = self.compile_encoder()
+        except struct.error:
+            # the plan will be compiled (and fail) in runtime
+            ft_encode = (None, (), None)
+        r_value_map = dict([(x[1], x[0]) for x in self.value_map.items()])
+        cache_jit[id(self.__class__)] = {'ft_decode': self._ft_decode,
+                                         'ft_encode': ft_encode,
+                                         'r_value_map': r_value_map}
 
     def compile_nla(self):
         # clean up NLA mappings
@@ -1378,8 +1738,12 @@ class nlmsg_base(dict):
         '''
         Decode the NLA chain. Should not be called manually, since
         it is called from `decode()` routine.
+
+        If `self._nla_filter` is set, only NLA with names from
+        this set are decoded, the rest are skipped by the header.
         '''
         t_nla_map = self.__class__.__t_nla_map
+        nla_filter = self._nla_filter
         while offset - self.offset <= self.length - 4:
             nla = None
             # pick the length and the type
@@ -1389,6 +1753,12 @@ class nlmsg_base(dict):
             msg_type = base_msg_type & ~(NLA_F_NESTED | NLA_F_NET_BYTEORDER)
             # rewind to the beginning
             length = min(max(length, 4), (self.length - offset + self.offset))
+            # skip NLA not listed in the filter
+            if nla_filter is not None and \
+                    (msg_type not in t_nla_map or
+                     t_nla_map[msg_type]['name'] not in nla_filter):
+                offset += (length + 4 - 1) & ~ (4 - 1)
+                continue
             # we have a mapping for this NLA
             if msg_type in t_nla_map:
 
@@ -1402,25 +1772,132 @@ class nlmsg_base(dict):
                                           data=self.data,
                                           offset=offset)
                 # decode NLA
-                nla = msg_class(data=self.data,
-                                offset=offset,
-                                parent=self,
-                                length=length,
-                                init=prime['init'])
+                nla = msg_class.acquire(data=self.data,
+                                        offset=offset,
+                                        parent=self,
+                                        length=length,
+                                        init=prime['init'])
                 nla._nla_array = prime['nla_array']
                 nla._nla_flags = base_msg_type & (NLA_F_NESTED |
                                                   NLA_F_NET_BYTEORDER)
                 name = prime['name']
             else:
                 name = 'UNKNOWN'
-                nla = nla_base(data=self.data,
-                               offset=offset,
-                               length=length)
+                nla = nla_base.acquire(data=self.data,
+                                       offset=offset,
+                                       length=length)
 
             self['attrs'].append(nla_slot(name, nla))
             offset += (length + 4 - 1) & ~ (4 - 1)
 
 
+class nla_list(list):
+    '''
+    The NLA chain container. It is a normal list of NLA cells,
+    that builds on the first lookup an index `{name: [cell, ...]}`,
+    so `get_attr()` and `get_attrs()` do not iterate the chain.
+
+    Any list modification resets the index, `append()` and
+    `extend()` update it in place.
+
+    The `wire` flag is set by `nlmsg_base.decode()` and means that
+    the chain is the same as in the message buffer, so the message
+    can be pickled as raw bytes. Any list modification resets it.
+    '''
+
+    __slots__ = (
+        "index",
+        "wire",
+    )
+
+    def __init__(self, *argv):
+        list.__init__(self, *argv)
+        self.index = None
+        self.wire = False
+
+    def lookup(self, name):
+        '''
+        Return the list of cells with that name
+        '''
+        if self.index is None:
+            index = {}
+            for cell in self:
+                index.setdefault(cell[0], []).append(cell)
+            self.index = index
+        return self.index.get(name, ())
+
+    def append(self, cell):
+        list.append(self, cell)
+        self.wire = False
+        if self.index is not None:
+            self.index.setdefault(cell[0], []).append(cell)
+
+    def extend(self, cells):
+        for cell in cells:
+            self.append(cell)
+
+    def __iadd__(self, cells):
+        self.extend(cells)
+        return self
+
+    def __setitem__(self, key, value):
+        list.__setitem__(self, key, value)
+        self.index = None
+        self.wire = False
+
+    def __delitem__(self, key):
+        list.__delitem__(self, key)
+        self.index = None
+        self.wire = False
+
+    def __setslice__(self, i, j, value):
+        # Python 2 only
+        list.__setslice__(self, i, j, value)
+        self.index = None
+        self.wire = False
+
+    def __delslice__(self, i, j):
+        # Python 2 only
+        list.__delslice__(self, i, j)
+        self.index = None
+        self.wire = False
+
+    def __imul__(self, value):
+        list.__imul__(self, value)
+        self.index = None
+        self.wire = False
+        return self
+
+    def insert(self, idx, cell):
+        list.insert(self, idx, cell)
+        self.index = None
+        self.wire = False
+
+    def remove(self, cell):
+        list.remove(self, cell)
+        self.index = None
+        self.wire = False
+
+    def pop(self, *argv):
+        ret = list.pop(self, *argv)
+        self.index = None
+        self.wire = False
+        return ret
+
+    def clear(self):
+        del self[:]
+
+    def sort(self, *argv, **kwarg):
+        list.sort(self, *argv, **kwarg)
+        self.index = None
+        self.wire = False
+
+    def reverse(self):
+        list.reverse(self)
+        self.index = None
+        self.wire = False
+
+
 class nla_slot(object):
 
     __slots__ = (
@@ -1472,6 +1949,352 @@ class nla_slot(object):
         return repr((self.cell[0], self.get_value()))
 
 
+class nlmsg_view(object):
+    '''
+    Read-only lazy view of a netlink message. The view references
+    the receive buffer and the message offset in it, so creating
+    a view copies no data and instantiates no NLA objects.
+
+    Only the header is decoded by `decode()`. Fixed fields are
+    decoded on the first access, NLA are looked up in the buffer
+    by the header and only the requested ones are decoded::
+
+        marshal = MarshalRtnl()
+        for msg in marshal.parse(data, view=True):
+            msg['index']            # decode only fields
+            msg.get_attr('IFLA_IFNAME')  # decode only one NLA
+
+    `get_attr()`, `get_attrs()`, `get_nested()` return the same
+    values as for the decoded messages. Any other access, like
+    `msg['attrs']`, `dump()` or `repr()`, decodes the complete
+    message once with the original class, see `message()`.
+
+    Views should be used only while the buffer is not reused.
+    '''
+
+    __slots__ = (
+        "data",
+        "offset",
+        "length",
+        "msg_class",
+        "_header",
+        "_fields",
+        "_extra",
+        "_msg",
+        "_index",
+        "_tail",
+        "__weakref__"
+    )
+
+    def __init__(self, msg_class, data, offset=0):
+        self.msg_class = msg_class
+        self.data = data
+        self.offset = offset
+        self.length = 0
+        self._header = {}
+        self._fields = None
+        self._extra = {}
+        self._msg = None
+        self._index = None
+        self._tail = None
+
+    @staticmethod
+    def compile_view(msg_class):
+        '''
+        Return `(hsize, header plan, fields segments, fields size)`
+        for the message class; `None` segments mean that the fixed
+        fields can not be decoded separately from the message.
+        '''
+        key = id(msg_class)
+        if key not in cache_view:
+            # an instance compiles NLA maps and fast-track decoders
+            msg_class()
+            hsize, hplan = msg_class.compile_header(msg_class.header)
+            segments = None
+            fsize = 0
+            # custom decode() may change the fields
+            decode = getattr(msg_class.decode, '__func__', msg_class.decode)
+            generic = getattr(nlmsg_base.decode, '__func__',
+                              nlmsg_base.decode)
+            if decode is generic and \
+                    (not msg_class.fields or
+                     (msg_class.pack != 'struct' and
+                      msg_class.fields[0][1] not in ('s', 'z'))):
+                try:
+                    segments = msg_class.compile_fields()
+                    fsize = sum([x[1] for x in segments])
+                except struct.error:
+                    pass
+            cache_view[key] = (hsize, hplan, segments, fsize)
+        return cache_view[key]
+
+    @property
+    def raw(self):
+        '''
+        A memoryview of the message in the buffer
+        '''
+        return memoryview(self.data)[self.offset:self.offset + self.length]
+
+    def decode(self):
+        offset = self.offset
+        hsize, hplan, segments, fsize = self.compile_view(self.msg_class)
+        for packer, size, names in hplan:
+            self._header.update(zip(names,
+                                    packer.unpack_from(self.data, offset)))
+            offset += size
+        self.length = max(self._header['length'], 4)
+        if clean_cbs:
+            self.unregister_clean_cb()
+
+    parent = None
+
+    def __getattr__(self, key):
+        # NLA may look up NLA classes and other attributes
+        # of the parent message class
+        return getattr(self.msg_class, key)
+
+    def register_clean_cb(self, cb):
+        seq = self._header.get('sequence_number', None)
+        if seq is not None and seq not in clean_cbs:
+            clean_cbs[seq] = []
+        clean_cbs[seq].append(cb)
+
+    def unregister_clean_cb(self):
+        seq = self._header.get('sequence_number', None)
+        msf = self._header.get('flags', 0)
+        if (seq is not None) and \
+                (not msf & NLM_F_REQUEST) and \
+                seq in clean_cbs:
+            # let the message class run the callbacks
+            self.message()
+
+    def message(self):
+        '''
+        Return the completely decoded message
+        '''
+        if self._msg is None:
+            msg = self.msg_class(self.data, offset=self.offset)
+            msg.decode()
+            msg['header'].update(self._header)
+            msg.update(self._extra)
+            self._msg = msg
+        return self._msg
+
+    def _decode_fields(self):
+        if self._fields is None:
+            hsize, hplan, segments, fsize = self.compile_view(self.msg_class)
+            if segments is None:
+                msg = self.message()
+                self._fields = dict([(x[0], msg.get(x[0]))
+                                     for x in self.msg_class.fields])
+                return self._fields
+            fields = {}
+            offset = self.offset + hsize
+            for (compiled, size, names, slices) in segments:
+                values = compiled.unpack_from(self.data, offset)
+                if names is not None:
+                    fields.update(zip(names, values))
+                else:
+                    for (name, start, stop) in slices:
+                        if start is None:
+                            fields[name] = ()
+                        elif stop is None:
+                            fields[name] = values[start]
+                        else:
+                            fields[name] = values[start:stop]
+                offset += size
+            self._fields = fields
+        return self._fields
+
+    def _scan(self, name=None):
+        '''
+        Continue to index the NLA chain up to the next NLA with
+        that name, or up to the end. The index contains NLA
+        offsets, so the NLA objects are not created here.
+        '''
+        hsize, hplan, segments, fsize = self.compile_view(self.msg_class)
+        t_nla_map = self.msg_class._nlmsg_base__t_nla_map
+        if self._index is None:
+            self._index = {}
+            self._tail = (self.offset + hsize + fsize + 4 - 1) & ~ (4 - 1)
+        data = self.data
+        index = self._index
+        offset = self._tail
+        end = self.offset + self.length
+        while offset <= end - 4:
+            (length, base_msg_type) = struct.unpack_from('HH', data, offset)
+            msg_type = base_msg_type & ~(NLA_F_NESTED | NLA_F_NET_BYTEORDER)
+            length = min(max(length, 4), end - offset)
+            prime = t_nla_map.get(msg_type)
+            nla_name = prime['name'] if prime else 'UNKNOWN'
+            (index
+             .setdefault(nla_name, [])
+             .append((offset, length, base_msg_type, prime)))
+            offset += (length + 4 - 1) & ~ (4 - 1)
+            if nla_name == name:
+                self._tail = offset
+                return
+        self._tail = None
+
+    def _lookup(self, name, first=False):
+        '''
+        Return the list of `nla_slot` for NLA with that name,
+        only the first one if `first` is set. Only these NLA
+        are decoded.
+        '''
+        hsize, hplan, segments, fsize = self.compile_view(self.msg_class)
+        if segments is None or \
+                getattr(self.msg_class, '_nlmsg_base__t_nla_map', None) \
+                is None:
+            ret = [slot for slot in self.message().get('attrs', [])
+                   if slot[0] == name]
+            return ret[:1] if first else ret
+        if self._index is None or self._tail is not None:
+            if not first:
+                self._scan()
+            elif name not in (self._index or {}):
+                self._scan(name)
+        ret = []
+        for (offset, length, base_msg_type, prime) in \
+                self._index.get(name, ()):
+            if prime is None:
+                nla = nla_base(data=self.data, offset=offset, length=length)
+            else:
+                msg_class = prime['class']
+                if isinstance(msg_class, types.FunctionType):
+                    # class selectors may need the whole NLA chain
+                    msg_class = msg_class(self.message(),
+                                          data=self.data,
+                                          offset=offset)
+                nla = msg_class(data=self.data,
+                                offset=offset,
+                                parent=self,
+                                length=length,
+                                init=prime['init'])
+                nla._nla_array = prime['nla_array']
+                nla._nla_flags = base_msg_type & (NLA_F_NESTED |
+                                                  NLA_F_NET_BYTEORDER)
+            ret.append(nla_slot(name, nla))
+            if first:
+                break
+        return ret
+
+    def get_attr(self, attr, default=None):
+        '''
+        Return the first NLA with that name or None
+        '''
+        for slot in self._lookup(attr, first=True):
+            return slot[1]
+        return default
+
+    def get_attrs(self, attr):
+        '''
+        Return attrs by name or an empty list
+        '''
+        return [slot[1] for slot in self._lookup(attr)]
+
+    def get_nested(self, *attrs):
+        '''
+        Return nested NLA or None
+        '''
+        pointer = self
+        for attr in attrs:
+            pointer = pointer.get_attr(attr)
+            if pointer is None:
+                return
+        return pointer
+
+    def __getitem__(self, key):
+        if key == 'header':
+            return self._header
+        elif key in self._extra:
+            return self._extra[key]
+        elif key not in ('attrs', 'value'):
+            fields = self._decode_fields()
+            if key in fields:
+                return fields[key]
+            elif self.compile_view(self.msg_class)[2] is not None:
+                # the message has no other keys, don't decode it
+                raise KeyError(key)
+        return self.message()[key]
+
+    def __setitem__(self, key, value):
+        if key == 'header':
+            self._header = value
+        else:
+            self._extra[key] = value
+        if self._msg is not None:
+            self._msg[key] = value
+
+    def __contains__(self, key):
+        return key in self.message()
+
+    def __iter__(self):
+        return iter(self.message())
+
+    def __len__(self):
+        return len(self.message())
+
+    def __eq__(self, rvalue):
+        if isinstance(rvalue, nlmsg_view):
+            rvalue = rvalue.message()
+        return self.message() == rvalue
+
+    def __ne__(self, rvalue):
+        return not self.__eq__(rvalue)
+
+    def __repr__(self):
+        return repr(self.message())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.message().keys()
+
+    def values(self):
+        return self.message().values()
+
+    def items(self):
+        return self.message().items()
+
+    def getvalue(self):
+        return self
+
+    def release(self):
+        if self._msg is not None:
+            self._msg.release()
+            self._msg = None
+
+    def __reduce__(self):
+        # the view is restored as a decoded message
+        if self._msg is not None:
+            return self._msg.__reduce__()
+        names = [x[0] for x in self.msg_class.header or ()]
+        fields = self._decode_fields()
+        state = (tuple([self._header.get(x) for x in names]),
+                 tuple([fields.get(x[0]) for x in self.msg_class.fields]),
+                 dict([(k, v) for (k, v) in self._header.items()
+                       if k not in names]),
+                 dict(self._extra))
+        return (load_wire, (self.msg_class, self.raw.tobytes(), state))
+
+    def dump(self):
+        '''
+        Dump packet as a dict
+        '''
+        return self.message().dump()
+
+    def nla2name(self, name):
+        return self.msg_class.nla2name(name)
+
+    def name2nla(self, name):
+        return self.msg_class.name2nla(name)
+
+
 class nla_base(nlmsg_base):
     '''
     The NLA base class. Use `nla_header` class as the header.
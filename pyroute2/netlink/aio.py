@@ -0,0 +1,338 @@
+'''
+Asyncio netlink sockets
+=======================
+
+`AsyncNetlinkSocket` works on an asyncio event loop. The socket
+is read with `loop.add_reader()`, so one loop serves any number
+of sockets, and no threads are started.
+
+Requests are coroutines, the responses are collected by the
+sequence number::
+
+    async def main():
+        sock = AsyncIPRSocket()
+        msg = ifinfmsg()
+        msg['index'] = 1
+        (lo, ) = await sock.nlm_request(msg, RTM_GETLINK, NLM_F_REQUEST)
+
+Broadcast messages are delivered to async iterators, see
+`AsyncNetlinkSocket.events()`::
+
+    sock.bind()
+    async for msg in sock.events():
+        print(msg.get('event'))
+
+The socket attaches to the event loop on the first request or
+subscription and must be used from that loop only.
+
+Requests accept a `timeout`, and fail with `NetlinkTimeoutError`
+on expiry; the late responses are dropped, see
+`NetlinkMixin.cancel()`. The thread local `deadline()` blocks are
+not supported here, since the coroutines share the thread.
+
+.. note::
+    The module requires Python >= 3.6
+'''
+import errno
+import asyncio
+
+from pyroute2.netlink import nlmsg
+from pyroute2.netlink import NLMSG_DONE
+from pyroute2.netlink import NLMSG_ERROR
+from pyroute2.netlink import NLM_F_ACK
+from pyroute2.netlink import NLM_F_DUMP
+from pyroute2.netlink import NLM_F_MULTI
+from pyroute2.netlink import NLM_F_REQUEST
+from pyroute2.netlink import NLM_F_ROOT
+from pyroute2.netlink.exceptions import NetlinkTimeoutError
+from pyroute2.netlink.nlsocket import NetlinkSocket
+
+
+def is_last(msg):
+    '''
+    Return True, if the message ends the kernel response
+    '''
+    return msg['header']['type'] in (NLMSG_DONE, NLMSG_ERROR) or \
+        not msg['header']['flags'] & NLM_F_MULTI
+
+
+class AsyncRequest(object):
+    '''
+    A request waiting for the response messages
+    '''
+    __slots__ = ('future', 'terminate', 'callback', 'msgs', 'complete')
+
+    def __init__(self, future, terminate=None, callback=None):
+        self.future = future
+        self.terminate = terminate
+        self.callback = callback
+        self.msgs = []
+        self.complete = False
+
+    def feed(self, msg):
+        '''
+        Add a response message; return True, if the response is
+        complete. The terminator conditions are the same as in
+        `NetlinkMixin.get()`.
+        '''
+        self.complete = self._feed(msg)
+        return self.complete
+
+    def _feed(self, msg):
+        if self.future.done():
+            # cancelled, skip the rest of the response
+            return is_last(msg)
+        if self.callback is not None and self.callback(msg):
+            return False
+        error = msg['header'].get('error', None)
+        if error is not None:
+            self.future.set_exception(error)
+            return True
+        tmsg = None
+        if self.terminate is not None:
+            tmsg = self.terminate(msg)
+            if isinstance(tmsg, nlmsg):
+                self.msgs.append(msg)
+        if (msg['header']['type'] == NLMSG_DONE) or tmsg:
+            self.future.set_result(tuple(self.msgs))
+            return True
+        self.msgs.append(msg)
+        if not msg['header']['flags'] & NLM_F_MULTI:
+            self.future.set_result(tuple(self.msgs))
+            return True
+        return False
+
+
+class AsyncNetlinkSocket(NetlinkSocket):
+    '''
+    Netlink socket on an asyncio event loop
+    '''
+
+    def __init__(self, *argv, **kwarg):
+        self.loop = None
+        self.dump_lock = None
+        self.requests = {}      # {msg_seq: AsyncRequest}
+        self.drains = {}        # {msg_seq: future}, see drain()
+        self.subscribers = []   # [asyncio.Queue, ...]
+        super(AsyncNetlinkSocket, self).__init__(*argv, **kwarg)
+        # drop the sync wrappers, set by `NetlinkMixin.__init__()`,
+        # `nlm_request()` is a coroutine here
+        self.__dict__.pop('nlm_request', None)
+
+    def attach(self, loop=None):
+        '''
+        Start reading the socket in the event loop, by default
+        in the current one
+        '''
+        if self.loop is not None:
+            return
+        self.loop = loop or asyncio.get_event_loop()
+        if self.dump_lock is None:
+            self.dump_lock = asyncio.Lock()
+        self.loop.add_reader(self._sock.fileno(), self.async_read)
+
+    def detach(self):
+        '''
+        Stop reading the socket in the event loop
+        '''
+        if self.loop is None:
+            return
+        self.loop.remove_reader(self._sock.fileno())
+        self.loop = None
+
+    def async_read(self):
+        '''
+        Receive one datagram and dispatch the messages; is called
+        by the event loop, when the socket is readable
+        '''
+        try:
+            # the datagram size is peeked, so dumps are never truncated
+            data = self.recv_ft(-1)
+        except (BlockingIOError, InterruptedError):
+            return
+        except Exception as e:
+            if getattr(e, 'errno', None) == errno.ENOBUFS:
+                # lost broadcast messages, see `NetlinkMixin.overrun()`
+                self.dispatch((self.overrun(), ))
+            else:
+                self.fail(e)
+            return
+        self.dispatch(self.marshal.parse(data))
+
+    def fail(self, e):
+        '''
+        Deliver the error to all the requests and subscribers
+        '''
+        for request in tuple(self.requests.values()):
+            if not request.future.done():
+                request.future.set_exception(e)
+        for queue in self.subscribers:
+            queue.put_nowait(e)
+
+    def dispatch(self, msgs):
+        '''
+        Pass the messages to the requests by msg_seq; the rest
+        go to the subscribers, see `events()`. Orphaned
+        NLMSG_ERROR messages are dropped.
+        '''
+        for msg in msgs:
+            seq = msg['header']['sequence_number']
+            self.run_callbacks(msg)
+            if seq in self.drains:
+                # the rest of a cancelled dump, see `drain()`
+                if is_last(msg):
+                    future = self.drains.pop(seq)
+                    if not future.done():
+                        future.set_result(None)
+                continue
+            request = self.requests.get(seq)
+            if request is not None:
+                if request.feed(msg):
+                    del self.requests[seq]
+            elif self.is_cancelled(msg):
+                # late responses to the timed out requests
+                continue
+            elif msg['header']['type'] != NLMSG_ERROR:
+                for queue in self.subscribers:
+                    queue.put_nowait(msg)
+
+    async def events(self):
+        '''
+        Async iterator over the broadcast messages; every call
+        creates a new subscription::
+
+            sock.bind()
+            async for msg in sock.events():
+                ...
+
+        The iteration stops when the socket is closed.
+        '''
+        self.attach()
+        queue = asyncio.Queue()
+        self.subscribers.append(queue)
+        try:
+            while True:
+                msg = await queue.get()
+                if msg is None:
+                    return
+                elif isinstance(msg, Exception):
+                    raise msg
+                yield msg
+        finally:
+            self.subscribers.remove(queue)
+
+    async def nlm_request(self, msg, msg_type,
+                          msg_flags=NLM_F_REQUEST | NLM_F_DUMP,
+                          terminate=None,
+                          callback=None,
+                          nla_filter=None,
+                          msg_filter=None,
+                          timeout=None):
+        '''
+        Send the request and return the response messages,
+        the arguments are the same as for the sync version
+        '''
+        self.attach()
+        # NLM_F_ROOT is NLM_F_REPLACE for new* requests, see
+        # `NetlinkMixin.nlm_request()`
+        if msg_flags & NLM_F_ROOT and not msg_flags & NLM_F_ACK:
+            # the kernel runs one dump per socket at once,
+            # and returns EBUSY to the rest
+            async with self.dump_lock:
+                await self.drain(timeout)
+                return await self.send_request(msg, msg_type, msg_flags,
+                                               terminate, callback,
+                                               nla_filter, msg_filter,
+                                               timeout, dump=True)
+        return await self.send_request(msg, msg_type, msg_flags,
+                                       terminate, callback,
+                                       nla_filter, msg_filter, timeout)
+
+    async def drain(self, timeout=None):
+        '''
+        Wait for the rest of the cancelled dumps. The kernel runs
+        only one dump per socket, so a new dump fails with EBUSY,
+        until the cancelled one is read up to NLMSG_DONE, see
+        `NetlinkMixin.drain()`.
+
+        Is called by `nlm_request()` under the `dump_lock`.
+        '''
+        wait = self.get_timeout
+        if timeout is not None:
+            wait = min(wait, timeout)
+        for msg_seq, future in tuple(self.drains.items()):
+            try:
+                await asyncio.wait_for(asyncio.shield(future), wait)
+            except asyncio.TimeoutError:
+                # give up on this dump, like the sync version
+                self.drains.pop(msg_seq, None)
+                raise NetlinkTimeoutError('dump %s is not drained'
+                                          % msg_seq)
+
+    async def send_request(self, msg, msg_type, msg_flags,
+                           terminate, callback, nla_filter, msg_filter,
+                           timeout=None, dump=False):
+        msg_seq = self.addr_pool.alloc()
+        request = AsyncRequest(self.loop.create_future(), terminate, callback)
+        self.requests[msg_seq] = request
+        try:
+            if nla_filter is not None:
+                self.marshal.nla_filters[msg_seq] = frozenset(nla_filter)
+            if msg_filter is not None:
+                self.marshal.msg_filters[msg_seq] = msg_filter
+            # the proxy may respond in the userspace, then the response
+            # is dispatched right away, see `IPRSocketMixin._gate()`
+            self.put(msg, msg_type, msg_flags, msg_seq=msg_seq)
+            # the backlog is not used here
+            self.backlog.pop(msg_seq, None)
+            wait = self.get_timeout
+            if timeout is not None:
+                wait = min(wait, timeout)
+            try:
+                return await asyncio.wait_for(request.future, wait)
+            except asyncio.TimeoutError:
+                self.cancelled.add(msg_seq)
+                if dump and not request.complete:
+                    self.drains[msg_seq] = self.loop.create_future()
+                if timeout is not None and timeout <= self.get_timeout:
+                    raise NetlinkTimeoutError('request %s expired'
+                                              % msg_seq)
+                if self.get_timeout_exception:
+                    raise self.get_timeout_exception()
+                return ()
+            except asyncio.CancelledError:
+                # the caller's timeout, see `AsyncIPRoute`
+                self.cancelled.add(msg_seq)
+                if dump and not request.complete:
+                    self.drains[msg_seq] = self.loop.create_future()
+                raise
+        finally:
+            self.requests.pop(msg_seq, None)
+            self.marshal.nla_filters.pop(msg_seq, None)
+            self.marshal.msg_filters.pop(msg_seq, None)
+            # see the comment in `NetlinkMixin.nlm_request()`
+            self.addr_pool.free(msg_seq, ban=0xff)
+
+    def bind(self, groups=0, pid=None, **kwarg):
+        '''
+        Bind the socket, see `NetlinkSocket.bind()`; the
+        `async_cache` option is not used
+        '''
+        kwarg.pop('async_cache', None)
+        # bind() may recreate the underlying socket
+        loop = self.loop
+        self.detach()
+        super(AsyncNetlinkSocket, self).bind(groups, pid, **kwarg)
+        if loop is not None:
+            self.attach(loop)
+
+    def close(self):
+        if not self.closed:
+            self.detach()
+            for request in self.requests.values():
+                request.future.cancel()
+            self.requests = {}
+            self.drains = {}
+            for queue in self.subscribers:
+                queue.put_nowait(None)
+        super(AsyncNetlinkSocket, self).close()
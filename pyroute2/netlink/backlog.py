@@ -0,0 +1,244 @@
+'''
+Bounded Zero queue
+==================
+
+Broadcast messages and the responses nobody waits for go to the
+Zero queue, `NetlinkSocket.backlog[0]`, until they are taken by
+`get()`. The queue is not limited by default, so a slow consumer
+of a busy monitoring socket, e.g. on a neighbour storm, may run
+out of memory. `NetlinkSocket.limit_backlog()` sets the limit and
+the policy to apply, when the queue is full::
+
+    ip = IPRSocket()
+    ip.limit_backlog(65536, policy='coalesce')
+    ip.bind(async_cache=True)
+
+Policies:
+
+* block -- the threads waiting in `get()` for other responses stop
+  reading the socket until the Zero queue consumer takes the
+  messages, so the kernel buffers the new ones; if the consumer
+  doesn't wait in `get()`, the socket is read anyway, and the
+  oldest messages are dropped above the double limit
+* drop -- drop the oldest messages
+* coalesce -- keep only the latest message per object, see
+  `NetlinkSocket.object_key()`, and drop the oldest messages,
+  if it is not enough
+* spill -- move the oldest messages to an on-disk ring, and read
+  them back when the consumer takes the queue; the oldest spilled
+  messages are dropped, when the ring is full
+
+The consumer gets an `NLMSG_OVERRUN` marker before the messages
+taken after a drop, see `NetlinkMixin.overrun()`, and should re-dump
+the objects like on ENOBUFS. The queue counters: `drops`, `coalesced`
+and `spilled` messages.
+
+With `async_cache` the raw buffers queue is limited as well; the
+reader thread waits for the parser, when the queue is full, and
+the kernel drops the messages on the socket buffer overflow.
+'''
+import tempfile
+import collections
+
+policies = ('block', 'drop', 'coalesce', 'spill')
+
+
+class SpillRing(object):
+    '''
+    On-disk ring of messages. The raw message data is stored in
+    the file, while the messages w/o the data, like overrun
+    markers, are kept in memory.
+    '''
+
+    def __init__(self, path=None, size=16 * 1024 * 1024):
+        self.size = size
+        if path is None:
+            self.file = tempfile.TemporaryFile()
+        else:
+            self.file = open(path, 'w+b')
+        self.tail = 0
+        # [(offset, length, msg), ...], the oldest first
+        self.records = collections.deque()
+
+    def __len__(self):
+        return len(self.records)
+
+    def push(self, msg):
+        '''
+        Store the message; return the number of the oldest
+        records dropped to free the space
+        '''
+        data = getattr(msg, 'data', None)
+        length = msg['header'].get('length')
+        if not data or not length:
+            self.records.append((self.tail, 0, msg))
+            return 0
+        offset = msg.offset
+        if length > self.size:
+            return 1
+        pos = self.tail
+        wrap = pos + length > self.size
+        if wrap:
+            pos = 0
+        dropped = 0
+        # the oldest records follow the tail in the ring
+        while self.records:
+            start = self.records[0][0]
+            if (wrap and start >= self.tail) or \
+                    (pos <= start < pos + length):
+                self.records.popleft()
+                dropped += 1
+            else:
+                break
+        self.file.seek(pos)
+        self.file.write(bytes(data[offset:offset + length]))
+        self.records.append((pos, length, None))
+        self.tail = pos + length
+        return dropped
+
+    def pop_all(self, parse):
+        '''
+        Return all the stored messages and clear the ring
+        '''
+        ret = []
+        for (offset, length, msg) in self.records:
+            if msg is not None:
+                ret.append(msg)
+                continue
+            self.file.seek(offset)
+            ret.extend(parse(self.file.read(length)))
+        self.records.clear()
+        self.tail = 0
+        return ret
+
+    def close(self):
+        self.file.close()
+
+
+class ZeroQueue(object):
+    '''
+    The Zero queue with an optional limit, see the module docs.
+
+    * size -- max messages in the queue, None for no limit
+    * policy -- what to do when the queue is full
+    * key -- `key(msg)` returns the object key for the coalesce
+      policy, or None, if the message should not be coalesced
+    * overrun -- returns the marker of the dropped messages
+    * parse -- parses the spilled data
+    * spill -- the spill file path, a temporary file by default
+    * spill_size -- the spill ring size in bytes
+    '''
+
+    def __init__(self, size=None, policy='drop', key=None, overrun=None,
+                 parse=None, spill=None, spill_size=16 * 1024 * 1024):
+        if policy not in policies:
+            raise ValueError('unknown policy %s' % policy)
+        self.size = size
+        self.policy = policy
+        self.key = key if policy == 'coalesce' else None
+        self.overrun = overrun
+        self.parse = parse
+        self.ring = None
+        if policy == 'spill':
+            self.ring = SpillRing(spill, spill_size)
+        # [(key, msg), ...], the oldest first
+        self.queue = collections.deque()
+        # {key: msg}, the latest messages to coalesce
+        self.latest = {}
+        self.stale = 0
+        self.lost = False
+        self.drops = 0
+        self.coalesced = 0
+        self.spilled = 0
+
+    def __len__(self):
+        return len(self.queue) - self.stale + len(self.ring or ())
+
+    def __bool__(self):
+        return len(self) > 0 or self.lost
+
+    __nonzero__ = __bool__
+
+    def __iter__(self):
+        for (key, msg) in self.queue:
+            if key is None or self.latest.get(key) is msg:
+                yield msg
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def full(self):
+        '''
+        True, if the readers should wait for the consumer,
+        see the `block` policy
+        '''
+        return self.policy == 'block' and \
+            self.size is not None and \
+            len(self) >= self.size
+
+    def append(self, msg):
+        key = None
+        if self.key is not None:
+            key = self.key(msg)
+            if key is not None:
+                if key in self.latest:
+                    # the older message becomes stale
+                    self.stale += 1
+                    self.coalesced += 1
+                self.latest[key] = msg
+        self.queue.append((key, msg))
+        if self.stale > 1024 and self.stale * 2 > len(self.queue):
+            # purge the stale messages
+            self.queue = collections.deque([(k, m) for (k, m) in self.queue
+                                            if k is None or
+                                            self.latest.get(k) is m])
+            self.stale = 0
+        if self.size is None:
+            return
+        limit = self.size
+        if self.policy == 'block':
+            limit *= 2
+        while len(self.queue) - self.stale > limit:
+            (key, msg) = self.queue.popleft()
+            if key is not None:
+                if self.latest.get(key) is not msg:
+                    self.stale -= 1
+                    continue
+                del self.latest[key]
+            if self.ring is not None:
+                self.spilled += 1
+                dropped = self.ring.push(msg)
+            else:
+                dropped = 1
+            if dropped:
+                self.drops += dropped
+                self.lost = True
+
+    def extend(self, msgs):
+        for msg in msgs:
+            self.append(msg)
+
+    def take(self):
+        '''
+        Return all the messages and clear the queue
+        '''
+        ret = []
+        if self.lost and self.overrun is not None:
+            ret.append(self.overrun())
+        self.lost = False
+        if self.ring is not None:
+            ret.extend(self.ring.pop_all(self.parse))
+        ret.extend(self)
+        self.queue.clear()
+        self.latest.clear()
+        self.stale = 0
+        return ret
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
@@ -0,0 +1,254 @@
+'''
+Classic BPF filters
+===================
+
+Socket filters, see `SO_ATTACH_FILTER`, drop irrelevant packets in
+the kernel, before they are queued to the socket.
+
+Netlink filters
+---------------
+
+Monitoring sockets receive every message of the bound multicast
+groups, and decode them all. `NetlinkSocket.attach_filter()` builds
+a filter from a simple spec, so the kernel drops the rest::
+
+    from pyroute2 import IPRSocket
+    from pyroute2.netlink.rtnl import RTM_NEWROUTE
+    from pyroute2.netlink.rtnl import RTM_DELROUTE
+
+    ip = IPRSocket()
+    ip.bind()
+    # only routes of the table 10
+    ip.attach_filter(msg_types=(RTM_NEWROUTE, RTM_DELROUTE), table=10)
+
+All the spec fields are optional, may be an int or a list of ints,
+and are combined with AND:
+
+* msg_types -- netlink message types
+* family -- the first byte of the payload, the address family
+  for RTNL messages
+* ifindex -- RTNL link, address, neighbour and route (RTA_OIF)
+  interface index
+* table -- RTNL route and rule table
+
+The `ifindex` and `table` checks apply only to the messages that
+have these fields, e.g. `table` does not filter link messages.
+
+Control messages, like errors and NLMSG_DONE, and the responses
+sent to the socket port always pass the filter, so the socket can
+still be used for requests. The socket must be bound before the
+filter is attached, otherwise the kernel assigns the port later.
+'''
+import struct
+from ctypes import Structure
+from ctypes import addressof
+from ctypes import string_at
+from ctypes import sizeof
+from ctypes import c_ushort
+from ctypes import c_ubyte
+from ctypes import c_uint
+from ctypes import c_void_p
+from pyroute2.netlink import NLMSG_NOOP
+from pyroute2.netlink import NLMSG_ERROR
+from pyroute2.netlink import NLMSG_DONE
+from pyroute2.netlink import NLMSG_OVERRUN
+from pyroute2.netlink.rtnl import RTM_NEWLINK
+from pyroute2.netlink.rtnl import RTM_DELLINK
+from pyroute2.netlink.rtnl import RTM_NEWADDR
+from pyroute2.netlink.rtnl import RTM_DELADDR
+from pyroute2.netlink.rtnl import RTM_NEWROUTE
+from pyroute2.netlink.rtnl import RTM_DELROUTE
+from pyroute2.netlink.rtnl import RTM_NEWNEIGH
+from pyroute2.netlink.rtnl import RTM_DELNEIGH
+from pyroute2.netlink.rtnl import RTM_NEWRULE
+from pyroute2.netlink.rtnl import RTM_DELRULE
+
+SO_ATTACH_FILTER = 26
+SO_DETACH_FILTER = 27
+
+# instruction classes
+BPF_LD = 0x00
+BPF_LDX = 0x01
+BPF_JMP = 0x05
+BPF_RET = 0x06
+BPF_MISC = 0x07
+# sizes
+BPF_W = 0x00
+BPF_H = 0x08
+BPF_B = 0x10
+# modes
+BPF_IMM = 0x00
+BPF_ABS = 0x20
+BPF_IND = 0x40
+# jumps
+BPF_JEQ = 0x10
+# misc
+BPF_TAX = 0x00
+# ancillary data, A = offset of the attr X, starting from A
+SKF_AD_NLATTR = (-0x1000 + 12) & 0xffffffff
+
+# RTNL payload layout
+NLMSG_HDRLEN = 16
+RTM_IFINDEX = NLMSG_HDRLEN + 4     # ifinfmsg, ifaddrmsg, ndmsg
+RTM_TABLE = NLMSG_HDRLEN + 4       # rtmsg, fibmsg
+RTM_NLA = NLMSG_HDRLEN + 12        # rtmsg, fibmsg NLA chain
+RTA_OIF = 4
+RTA_TABLE = 15                     # the same as FRA_TABLE
+
+ifindex_types = (RTM_NEWLINK, RTM_DELLINK,
+                 RTM_NEWADDR, RTM_DELADDR,
+                 RTM_NEWNEIGH, RTM_DELNEIGH)
+route_types = (RTM_NEWROUTE, RTM_DELROUTE)
+table_types = (RTM_NEWROUTE, RTM_DELROUTE,
+               RTM_NEWRULE, RTM_DELRULE)
+control_types = (NLMSG_NOOP, NLMSG_ERROR, NLMSG_DONE, NLMSG_OVERRUN)
+
+
+class sock_filter(Structure):
+    _fields_ = [('code', c_ushort),  # u16
+                ('jt', c_ubyte),     # u8
+                ('jf', c_ubyte),     # u8
+                ('k', c_uint)]       # u32
+
+
+class sock_fprog(Structure):
+    _fields_ = [('len', c_ushort),
+                ('filter', c_void_p)]
+
+
+def compile_bpf(code):
+    '''
+    Compile `[[code, jt, jf, k], ...]` into the `SO_ATTACH_FILTER`
+    option value. The program object is returned as well, and it
+    must be kept until the option is set.
+    '''
+    ProgramType = sock_filter * len(code)
+    program = ProgramType(*[sock_filter(*line) for line in code])
+    sfp = sock_fprog(len(code), addressof(program[0]))
+    return string_at(addressof(sfp), sizeof(sfp)), program
+
+
+def _be(fmt, value):
+    # BPF loads fields as big endian, while netlink uses the host
+    # byte order, so compare the loaded value to swapped constants
+    return struct.unpack('>' + fmt, struct.pack('=' + fmt, value))[0]
+
+
+def _tuple(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set)):
+        return tuple(value)
+    return (value, )
+
+
+class Program(object):
+    '''
+    A tiny BPF assembler with labels; the jump targets may be
+    labels or None for the next instruction
+    '''
+
+    def __init__(self):
+        self.code = []
+        self.labels = {}
+
+    def label(self, name):
+        self.labels[name] = len(self.code)
+
+    def insn(self, code, k=0, jt=None, jf=None):
+        self.code.append((code, jt, jf, k))
+
+    def match(self, values, fmt, jt, jf):
+        # jump to `jt` if A is one of values, else to `jf`
+        done = None
+        if jt is None:
+            done = jt = 'match_%i' % len(self.code)
+        for idx, value in enumerate(values):
+            last = idx == len(values) - 1
+            if fmt:
+                value = _be(fmt, value & 0xffffffff)
+            self.insn(BPF_JMP | BPF_JEQ, value, jt, jf if last else None)
+        if done is not None:
+            self.label(done)
+
+    def compile(self):
+        ret = []
+        for (idx, (code, jt, jf, k)) in enumerate(self.code):
+            jumps = []
+            for target in (jt, jf):
+                if target is None:
+                    jumps.append(0)
+                else:
+                    offset = self.labels[target] - idx - 1
+                    # jt and jf are u8, see `sock_filter`
+                    if not 0 <= offset <= 255:
+                        raise ValueError('jump offset %i is out of range, '
+                                         'the filter spec is too long'
+                                         % offset)
+                    jumps.append(offset)
+            ret.append([code, jumps[0], jumps[1], k])
+        return ret
+
+
+def nlmsg_filter(portid=0, msg_types=None, family=None,
+                 ifindex=None, table=None):
+    '''
+    Build the BPF code for the netlink message spec, see the
+    module docs for the fields. Messages with `nlmsg_pid == portid`
+    always pass, unless portid is 0.
+    '''
+    msg_types = _tuple(msg_types)
+    family = _tuple(family)
+    ifindex = _tuple(ifindex)
+    table = _tuple(table)
+    p = Program()
+    load_type = BPF_LD | BPF_H | BPF_ABS
+    # control messages and responses
+    p.insn(load_type, 4)
+    p.match(control_types, 'H', 'accept', None)
+    if portid:
+        p.insn(BPF_LD | BPF_W | BPF_ABS, 12)
+        p.match((portid, ), 'I', 'accept', None)
+    if msg_types:
+        p.insn(load_type, 4)
+        p.match(msg_types, 'H', None, 'reject')
+    if family:
+        p.insn(BPF_LD | BPF_B | BPF_ABS, NLMSG_HDRLEN)
+        p.match(family, None, None, 'reject')
+    if ifindex:
+        # link, address and neighbour header
+        p.insn(load_type, 4)
+        p.match(ifindex_types, 'H', None, 'ifindex_route')
+        p.insn(BPF_LD | BPF_W | BPF_ABS, RTM_IFINDEX)
+        p.match(ifindex, 'I', 'ifindex_done', 'reject')
+        # routes: RTA_OIF
+        p.label('ifindex_route')
+        p.match(route_types, 'H', None, 'ifindex_done')
+        p.insn(BPF_LD | BPF_IMM, RTM_NLA)
+        p.insn(BPF_LDX | BPF_IMM, RTA_OIF)
+        p.insn(BPF_LD | BPF_W | BPF_ABS, SKF_AD_NLATTR)
+        p.match((0, ), None, 'reject', None)
+        p.insn(BPF_MISC | BPF_TAX)
+        p.insn(BPF_LD | BPF_W | BPF_IND, 4)
+        p.match(ifindex, 'I', None, 'reject')
+        p.label('ifindex_done')
+    if table:
+        p.insn(load_type, 4)
+        p.match(table_types, 'H', None, 'accept')
+        # RTA_TABLE, or the header field for old kernels
+        p.insn(BPF_LD | BPF_IMM, RTM_NLA)
+        p.insn(BPF_LDX | BPF_IMM, RTA_TABLE)
+        p.insn(BPF_LD | BPF_W | BPF_ABS, SKF_AD_NLATTR)
+        p.match((0, ), None, 'table_header', None)
+        p.insn(BPF_MISC | BPF_TAX)
+        p.insn(BPF_LD | BPF_W | BPF_IND, 4)
+        p.match(table, 'I', 'accept', 'reject')
+        p.label('table_header')
+        p.insn(BPF_LD | BPF_B | BPF_ABS, RTM_TABLE)
+        p.match([x for x in table if x < 256] or [256], None,
+                'accept', 'reject')
+    p.label('accept')
+    p.insn(BPF_RET, 0xffffffff)
+    p.label('reject')
+    p.insn(BPF_RET, 0)
+    return p.compile()
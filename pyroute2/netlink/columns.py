@@ -0,0 +1,215 @@
+'''
+Columnar decoder
+================
+
+Decode homogeneous dumps, like routes or neighbours, into
+columns instead of message objects. Fixed fields and NLA with
+scalar integer values are stored in `array.array`, other NLA
+are decoded as usual and stored in lists::
+
+    from pyroute2 import IPRoute
+
+    with IPRoute() as ipr:
+        routes = ipr.get_routes(columns=('table',
+                                         'dst_len',
+                                         'RTA_DST',
+                                         'RTA_OIF'))
+
+    routes['RTA_OIF']  # array('I', [2, 2, 3, ...])
+    routes['RTA_DST']  # ['10.0.0.0', '10.0.1.0', None, ...]
+    len(routes)        # number of columns
+    routes.rows        # number of rows
+
+The columns are filled directly from the message buffer, the
+messages are not decoded, see `Columns.append()`. Field and NLA
+names are the same as for `nlmsg.get()` and `nlmsg.get_attr()`,
+NLA names can be used in the short form, e.g. `oif` for `RTA_OIF`.
+Missing NLA are stored as `default` in arrays and as `None` in
+lists.
+
+With NumPy installed, the columns can be exported as a NumPy
+structured array::
+
+    routes.numpy()
+
+A `Columns` object can be used also with `nlm_request()` or
+parsed buffers::
+
+    from pyroute2.netlink.columns import Columns
+    from pyroute2.netlink.rtnl.ndmsg import ndmsg
+
+    neighbours = Columns(ndmsg, ('ifindex', 'state', 'NDA_DST'))
+    for msg in marshal.parse(data, view=True):
+        neighbours.append(msg)
+
+`Columns.append()` returns False, so it can be used as
+`msg_filter` to drop messages after the data is collected.
+'''
+import array
+import struct
+from pyroute2.common import basestring
+from pyroute2.netlink import NLA_F_NESTED
+from pyroute2.netlink import NLA_F_NET_BYTEORDER
+from pyroute2.netlink import nla_base
+from pyroute2.netlink import nlmsg_base
+from pyroute2.netlink import nlmsg_view
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def typecode(fmt):
+    '''
+    Return `array.array` typecode for a scalar integer struct
+    format or None
+    '''
+    if not isinstance(fmt, basestring):
+        return None
+    if fmt[:1] in ('<', '>', '!', '='):
+        size = struct.calcsize(fmt)
+        fmt = fmt[1:]
+    elif fmt[:1] == '@':
+        fmt = fmt[1:]
+        size = struct.calcsize(fmt)
+    else:
+        size = struct.calcsize(fmt) if len(fmt) == 1 else 0
+    if len(fmt) != 1 or fmt not in 'bBhHiIlLqQ':
+        return None
+    for code in ('bhilq' if fmt.islower() else 'BHILQ'):
+        try:
+            if array.array(code).itemsize >= size:
+                return code
+        except ValueError:
+            # no q/Q in Python 2
+            pass
+    return None
+
+
+def is_scalar(nla_class):
+    '''
+    Check if the NLA value can be unpacked directly from the buffer
+    '''
+    if not isinstance(nla_class, type) or \
+            not issubclass(nla_class, nla_base) or \
+            nla_class.value_map or \
+            len(nla_class.fields) != 1 or \
+            nla_class.fields[0][0] != 'value':
+        return False
+    for method in ('decode', 'getvalue'):
+        custom = getattr(nla_class, method)
+        generic = getattr(nlmsg_base, method)
+        if getattr(custom, '__func__', custom) is not \
+                getattr(generic, '__func__', generic):
+            return False
+    return typecode(nla_class.fields[0][1]) is not None
+
+
+class Columns(dict):
+    '''
+    Columns container: `{name: array or list}`
+    '''
+
+    def __init__(self, msg_class, names, default=0):
+        dict.__init__(self)
+        self.msg_class = msg_class
+        self.names = tuple(names)
+        self.default = default
+        self.rows = 0
+        # compile NLA maps
+        msg_class()
+        fields = dict([(x[0], x[1]) for x in msg_class.fields])
+        r_nla_map = msg_class._nlmsg_base__r_nla_map or {}
+        # [(name, field_name)]
+        self.field_columns = []
+        # {nla_type: (name, nla_name, struct, size)} for scalar NLA
+        self.scalar_columns = {}
+        # [(name, nla_name)] for other NLA
+        self.nla_columns = []
+        for name in self.names:
+            if name in fields:
+                code = typecode(fields[name])
+                self[name] = array.array(code) if code else []
+                self.field_columns.append((name, name))
+                continue
+            nla_name = msg_class.name2nla(name)
+            if nla_name not in r_nla_map:
+                raise KeyError(name)
+            prime = r_nla_map[nla_name]
+            if is_scalar(prime['class']):
+                fmt = prime['class'].fields[0][1]
+                self[name] = array.array(typecode(fmt))
+                self.scalar_columns[prime['type']] = (name,
+                                                      nla_name,
+                                                      struct.Struct(fmt),
+                                                      struct.calcsize(fmt))
+            else:
+                self[name] = []
+                self.nla_columns.append((name, nla_name))
+
+    def append(self, msg):
+        '''
+        Add a row from a message. The message can be an `nlmsg_view`
+        or a decoded message of the `msg_class`. Return False.
+        '''
+        if msg.__class__ is not self.msg_class and \
+                getattr(msg, 'msg_class', None) is not self.msg_class:
+            return False
+        for (name, field) in self.field_columns:
+            self[name].append(msg[field])
+        (hsize, hplan, segments, fsize) = \
+            nlmsg_view.compile_view(self.msg_class)
+        if self.scalar_columns and \
+                isinstance(msg, nlmsg_view) and \
+                segments is not None:
+            # walk the NLA chain in the buffer and unpack the values
+            data = msg.data
+            offset = (msg.offset + hsize + fsize + 4 - 1) & ~ (4 - 1)
+            end = msg.offset + msg.length
+            missing = dict(self.scalar_columns)
+            while offset <= end - 4 and missing:
+                (length, msg_type) = struct.unpack_from('HH', data, offset)
+                msg_type &= ~(NLA_F_NESTED | NLA_F_NET_BYTEORDER)
+                if msg_type in missing and length >= 4 + missing[msg_type][3]:
+                    (name, nla_name, compiled, size) = missing.pop(msg_type)
+                    self[name].append(compiled.unpack_from(data,
+                                                           offset + 4)[0])
+                offset += (max(length, 4) + 4 - 1) & ~ (4 - 1)
+            for (name, nla_name, compiled, size) in missing.values():
+                self[name].append(self.default)
+        else:
+            for (name, nla_name, compiled, size) in \
+                    self.scalar_columns.values():
+                value = msg.get_attr(nla_name)
+                self[name].append(self.default if value is None else value)
+        for (name, nla_name) in self.nla_columns:
+            self[name].append(msg.get_attr(nla_name))
+        self.rows += 1
+        return False
+
+    def truncate(self, rows):
+        '''
+        Drop the rows starting from `rows`, e.g. the rows of
+        an interrupted dump
+        '''
+        for name in self.names:
+            del self[name][rows:]
+        self.rows = min(self.rows, rows)
+
+    def numpy(self):
+        '''
+        Return the columns as a NumPy structured array
+        '''
+        if numpy is None:
+            raise ImportError('NumPy is not available')
+        dtype = []
+        for name in self.names:
+            column = self[name]
+            if isinstance(column, array.array):
+                dtype.append((name, numpy.dtype(column.typecode)))
+            else:
+                dtype.append((name, object))
+        ret = numpy.zeros(self.rows, dtype=dtype)
+        for name in self.names:
+            ret[name] = self[name]
+        return ret
@@ -1,4 +1,5 @@
 import os
+import errno
 
 
 class NetlinkError(Exception):
@@ -11,6 +12,14 @@ class NetlinkError(Exception):
         self.code = code
 
 
+class NetlinkTimeoutError(NetlinkError):
+    '''
+    The request deadline expired, see `NetlinkMixin.deadline()`
+    '''
+    def __init__(self, msg=None):
+        super(NetlinkTimeoutError, self).__init__(errno.ETIMEDOUT, msg)
+
+
 class NetlinkDecodeError(Exception):
     '''
     Base decoding error class.
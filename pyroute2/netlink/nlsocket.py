@@ -31,36 +31,24 @@ the socket buffer and one gets ENOBUF on `recv()`::
     error: [Errno 105] No buffer space available
 
 One way to avoid ENOBUF, is to use async I/O. Then the
-library not only reads and buffers all the messages, but
-also re-prioritizes threads. Suppressing the parser
-activity, the library increases the response delay, but
-spares CPU to read and enqueue arriving messages as
-fast, as it is possible.
-
-With logging level DEBUG you can notice messages, that
-the library started to calm down the parser thread::
-
-    DEBUG:root:Packet burst: the reader thread priority
-        is increased, beware of delays on netlink calls
-        Counters: delta=25 qsize=25 delay=0.1
-
-This state requires no immediate action, but just some
-more attention. When the delay between messages on the
-parser thread exceeds 1 second, DEBUG messages become
-WARNING ones::
-
-    WARNING:root:Packet burst: the reader thread priority
-        is increased, beware of delays on netlink calls
-        Counters: delta=2525 qsize=213536 delay=3
-
-This state means, that almost all the CPU resources are
-dedicated to the reader thread. It doesn't mean, that
-the reader thread consumes 100% CPU -- it means, that the
-CPU is reserved for the case of more intensive bursts. The
-library will return to the normal state only when the
-broadcast storm will be over, and then the CPU will be
-100% loaded with the parser for some time, when it will
-process all the messages queued so far.
+library reads and buffers all the messages in a separate
+thread, and the parser processes them at its own pace.
+
+The buffered messages, as well as the Zero queue, are not
+limited by default. A slow consumer of a busy socket may
+run out of memory then, so limit the queues with an explicit
+policy, see `NetlinkMixin.limit_backlog()` and
+`pyroute2.netlink.backlog`.
+
+overrun markers
+---------------
+
+On ENOBUF the kernel drops broadcast messages, so a consumer's
+view of the kernel objects becomes stale. Instead of raising the
+error, `get()` puts an `NLMSG_OVERRUN` message into the Zero queue,
+see `NetlinkMixin.overrun()`. The consumer then should re-dump the
+objects of the socket groups, `msg['groups']`, and reconcile them.
+IPDB and NDB do that automatically.
 
 when async I/O doesn't help
 ---------------------------
@@ -82,15 +70,20 @@ classes
 
 import os
 import sys
+import errno
 import time
+import types
+import collections
 import select
 import struct
 import logging
 import traceback
 import threading
+from contextlib import contextmanager
 
 from socket import SOCK_DGRAM
 from socket import MSG_PEEK
+from socket import MSG_TRUNC
 from socket import SOL_SOCKET
 from socket import SO_RCVBUF
 from socket import SO_SNDBUF
@@ -98,27 +91,57 @@ from socket import SO_SNDBUF
 from pyroute2 import config
 from pyroute2.config import AF_NETLINK
 from pyroute2.common import AddrPool
+from pyroute2.common import SeqPool
 from pyroute2.common import DEFAULT_RCVBUF
 from pyroute2.netlink import nlmsg
+from pyroute2.netlink import nlmsg_view
 from pyroute2.netlink import mtypes
 from pyroute2.netlink import NLMSG_ERROR
 from pyroute2.netlink import NLMSG_DONE
+from pyroute2.netlink import NLMSG_OVERRUN
+from pyroute2.netlink import NLMSG_MIN_TYPE
+from pyroute2.netlink import NLMSGERR_ATTR_MSG
+from pyroute2.netlink import NLMSGERR_ATTR_OFFS
+from pyroute2.netlink import NLMSGERR_ATTR_COOKIE
+from pyroute2.netlink import NLMSGERR_ATTR_MISS_TYPE
+from pyroute2.netlink import NLMSGERR_ATTR_MISS_NEST
 from pyroute2.netlink import NETLINK_ADD_MEMBERSHIP
+from pyroute2.netlink import NETLINK_CAP_ACK
+from pyroute2.netlink import NETLINK_EXT_ACK
 from pyroute2.netlink import NETLINK_DROP_MEMBERSHIP
 from pyroute2.netlink import NETLINK_GENERIC
+from pyroute2.netlink import NETLINK_GET_STRICT_CHK
 from pyroute2.netlink import NETLINK_LISTEN_ALL_NSID
+from pyroute2.netlink import NLM_F_ACK
+from pyroute2.netlink import NLM_F_ACK_TLVS
+from pyroute2.netlink import NLM_F_CAPPED
 from pyroute2.netlink import NLM_F_DUMP
+from pyroute2.netlink import NLM_F_DUMP_INTR
 from pyroute2.netlink import NLM_F_MULTI
 from pyroute2.netlink import NLM_F_REQUEST
+from pyroute2.netlink import NLM_F_ROOT
 from pyroute2.netlink import SOL_NETLINK
+from pyroute2.netlink.backlog import ZeroQueue
+from pyroute2.netlink.bpf import SO_ATTACH_FILTER
+from pyroute2.netlink.bpf import SO_DETACH_FILTER
+from pyroute2.netlink.bpf import compile_bpf
+from pyroute2.netlink.bpf import nlmsg_filter
 from pyroute2.netlink.exceptions import NetlinkError
 from pyroute2.netlink.exceptions import NetlinkDecodeError
+from pyroute2.netlink.exceptions import NetlinkTimeoutError
 from pyroute2.netlink.exceptions import NetlinkHeaderDecodeError
 
 try:
     from Queue import Queue
+    from Queue import Full
+    from Queue import Empty
 except ImportError:
     from queue import Queue
+    from queue import Full
+    from queue import Empty
+
+# deadlines must not depend on the wall clock
+monotonic = getattr(time, 'monotonic', time.time)
 
 log = logging.getLogger(__name__)
 
@@ -133,6 +156,7 @@ class Marshal(object):
     type_format = 'H'
     error_type = NLMSG_ERROR
     debug = False
+    view = False
 
     def __init__(self):
         self.lock = threading.Lock()
@@ -140,15 +164,47 @@ class Marshal(object):
         # message at once
         self.msg_map = self.msg_map or {}
         self.defragmentation = {}
-
-    def parse(self, data, seq=None, callback=None):
+        # NLA filters and message filters by sequence
+        # number, see `parse()`
+        self.nla_filters = {}
+        self.msg_filters = {}
+        # sequence numbers of interrupted dumps, see NLM_F_DUMP_INTR
+        self.interrupted = set()
+
+    def parse(self, data, seq=None, callback=None, view=None):
         '''
         Parse string data.
 
         At this moment all transport, except of the native
         Netlink is deprecated in this library, so we should
         not support any defragmentation on that level
+
+        With `view` (defaults to `self.view`) the messages are
+        returned as read-only `nlmsg_view` objects, that reference
+        the buffer and decode fields and NLA only on demand. Error
+        messages are always decoded completely.
+
+        If there is an NLA filter registered in `self.nla_filters`
+        for the message sequence number, only the listed NLA are
+        decoded, see `nlmsg_base.decode_nlas()`.
+
+        If there is a message filter registered in `self.msg_filters`
+        for the sequence number, it is called before the message
+        decoding with an `nlmsg_view` object, that decodes only the
+        accessed fields and NLA. Messages for which the filter returns
+        False are skipped. Control messages like NLMSG_DONE and errors
+        are not filtered.
+
+        Extended ACK TLVs, see `NETLINK_EXT_ACK`, are returned in
+        `msg['header']['ext_ack']` of the error and NLMSG_DONE
+        messages, and the kernel error message is used for the
+        `NetlinkError`. Capped requests in the error messages, see
+        `NETLINK_CAP_ACK`, are not decoded.
         '''
+        if view is None:
+            view = self.view
+        nla_filters = self.nla_filters
+        msg_filters = self.msg_filters
         offset = 0
         result = []
         # there must be at least one header in the buffer,
@@ -159,22 +215,73 @@ class Marshal(object):
             if length == 0:
                 break
             error = None
+            ext_ack = None
+            capped = False
             msg_type, = struct.unpack_from(self.type_format,
                                            data,
                                            offset + self.type_offset)
             if msg_type == self.error_type:
                 code = abs(struct.unpack_from('i', data, offset + 16)[0])
+                flags, = struct.unpack_from('H', data, offset + 6)
+                capped = flags & NLM_F_CAPPED
+                if flags & NLM_F_ACK_TLVS:
+                    # TLVs follow the request in the message:
+                    # the header only or the whole request
+                    if capped:
+                        tlvs = offset + 36
+                    else:
+                        tlvs, = struct.unpack_from('I', data, offset + 20)
+                        tlvs = offset + 20 + ((tlvs + 3) & ~3)
+                    ext_ack = self.parse_ext_ack(data, tlvs, offset + length)
                 if code > 0:
-                    error = NetlinkError(code)
+                    error = NetlinkError(code, (ext_ack or {}).get('msg'))
+            elif msg_type == NLMSG_DONE and length >= 20 and \
+                    self.error_type == NLMSG_ERROR:
+                # the kernel reports dump errors, e.g. rejected
+                # dump filters, in the NLMSG_DONE payload
+                code = struct.unpack_from('i', data, offset + 16)[0]
+                flags, = struct.unpack_from('H', data, offset + 6)
+                if flags & NLM_F_ACK_TLVS:
+                    ext_ack = self.parse_ext_ack(data, offset + 20,
+                                                 offset + length)
+                if code < 0:
+                    error = NetlinkError(-code, (ext_ack or {}).get('msg'))
 
             msg_class = self.msg_map.get(msg_type, nlmsg)
-            msg = msg_class(data, offset=offset)
+            if msg_filters and msg_type >= NLMSG_MIN_TYPE:
+                msg_filter = msg_filters.get(
+                    struct.unpack_from('I', data, offset + 8)[0])
+                if msg_filter is not None:
+                    msg = nlmsg_view(msg_class, data, offset=offset)
+                    try:
+                        msg.decode()
+                        skip = not msg_filter(msg)
+                    except Exception:
+                        log.warning('Message filter fail: %s' % msg_filter)
+                        log.warning(traceback.format_exc())
+                        skip = False
+                    if skip:
+                        if msg['header']['flags'] & NLM_F_DUMP_INTR:
+                            self.interrupted.add(
+                                msg['header']['sequence_number'])
+                        offset += length
+                        continue
+            if view and error is None:
+                msg = nlmsg_view(msg_class, data, offset=offset)
+            else:
+                msg = msg_class.acquire(data, offset=offset)
+                if nla_filters and error is None:
+                    msg._nla_filter = nla_filters.get(
+                        struct.unpack_from('I', data, offset + 8)[0])
 
             try:
                 msg.decode()
                 msg['header']['error'] = error
+                if ext_ack is not None:
+                    msg['header']['ext_ack'] = ext_ack
                 # try to decode encapsulated error message
-                if error is not None:
+                if error is not None and msg_type == self.error_type \
+                        and not capped:
                     enc_type = struct.unpack_from('H', data, offset + 24)[0]
                     enc_class = self.msg_map.get(enc_type, nlmsg)
                     enc = enc_class(data, offset=offset + 20)
@@ -201,6 +308,31 @@ class Marshal(object):
 
         return result
 
+    def parse_ext_ack(self, data, offset, end):
+        '''
+        Parse the extended ACK TLVs, see `NETLINK_EXT_ACK`,
+        return a dict like `{'msg': 'Invalid prefix', 'offset': 32}`
+        '''
+        ret = {}
+        while offset + 4 <= end:
+            length, tlv = struct.unpack_from('HH', data, offset)
+            if length < 4:
+                break
+            value = data[offset + 4:offset + length]
+            if tlv == NLMSGERR_ATTR_MSG:
+                ret['msg'] = bytes(value).rstrip(b'\0').decode('utf-8',
+                                                               'replace')
+            elif tlv == NLMSGERR_ATTR_OFFS:
+                ret['offset'], = struct.unpack_from('I', value)
+            elif tlv == NLMSGERR_ATTR_COOKIE:
+                ret['cookie'] = bytes(value)
+            elif tlv == NLMSGERR_ATTR_MISS_TYPE:
+                ret['miss_type'], = struct.unpack_from('I', value)
+            elif tlv == NLMSGERR_ATTR_MISS_NEST:
+                ret['miss_nest'], = struct.unpack_from('I', value)
+            offset += (length + 3) & ~3
+        return ret
+
     def fix_message(self, msg):
         pass
 
@@ -251,11 +383,44 @@ class LockProxy(object):
         self.release()
 
 
+class NoLock(object):
+
+    def acquire(self, *argv, **kwarg):
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
 class LockFactory(object):
+    '''
+    Per msg_seq locks. The msg_seq allocated by a request is used
+    by one thread only, so such keys are marked `private` and get
+    no lock object at all.
+    '''
+
+    nolock = NoLock()
 
     def __init__(self, klass=threading.RLock):
         self.klass = klass
         self.locks = {0: LockProxy(self, 0)}
+        self.private = set()
+
+    def own(self, key):
+        '''
+        Mark the key as private, see `__getitem__()`
+        '''
+        if key:
+            self.private.add(key)
+
+    def disown(self, key):
+        self.private.discard(key)
 
     def __enter__(self):
         self.locks[0].acquire()
@@ -266,6 +431,8 @@ class LockFactory(object):
     def __getitem__(self, key):
         if key is None:
             key = 0
+        if key in self.private:
+            return self.nolock
         if key not in self.locks:
             self.locks[key] = LockProxy(self, key)
         return self.locks[key]
@@ -274,6 +441,375 @@ class LockFactory(object):
         del self.locks[key]
 
 
+class CallbackIndex(object):
+    '''
+    Registered callbacks, indexed by the message type and key,
+    see `NetlinkMixin.register_callback()`.
+
+    The index is rebuilt on every change and replaced as a whole,
+    so `match()` runs w/o locks.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = ()   # [(predicate, callback, args, type, key), ...]
+        self.index = {}     # {(type, name, value): [record, ...]}
+        self.names = {}     # {type: [name, ...]}
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def _rebuild(self, records):
+        index = {}
+        names = {}
+        for record in records:
+            msg_type, key = record[3], record[4]
+            if key is None:
+                bucket = (msg_type, None, None)
+            else:
+                bucket = (msg_type, key[0], key[1])
+                if key[0] not in names.setdefault(msg_type, []):
+                    names[msg_type].append(key[0])
+            index.setdefault(bucket, []).append(record)
+        self.records, self.index, self.names = tuple(records), index, names
+
+    def append(self, record):
+        with self.lock:
+            self._rebuild(self.records + (record, ))
+
+    def remove(self, callback):
+        with self.lock:
+            records = list(self.records)
+            for record in records:
+                if record[1] == callback:
+                    records.remove(record)
+                    self._rebuild(records)
+                    return
+
+    @staticmethod
+    def lookup(msg, name):
+        # NLA first, since e.g. rtmsg 'table' field is 252 for
+        # the tables > 255, while RTA_TABLE has the real value
+        value = None
+        if hasattr(msg, 'get_attr'):
+            value = msg.get_attr(msg.name2nla(name))
+        if value is None:
+            value = msg.get(name)
+        return value
+
+    def match(self, msg):
+        '''
+        Return the records to run for the message, in the
+        registration order. Predicates are not checked here.
+        '''
+        index, names = self.index, self.names
+        if not index:
+            return ()
+        msg_type = msg['header']['type']
+        ret = []
+        for t in (msg_type, None):
+            ret.extend(index.get((t, None, None), ()))
+            for name in names.get(t, ()):
+                value = self.lookup(msg, name)
+                ret.extend(index.get((t, name, value), ()))
+        if len(ret) > 1:
+            order = self.records.index
+            ret.sort(key=order)
+        return ret
+
+
+class NetlinkFuture(object):
+    '''
+    The result of a pipelined request, see `RequestPipeline`.
+    '''
+
+    def __init__(self, pipeline, msg_seq):
+        self.pipeline = pipeline
+        self.msg_seq = msg_seq
+        self._done = False
+        self._result = None
+        self._exception = None
+
+    def set_result(self, result):
+        self._result = result
+        self._done = True
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._done = True
+
+    def done(self):
+        return self._done
+
+    def exception(self):
+        '''
+        Wait for the response and return the exception, if the
+        request failed, or None
+        '''
+        if not self._done:
+            self.pipeline.wait(self)
+        return self._exception
+
+    def result(self):
+        '''
+        Wait for the response and return the response messages;
+        raise the exception, if the request failed
+        '''
+        if self.exception() is not None:
+            raise self._exception
+        return self._result
+
+
+class RequestPipeline(object):
+    '''
+    Send requests without waiting for the responses. The pipeline
+    is a proxy for the socket methods: requests, sent by a method
+    called via the pipeline, are not waited for, and the method
+    returns a `NetlinkFuture` instead::
+
+        with ipr.pipeline(window=64) as pipeline:
+            for dst in prefixes:
+                pipeline.route('add', dst=dst, gateway='10.0.0.1')
+
+        for future in pipeline.results():
+            if future.exception() is not None:
+                ...
+
+    If a method sends several requests, it returns a tuple of
+    futures. Dump requests are not pipelined, since the methods
+    need their results, e.g. `flush_routes()`.
+
+    No more than `window` requests are in flight; to send the next
+    one, the pipeline waits for the oldest response. Responses are
+    collected in the order of requests, with the usual `get()`
+    routine, so other threads may use the socket meanwhile. The
+    pipeline itself must be used by one thread; `results()` drains
+    the futures, kept by the pipeline.
+    '''
+
+    def __init__(self, sock, window=64):
+        self.sock = sock
+        self.window = window
+        self.pending = collections.deque()
+        self.futures = collections.deque()
+        self.submitted = []
+
+    def __getattr__(self, attr):
+        method = getattr(self.sock, attr)
+        if not callable(method):
+            return method
+
+        def call(*argv, **kwarg):
+            self.submitted = []
+            self.sock.pipeline_local.pipeline = self
+            try:
+                ret = method(*argv, **kwarg)
+                # with `config.nlm_generator` the requests are sent
+                # only when the generator runs, so run it here
+                if isinstance(ret, types.GeneratorType):
+                    ret = tuple(ret)
+            finally:
+                self.sock.pipeline_local.pipeline = None
+            if len(self.submitted) == 1:
+                return self.submitted[0]
+            elif self.submitted:
+                return tuple(self.submitted)
+            return ret
+        return call
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wait()
+
+    def submit(self, msg, msg_type, msg_flags,
+               terminate=None,
+               callback=None,
+               nla_filter=None,
+               msg_filter=None):
+        '''
+        Send the request and return a `NetlinkFuture`. Is called
+        by `nlm_request()` of the socket.
+        '''
+        while len(self.pending) >= self.window:
+            self.wait(self.pending[0])
+        msg_seq = self.sock.addr_pool.alloc()
+        self.sock.lock.own(msg_seq)
+        future = NetlinkFuture(self, msg_seq)
+        future.request = (terminate, callback, nla_filter, msg_filter)
+        # register the filters before the request is sent, see
+        # `NetlinkMixin.nlm_request()`
+        if nla_filter is not None:
+            self.sock.marshal.nla_filters[msg_seq] = frozenset(nla_filter)
+        if msg_filter is not None:
+            self.sock.marshal.msg_filters[msg_seq] = msg_filter
+        try:
+            self.sock.put(msg, msg_type, msg_flags, msg_seq=msg_seq)
+            self.pending.append(future)
+        except Exception as e:
+            self.release(future)
+            future.set_exception(e)
+        self.futures.append(future)
+        self.submitted.append(future)
+        return future
+
+    def release(self, future):
+        self.sock.marshal.nla_filters.pop(future.msg_seq, None)
+        self.sock.marshal.msg_filters.pop(future.msg_seq, None)
+        self.sock.backlog.pop(future.msg_seq, None)
+        # see the comment in `NetlinkMixin.nlm_request()`
+        self.sock.addr_pool.free(future.msg_seq, ban=0xff)
+        self.sock.lock.disown(future.msg_seq)
+
+    def wait(self, future=None):
+        '''
+        Collect the responses up to the `future`, or all the
+        pending responses
+        '''
+        while self.pending and (future is None or not future.done()):
+            current = self.pending.popleft()
+            (terminate, callback, nla_filter, msg_filter) = current.request
+            try:
+                current.set_result(tuple(self.sock.get(msg_seq=current.msg_seq,
+                                                       terminate=terminate,
+                                                       callback=callback,
+                                                       nla_filter=nla_filter,
+                                                       msg_filter=msg_filter)))
+            except Exception as e:
+                current.set_exception(e)
+            finally:
+                self.release(current)
+
+    def results(self):
+        '''
+        Yield the futures of all the requests in the order they
+        were sent, waiting for the responses
+        '''
+        while self.futures:
+            future = self.futures.popleft()
+            self.wait(future)
+            yield future
+
+
+class RequestBatch(RequestPipeline):
+    '''
+    Encode requests into one buffer and send them with a few
+    `sendto()` calls, then collect the responses::
+
+        with ipr.batch() as batch:
+            for dst in prefixes:
+                batch.route('add', dst=dst, gateway='10.0.0.1')
+
+        status = batch.status()  # [None, NetlinkError(17, ...), ...]
+
+    Like with `RequestPipeline`, the methods return futures, and
+    dump requests are done immediately. Every request must have
+    a response, so requests w/o NLM_F_ACK get it set. The RTNL
+    requests, that must pass the socket proxy, e.g. `link('add')`,
+    are sent one by one, see `NetlinkMixin.batch_gated()`.
+
+    The buffer is sent when it grows over `bufsize`, by default
+    a quarter of the socket receive buffer, since error responses
+    echo the requests, and not more than the send buffer allows.
+    The responses are collected after each `sendto()`.
+    '''
+
+    def __init__(self, sock, bufsize=None):
+        # gated requests are sent and waited one by one
+        super(RequestBatch, self).__init__(sock, window=1)
+        if bufsize is None:
+            bufsize = min(sock._sndbuf - 32, sock._rcvbuf // 4)
+        self.bufsize = bufsize
+        self.buffer = bytearray()
+        self.buffered = []
+
+    def submit(self, msg, msg_type, msg_flags,
+               terminate=None,
+               callback=None,
+               nla_filter=None,
+               msg_filter=None):
+        if self.sock.batch_gated(msg_type):
+            self.send()
+            return super(RequestBatch, self).submit(msg, msg_type, msg_flags,
+                                                    terminate, callback,
+                                                    nla_filter, msg_filter)
+        msg_seq = self.sock.addr_pool.alloc()
+        self.sock.lock.own(msg_seq)
+        future = NetlinkFuture(self, msg_seq)
+        future.request = (terminate, callback, nla_filter, msg_filter)
+        if nla_filter is not None:
+            self.sock.marshal.nla_filters[msg_seq] = frozenset(nla_filter)
+        if msg_filter is not None:
+            self.sock.marshal.msg_filters[msg_seq] = msg_filter
+        # the responses go to the backlog only for known msg_seq,
+        # see `NetlinkMixin.put()`
+        self.sock.backlog[msg_seq] = []
+        self.futures.append(future)
+        self.submitted.append(future)
+        offset = len(self.buffer)
+        try:
+            if not isinstance(msg, nlmsg):
+                msg = self.sock.marshal.msg_map[msg_type](msg)
+            msg['header']['type'] = msg_type
+            msg['header']['flags'] = msg_flags | NLM_F_ACK
+            msg['header']['sequence_number'] = msg_seq
+            msg['header']['pid'] = self.sock.epid or os.getpid()
+            msg.data = self.buffer
+            msg.offset = offset
+            msg.encode()
+        except Exception as e:
+            del self.buffer[offset:]
+            self.release(future)
+            future.set_exception(e)
+            return future
+        if offset and len(self.buffer) > self.bufsize:
+            # send the buffer w/o the last request, if it overflows
+            self.send(offset)
+        self.buffered.append(future)
+        if len(self.buffer) >= self.bufsize:
+            self.send()
+        return future
+
+    def send(self, length=None):
+        '''
+        Send `length` bytes of the buffer, or the whole buffer, and
+        collect the responses
+        '''
+        if length is None:
+            length = len(self.buffer)
+        if not length:
+            return
+        data = self.buffer[:length]
+        del self.buffer[:length]
+        futures = self.buffered
+        self.buffered = []
+        try:
+            self.sock.sendto(data, (0, 0))
+        except Exception as e:
+            for future in futures:
+                self.release(future)
+                future.set_exception(e)
+            raise
+        self.pending.extend(futures)
+        self.wait()
+
+    def wait(self, future=None):
+        if self.buffered:
+            self.send()
+        super(RequestBatch, self).wait(future)
+
+    def status(self):
+        '''
+        Send the rest of the buffer and return the list of request
+        errors, `None` for successful requests
+        '''
+        return [x.exception() for x in self.results()]
+
+
 class NetlinkMixin(object):
     '''
     Generic netlink socket
@@ -286,7 +822,10 @@ class NetlinkMixin(object):
                  fileno=None,
                  sndbuf=1048576,
                  rcvbuf=1048576,
-                 all_ns=False):
+                 all_ns=False,
+                 strict_check=False,
+                 ext_ack=False,
+                 cap_ack=False):
         #
         # That's a trick. Python 2 is not able to construct
         # sockets from an open FD.
@@ -304,7 +843,8 @@ class NetlinkMixin(object):
                                       'on Python < 3.2')
 
         # 8<-----------------------------------------
-        self.addr_pool = AddrPool(minaddr=0x000000ff, maxaddr=0x0000ffff)
+        self.addr_pool = SeqPool(minaddr=0x000000ff, maxaddr=0x0000ffff,
+                                 callback=self.expire)
         self.epid = None
         self.port = 0
         self.fixed = True
@@ -312,8 +852,8 @@ class NetlinkMixin(object):
         self._fileno = fileno
         self._sndbuf = sndbuf
         self._rcvbuf = rcvbuf
-        self.backlog = {0: []}
-        self.callbacks = []     # [(predicate, callback, args), ...]
+        self.backlog = {0: ZeroQueue()}
+        self.callbacks = CallbackIndex()
         self.pthread = None
         self.closed = False
         self.capabilities = {'create_bridge': config.kernel > [3, 2, 0],
@@ -321,18 +861,38 @@ class NetlinkMixin(object):
                              'create_dummy': True,
                              'provide_master': config.kernel[0] > 2}
         self.backlog_lock = threading.Lock()
+        self.backlog_waiters = {}   # {msg_seq: [Condition, ...]}
+        self.pipeline_local = threading.local()
+        self.deadline_local = threading.local()
+        self.cancelled = set()      # {msg_seq, ...}, see cancel()
+        self.dumps = set()          # {msg_seq, ...}, see drain()
         self.read_lock = threading.Lock()
+        # keeps the callbacks order, see get(); reentrant, since
+        # the callbacks may run requests
+        self.callback_lock = threading.RLock()
         self.sys_lock = threading.Lock()
-        self.change_master = threading.Event()
         self.lock = LockFactory()
         self._sock = None
         self._ctrl_read, self._ctrl_write = os.pipe()
         self.buffer_queue = Queue()
-        self.qsize = 0
+        # the receive buffer, see recv_ft(), and the SO_RCVBUF
+        # value cache, see get()
+        self._recv_buffer = None
+        self._rcvbuf_size = None
         self.log = []
+        self.overruns = 0
+        # interrupted dumps, see nlm_request()
+        self.dump_retries = 0
+        self.dump_backoff = 0.01
+        self.dump_backoff_max = 1
+        self.dump_interrupts = 0
+        self.dump_restarts = 0
         self.get_timeout = 30
         self.get_timeout_exception = None
         self.all_ns = all_ns
+        self.strict_check = strict_check
+        self.ext_ack = ext_ack
+        self.cap_ack = cap_ack
         if pid is None:
             self.pid = os.getpid() & 0x3fffff
             self.port = port
@@ -345,6 +905,9 @@ class NetlinkMixin(object):
         self.groups = 0
         self.marshal = Marshal()
         # 8<-----------------------------------------
+        # the generator versions are used by nlm_stream()
+        self._genlm_request = self.nlm_request
+        self._genlm_get = self.get
         if not config.nlm_generator:
 
             def nlm_request(*argv, **kwarg):
@@ -353,9 +916,6 @@ class NetlinkMixin(object):
             def get(*argv, **kwarg):
                 return tuple(self._genlm_get(*argv, **kwarg))
 
-            self._genlm_request = self.nlm_request
-            self._genlm_get = self.get
-
             self.nlm_request = nlm_request
             self.get = get
 
@@ -367,8 +927,13 @@ class NetlinkMixin(object):
 
     def close(self):
         if self.pthread:
+            # don't wait on the bounded queue, see limit_backlog()
+            self.buffer_queue.maxsize = 0
             self.buffer_queue.put(struct.pack('IHHQIQQ',
                                               28, 2, 0, 0, 104, 0, 0))
+        zero = self.backlog.get(0)
+        if isinstance(zero, ZeroQueue):
+            zero.close()
         try:
             os.close(self._ctrl_write)
             os.close(self._ctrl_read)
@@ -388,7 +953,8 @@ class NetlinkMixin(object):
         self.close()
 
     def register_callback(self, callback,
-                          predicate=lambda x: True, args=None):
+                          predicate=lambda x: True, args=None,
+                          msg_type=None, key=None):
         '''
         Register a callback to run on a message arrival.
 
@@ -418,24 +984,43 @@ class NetlinkMixin(object):
                                   lambda x: x.get('index', None) == 1,
                                   (self, ))
 
+        The callbacks are indexed by `msg_type` and `key`, if
+        provided, so only the relevant callbacks are checked for a
+        message. The key is a `(name, value)` pair, where the name is
+        an NLA name or a field, like `('index', 1)` or `('table', 10)`::
+
+            ipr.register_callback(cb, msg_type=RTM_NEWLINK,
+                                  key=('index', 1), args=(self, ))
+
         Please note: you do **not** need to register the default 0 queue
         to invoke callbacks on broadcast messages. Callbacks are
-        iterated **before** messages get enqueued.
+        iterated **before** messages get enqueued, but w/o the read
+        and backlog locks, so slow callbacks do not block the socket
+        reading; the messages are passed to the callbacks in order.
         '''
         if args is None:
             args = []
-        self.callbacks.append((predicate, callback, args))
+        self.callbacks.append((predicate, callback, args, msg_type, key))
 
     def unregister_callback(self, callback):
         '''
         Remove the first reference to the function from the callback
         register
         '''
-        cb = tuple(self.callbacks)
-        for cr in cb:
-            if cr[1] == callback:
-                self.callbacks.pop(cb.index(cr))
-                return
+        self.callbacks.remove(callback)
+
+    def run_callbacks(self, msg):
+        '''
+        Run the callbacks registered for the message
+        '''
+        for cr in self.callbacks.match(msg):
+            try:
+                if cr[0](msg):
+                    cr[1](msg, *cr[2])
+            except:
+                lw = log.warning
+                lw("Callback fail: %s" % (cr[:3], ))
+                lw(traceback.format_exc())
 
     def register_policy(self, policy, msg_class=None):
         '''
@@ -519,24 +1104,35 @@ class NetlinkMixin(object):
     def recv_into(self, *argv, **kwarg):
         return self._recv_into(*argv, **kwarg)
 
-    def recv_ft(self, size=None):
-        return self._recv(size)
+    def recv_ft(self, bufsize=DEFAULT_RCVBUF, flags=0):
+        if bufsize == -1:
+            # get bufsize from the network data
+            bufsize = struct.unpack("I", self.recv(4, MSG_PEEK))[0]
+        return self._recv(bufsize, flags)
 
     def async_recv(self):
         poll = select.poll()
         poll.register(self._sock, select.POLLIN | select.POLLPRI)
         poll.register(self._ctrl_read, select.POLLIN | select.POLLPRI)
         sockfd = self._sock.fileno()
+        # the thread buffer, see recv_buffer()
+        buf = bytearray(64000)
         while True:
             events = poll.poll()
             for (fd, event) in events:
                 if fd == sockfd:
                     try:
-                        data = bytearray(64000)
-                        self._sock.recv_into(data, 64000)
-                        self.buffer_queue.put(data)
+                        data = self.recv_buffer(64000, buf=buf)
                     except Exception as e:
-                        self.buffer_queue.put(e)
+                        data = e
+                    # wait for the parser, if the queue is full,
+                    # but not after close(), see limit_backlog()
+                    while not self.closed:
+                        try:
+                            self.buffer_queue.put(data, timeout=0.1)
+                            break
+                        except Full:
+                            pass
                 else:
                     return
 
@@ -572,6 +1168,7 @@ class NetlinkMixin(object):
         if msg_seq != 0:
             self.lock[msg_seq].acquire()
         try:
+            self.cancelled.discard(msg_seq)
             if msg_seq not in self.backlog:
                 self.backlog[msg_seq] = []
             if not isinstance(msg, nlmsg):
@@ -593,10 +1190,127 @@ class NetlinkMixin(object):
     def sendto_gate(self, msg, addr):
         raise NotImplementedError()
 
+    def pipeline(self, window=64):
+        '''
+        Return a `RequestPipeline` to send requests without waiting
+        for responses, no more than `window` requests at once::
+
+            with ipr.pipeline() as pipeline:
+                futures = [pipeline.addr('add', index=idx, address=x,
+                                         mask=24) for x in addresses]
+            [x.result() for x in futures]  # raise the first error
+
+        The kernel responses are buffered in the socket receive
+        buffer, so don't use too large windows, or use a larger
+        SO_RCVBUF.
+        '''
+        return RequestPipeline(self, window)
+
+    def batch(self, bufsize=None):
+        '''
+        Return a `RequestBatch` to send requests in one buffer::
+
+            with ipr.batch() as batch:
+                for address in addresses:
+                    batch.addr('add', index=idx, address=address, mask=24)
+            errors = [x for x in batch.status() if x is not None]
+        '''
+        return RequestBatch(self, bufsize)
+
+    def batch_gated(self, msg_type):
+        '''
+        Return True, if requests of the type must be sent one by
+        one with `sendto_gate()`, and not in a batch buffer
+        '''
+        return False
+
+    @contextmanager
+    def deadline(self, timeout):
+        '''
+        Run the requests of this thread with a deadline, that
+        includes all the requests of the block, e.g. all the requests
+        of an `RTNL_API` method::
+
+            with ipr.deadline(0.5):
+                ipr.route('add', dst='10.0.0.0/24', gateway='10.1.0.1')
+
+        When the deadline expires, the waiting request fails with
+        `NetlinkTimeoutError` and its late responses are dropped,
+        see `cancel()`. Nested blocks can not extend the deadline.
+        '''
+        outer = getattr(self.deadline_local, 'deadline', None)
+        deadline = monotonic() + timeout
+        if outer is not None:
+            deadline = min(outer, deadline)
+        self.deadline_local.deadline = deadline
+        try:
+            yield
+        finally:
+            self.deadline_local.deadline = outer
+
+    def _deadline(self, timeout=None):
+        # the absolute deadline for the call, see `deadline()`
+        deadline = getattr(self.deadline_local, 'deadline', None)
+        if timeout is not None:
+            timeout = monotonic() + timeout
+            if deadline is None or timeout < deadline:
+                deadline = timeout
+        return deadline
+
+    def cancel(self, msg_seq):
+        '''
+        Cancel the request: drop the received responses and all the
+        late responses with that msg_seq, they don't go to the Zero
+        queue. The threads waiting in `get()` for the msg_seq fail
+        with `NetlinkTimeoutError`.
+
+        The mark is cleared by a new `put()` with the msg_seq, or
+        when the msg_seq ban in the `addr_pool` ends.
+        '''
+        if msg_seq == 0:
+            return
+        with self.backlog_lock:
+            self.cancelled.add(msg_seq)
+            for msg in self.backlog.pop(msg_seq, None) or ():
+                if msg['header']['type'] in (NLMSG_DONE, NLMSG_ERROR):
+                    # the dump is over, nothing to drain
+                    self.dumps.discard(msg_seq)
+            for cond in self.backlog_waiters.get(msg_seq, ()):
+                cond.notify()
+
+    def drain(self, timeout=None):
+        '''
+        Read the rest of the cancelled dumps. The kernel runs only
+        one dump per socket and sends the next part, when the
+        previous one is read, so a new dump fails with EBUSY, until
+        the cancelled one is read up to NLMSG_DONE.
+
+        Is called by `nlm_request()` before dump requests.
+        '''
+        for msg_seq in tuple(self.dumps):
+            with self.backlog_lock:
+                if msg_seq not in self.dumps or \
+                        msg_seq not in self.cancelled:
+                    continue
+                # collect the responses again
+                self.cancelled.discard(msg_seq)
+                self.backlog[msg_seq] = []
+            try:
+                for msg in self.get(msg_seq=msg_seq, timeout=timeout):
+                    pass
+            except NetlinkTimeoutError:
+                raise
+            except NetlinkError:
+                pass
+            self.dumps.discard(msg_seq)
+
     def get(self, bufsize=DEFAULT_RCVBUF,
             msg_seq=0,
             terminate=None,
-            callback=None):
+            callback=None,
+            nla_filter=None,
+            msg_filter=None,
+            timeout=None):
         '''
         Get parsed messages list. If `msg_seq` is given, return
         only messages with that `msg['header']['sequence_number']`,
@@ -606,51 +1320,153 @@ class NetlinkMixin(object):
 
         The `bufsize` parameter can be:
 
-            - -1: bufsize will be calculated from the first 4 bytes of
-                the network data
-            - 0: bufsize will be calculated from SO_RCVBUF sockopt
+            - -1: bufsize will be calculated from the network data
+                for every datagram
+            - 0: bufsize will be calculated from SO_RCVBUF sockopt;
+                the value is cached until the next `setsockopt()`
             - int >= 0: just a bufsize
+
+        The `nla_filter` parameter, if set, is a list of NLA names
+        to decode in the messages with that `msg_seq`; all other
+        NLA will be skipped without decoding::
+
+            ipr.get(msg_seq=seq, nla_filter=('IFLA_IFNAME', ))
+
+        The `msg_filter` parameter, if set, is a function, that is
+        called with a lazy `nlmsg_view` for every message with that
+        `msg_seq` before decoding; messages for which the function
+        returns False are dropped without decoding::
+
+            ipr.get(msg_seq=seq, msg_filter=lambda x: x['index'] == 2)
+
+        Messages received before the call are not affected.
+
+        The `timeout` parameter, if set, is the deadline for the call
+        in seconds; unlike `get_timeout`, it is not reset by received
+        messages. On expiry the msg_seq is cancelled and
+        `NetlinkTimeoutError` is raised, see `cancel()`; the Zero
+        queue call just returns. See also `deadline()`.
         '''
         ctime = time.time()
+        deadline = self._deadline(timeout)
 
         with self.lock[msg_seq]:
-            if bufsize == -1:
-                # get bufsize from the network data
-                bufsize = struct.unpack("I", self.recv(4, MSG_PEEK))[0]
-            elif bufsize == 0:
+            if bufsize == 0:
                 # get bufsize from SO_RCVBUF
-                bufsize = self.getsockopt(SOL_SOCKET, SO_RCVBUF) // 2
+                if self._rcvbuf_size is None:
+                    self._rcvbuf_size = self.getsockopt(SOL_SOCKET,
+                                                        SO_RCVBUF) // 2
+                bufsize = self._rcvbuf_size
 
             tmsg = None
             enough = False
-            backlog_acquired = False
+            reader = False
+            if nla_filter is not None:
+                self.marshal.nla_filters[msg_seq] = frozenset(nla_filter)
+            if msg_filter is not None:
+                self.marshal.msg_filters[msg_seq] = msg_filter
+            # the reader thread wakes us up on this condition, when
+            # there are messages for this msg_seq, see dispatch()
+            cond = threading.Condition(self.backlog_lock)
+            with self.backlog_lock:
+                self.backlog_waiters.setdefault(msg_seq, []).append(cond)
             try:
                 while not enough:
                     # 8<-----------------------------------------------------------
                     #
-                    # This stage changes the backlog, so use mutex to
-                    # prevent side changes
-                    self.backlog_lock.acquire()
-                    backlog_acquired = True
-                    ##
                     # Stage 1. BEGIN
                     #
-                    # 8<-----------------------------------------------------------
+                    # This stage changes the backlog, so use mutex to
+                    # prevent side changes. The stage ends with one of:
                     #
-                    # Check backlog and return already collected
-                    # messages.
+                    #  * collected messages for this msg_seq
+                    #  * timeout
+                    #  * the read lock acquired -- we are the reader
+                    #  * waiting for the reader to wake us up
                     #
-                    if msg_seq == 0 and self.backlog[0]:
+                    msgs = None
+                    timeout = False
+                    expired = False
+                    with self.backlog_lock:
+                        if self.backlog.get(msg_seq):
+                            # Take all the collected messages at once,
+                            # the backlog gets a new list
+                            if msg_seq == 0:
+                                msgs = self.backlog[0].take()
+                            else:
+                                msgs = self.backlog[msg_seq]
+                                self.backlog[msg_seq] = []
+                        elif (deadline is not None and
+                              monotonic() >= deadline) or \
+                                msg_seq in self.cancelled:
+                            # drop the late responses, see cancel()
+                            if msg_seq != 0:
+                                self.cancelled.add(msg_seq)
+                                self.backlog.pop(msg_seq, None)
+                            timeout = expired = True
+                        elif (msg_seq != 0) and \
+                                (time.time() - ctime > self.get_timeout):
+                            # drop already received for that msg_seq
+                            self.cancelled.add(msg_seq)
+                            self.backlog.pop(msg_seq, None)
+                            timeout = True
+                        elif msg_seq != 0 and \
+                                self.backlog[0].full() and \
+                                self.backlog_waiters.get(0):
+                            # The Zero queue is full, wait for the
+                            # consumer to take it, see limit_backlog()
+                            if reader:
+                                reader = False
+                                self.read_lock.release()
+                            remains = self.get_timeout - \
+                                (time.time() - ctime)
+                            remains = max(0, remains) + 0.1
+                            if deadline is not None:
+                                remains = min(remains,
+                                              max(0, deadline - monotonic()))
+                            cond.wait(remains)
+                            continue
+                        elif reader or self.read_lock.acquire(False):
+                            reader = True
+                        else:
+                            # Somebody else reads the socket; wait for
+                            # the messages or for the reader change
+                            remains = self.get_timeout - (time.time() - ctime)
+                            remains = max(0, remains) + 0.1
+                            if deadline is not None:
+                                remains = min(remains,
+                                              max(0, deadline - monotonic()))
+                            cond.wait(remains)
+                            continue
+                        if reader and (msgs is not None or timeout):
+                            # Don't block the socket while processing
+                            # the messages, let another thread read it
+                            reader = False
+                            self.read_lock.release()
+                        if not reader:
+                            self.wake_reader(cond)
+                    # Stage 1. END
+                    #
+                    # 8<-----------------------------------------------------------
+                    if expired:
+                        if msg_seq != 0:
+                            raise NetlinkTimeoutError('request %s expired'
+                                                      % msg_seq)
+                        return
+                    elif timeout:
+                        # throw an exception
+                        if self.get_timeout_exception:
+                            raise self.get_timeout_exception()
+                        else:
+                            return
+                    elif msgs is not None and msg_seq == 0:
                         # Zero queue.
                         #
-                        # Load the backlog, if there is valid
-                        # content in it
-                        for msg in self.backlog[0]:
+                        # Return all the collected messages and exit
+                        for msg in msgs:
                             yield msg
-                        self.backlog[0] = []
-                        # And just exit
                         break
-                    elif msg_seq != 0 and len(self.backlog.get(msg_seq, [])):
+                    elif msgs is not None:
                         # Any other msg_seq.
                         #
                         # Collect messages up to the terminator.
@@ -662,15 +1478,15 @@ class NetlinkMixin(object):
                         #
                         # Please note, that if terminator not occured,
                         # more `recv()` rounds CAN be required.
-                        for msg in tuple(self.backlog[msg_seq]):
+                        for (idx, msg) in enumerate(msgs):
 
-                            # Drop the message from the backlog, if any
-                            self.backlog[msg_seq].remove(msg)
+                            # The kernel table changed during the dump
+                            if msg['header']['flags'] & NLM_F_DUMP_INTR:
+                                self.marshal.interrupted.add(msg_seq)
 
                             # If there is an error, raise exception
                             if msg['header'].get('error', None) is not None:
-                                self.backlog[0].extend(self.backlog[msg_seq])
-                                del self.backlog[msg_seq]
+                                self.requeue(msg_seq, msgs[idx + 1:])
                                 # The loop is done
                                 raise msg['header']['error']
 
@@ -695,159 +1511,409 @@ class NetlinkMixin(object):
                             # Enough is enough, requeue the rest and delete
                             # our backlog
                             if enough:
-                                self.backlog[0].extend(self.backlog[msg_seq])
-                                del self.backlog[msg_seq]
+                                self.requeue(msg_seq, msgs[idx + 1:])
                                 break
-
-                        # Next iteration
-                        self.backlog_lock.release()
-                        backlog_acquired = False
                     else:
-                        # Stage 1. END
-                        #
                         # 8<-------------------------------------------------------
                         #
                         # Stage 2. BEGIN
                         #
-                        # 8<-------------------------------------------------------
-                        #
                         # Receive the data from the socket and put the messages
-                        # into the backlog
+                        # into the backlog. Only the read lock is held here,
+                        # it is released in the Stage 1, when there are
+                        # messages for us
                         #
-                        self.backlog_lock.release()
-                        backlog_acquired = False
-                        ##
-                        #
-                        # Control the timeout. We should not be within the
-                        # function more than TIMEOUT seconds. All the locks
-                        # MUST be released here.
-                        #
-                        if (msg_seq != 0) and \
-                                (time.time() - ctime > self.get_timeout):
-                            # requeue already received for that msg_seq
-                            self.backlog[0].extend(self.backlog[msg_seq])
-                            del self.backlog[msg_seq]
-                            # throw an exception
-                            if self.get_timeout_exception:
-                                raise self.get_timeout_exception()
+                        # With a deadline, don't block in recv() longer;
+                        # the async cache sockets wait for the buffers
+                        # queue, see bind()
+                        try:
+                            if deadline is None:
+                                data = self.recv_ft(bufsize)
+                            elif self.pthread is None:
+                                remains = max(0, deadline - monotonic())
+                                if not select.select([self._sock], [], [],
+                                                     remains)[0]:
+                                    continue
+                                data = self.recv_ft(bufsize)
                             else:
-                                return
-                        #
-                        if self.read_lock.acquire(False):
+                                remains = max(0, deadline - monotonic())
+                                data = self.buffer_queue.get(timeout=remains)
+                                if isinstance(data, Exception):
+                                    raise data
+                        except Empty:
+                            continue
+                        except (OSError, IOError) as e:
+                            if e.errno != errno.ENOBUFS:
+                                raise
+                            # the socket buffer overflowed, report
+                            # the lost messages to the Zero queue
+                            msgs = [self.overrun()]
+                        else:
+                            # Parse data
+                            msgs = self.marshal.parse(data, msg_seq,
+                                                      callback)
+                        # Reset ctime -- timeout should be measured
+                        # for every turn separately
+                        ctime = time.time()
+                        if self.callbacks:
+                            # Run the callbacks w/o the read lock, so
+                            # the next reader doesn't wait for them; the
+                            # callback lock is taken before the read
+                            # lock is released to keep the order
+                            self.callback_lock.acquire()
                             try:
-                                self.change_master.clear()
-                                # If the socket is free to read from, occupy
-                                # it and wait for the data
-                                #
-                                # This is a time consuming process, so all the
-                                # locks, except the read lock must be released
-                                data = self.recv_ft(bufsize)
-                                # Parse data
-                                msgs = self.marshal.parse(data,
-                                                          msg_seq,
-                                                          callback)
-                                # Reset ctime -- timeout should be measured
-                                # for every turn separately
-                                ctime = time.time()
-                                #
-                                current = self.buffer_queue.qsize()
-                                delta = current - self.qsize
-                                if delta > 10:
-                                    delay = min(3, max(0.01,
-                                                       float(current) / 60000))
-                                    message = ("Packet burst: "
-                                               "delta=%s qsize=%s delay=%s"
-                                               % (delta, current, delay))
-                                    if delay < 1:
-                                        log.debug(message)
-                                    else:
-                                        log.warning(message)
-                                    time.sleep(delay)
-                                self.qsize = current
-
-                                # We've got the data, lock the backlog again
                                 with self.backlog_lock:
-                                    for msg in msgs:
-                                        seq = msg['header']['sequence_number']
-                                        if seq not in self.backlog:
-                                            if msg['header']['type'] == \
-                                                    NLMSG_ERROR:
-                                                # Drop orphaned NLMSG_ERROR
-                                                # messages
-                                                continue
-                                            seq = 0
-                                        # 8<-----------------------------------
-                                        # Callbacks section
-                                        for cr in self.callbacks:
-                                            try:
-                                                if cr[0](msg):
-                                                    cr[1](msg, *cr[2])
-                                            except:
-                                                # FIXME
-                                                #
-                                                # Usually such code formatting
-                                                # means that the method should
-                                                # be refactored to avoid such
-                                                # indentation.
-                                                #
-                                                # Plz do something with it.
-                                                #
-                                                lw = log.warning
-                                                lw("Callback fail: %s" % (cr))
-                                                lw(traceback.format_exc())
-                                        # 8<-----------------------------------
-                                        self.backlog[seq].append(msg)
-
-                                # Now wake up other threads
-                                self.change_master.set()
+                                    reader = False
+                                    self.read_lock.release()
+                                    self.wake_reader(cond)
+                                self.dispatch(msgs)
                             finally:
-                                # Finally, release the read lock: all data
-                                # processed
-                                self.read_lock.release()
+                                self.callback_lock.release()
                         else:
-                            # If the socket is occupied and there is still no
-                            # data for us, wait for the next master change or
-                            # for a timeout
-                            self.change_master.wait(1)
-                        # 8<-------------------------------------------------------
-                        #
+                            self.dispatch(msgs)
                         # Stage 2. END
                         #
                         # 8<-------------------------------------------------------
+            except GeneratorExit:
+                # The consumer stopped early, return the rest of the
+                # messages to the backlog, see cancel()
+                if msg_seq != 0 and msgs:
+                    with self.backlog_lock:
+                        if msg_seq in self.backlog:
+                            self.backlog[msg_seq][:0] = msgs[idx + 1:]
+                raise
             finally:
-                if backlog_acquired:
-                    self.backlog_lock.release()
+                with self.backlog_lock:
+                    if reader:
+                        self.read_lock.release()
+                    self.backlog_waiters[msg_seq].remove(cond)
+                    if not self.backlog_waiters[msg_seq]:
+                        del self.backlog_waiters[msg_seq]
+                    self.wake_reader()
+                if nla_filter is not None:
+                    self.marshal.nla_filters.pop(msg_seq, None)
+                if msg_filter is not None:
+                    self.marshal.msg_filters.pop(msg_seq, None)
+
+    def overrun(self):
+        '''
+        Return an NLMSG_OVERRUN message, that marks broadcast
+        messages lost on ENOBUFS. The `groups` key contains the
+        multicast groups of the socket, since any of them could
+        be affected::
+
+            for msg in ipr.get():
+                if msg['header']['type'] == NLMSG_OVERRUN:
+                    # re-dump the objects of msg['groups']
+                    ...
+
+        The `overruns` attribute counts the overflows.
+        '''
+        self.overruns += 1
+        msg = nlmsg()
+        msg['header']['type'] = NLMSG_OVERRUN
+        msg['header']['flags'] = 0
+        msg['header']['sequence_number'] = 0
+        msg['header']['pid'] = 0
+        msg['header']['error'] = None
+        msg['event'] = 'NLMSG_OVERRUN'
+        msg['groups'] = self.groups
+        log.warning('Netlink socket overrun: %s' % self.overruns)
+        return msg
+
+    def limit_backlog(self, size, policy='block', buffers=64,
+                      spill=None, spill_size=16 * 1024 * 1024):
+        '''
+        Limit the Zero queue to `size` messages, and set the policy
+        to apply, when it is full, see `pyroute2.netlink.backlog`::
+
+            ip.limit_backlog(65536, policy='coalesce')
+            ...
+            zero = ip.backlog[0]
+            print(zero.drops, zero.coalesced, zero.spilled)
+
+        The `spill` policy stores the messages in the `spill` file,
+        or in a temporary file, up to `spill_size` bytes. With
+        `async_cache` the raw buffers queue is limited to `buffers`
+        datagrams. Use `size=None` to remove the limit.
+        '''
+        zero = ZeroQueue(size, policy,
+                         key=self.object_key,
+                         overrun=self.overrun,
+                         parse=lambda data: self.marshal.parse(data),
+                         spill=spill,
+                         spill_size=spill_size)
+        with self.backlog_lock:
+            old = self.backlog[0]
+            zero.extend(old.take())
+            self.backlog[0] = zero
+        old.close()
+        self.buffer_queue.maxsize = buffers if size is not None else 0
+
+    def object_key(self, msg):
+        '''
+        Return the key of the object the message describes, to
+        coalesce the Zero queue, see `limit_backlog()`. None means
+        the message is not coalesced.
+        '''
+        return None
+
+    def dispatch(self, msgs):
+        '''
+        Put parsed messages into the backlog, run callbacks and
+        wake up the threads waiting in `get()` for these messages.
+        Messages with an unknown msg_seq go to the Zero queue,
+        orphaned NLMSG_ERROR messages are dropped.
+        '''
+        if self.callbacks:
+            # run the callbacks w/o the backlog lock
+            for msg in msgs:
+                seq = msg['header']['sequence_number']
+                if seq not in self.backlog and self.is_cancelled(msg):
+                    continue
+                if msg['header']['type'] != NLMSG_ERROR or \
+                        seq in self.backlog:
+                    self.run_callbacks(msg)
+        with self.backlog_lock:
+            seqs = set()
+            for msg in msgs:
+                seq = msg['header']['sequence_number']
+                if seq not in self.backlog:
+                    cancelled = self.is_cancelled(msg)
+                    if cancelled and \
+                            msg['header']['type'] in (NLMSG_DONE,
+                                                      NLMSG_ERROR):
+                        # the cancelled dump is over, see drain()
+                        self.dumps.discard(seq)
+                    if msg['header']['type'] == NLMSG_ERROR or cancelled:
+                        # Drop orphaned NLMSG_ERROR messages and late
+                        # responses to cancelled requests
+                        continue
+                    seq = 0
+                self.backlog[seq].append(msg)
+                seqs.add(seq)
+            for seq in seqs:
+                for cond in self.backlog_waiters.get(seq, ()):
+                    cond.notify()
+
+    def is_cancelled(self, msg):
+        '''
+        True, if the message is a late response to a cancelled
+        request. Broadcast messages carry the msg_seq of the
+        sender, so only the messages with our pid match.
+        '''
+        return msg['header']['sequence_number'] in self.cancelled and \
+            (self.epid is None or msg['header']['pid'] == self.epid)
+
+    def expire(self, msg_seq):
+        '''
+        Forget the cancelled msg_seq, when its ban in the
+        `addr_pool` ends; the cancelled dumps are kept until
+        drained, see `drain()`
+        '''
+        with self.backlog_lock:
+            if msg_seq not in self.dumps:
+                self.cancelled.discard(msg_seq)
+
+    def requeue(self, msg_seq, msgs):
+        '''
+        Finish the `get()` for the msg_seq: move the rest of the
+        messages into the Zero queue and delete the msg_seq backlog.
+        '''
+        with self.backlog_lock:
+            self.backlog[0].extend(msgs)
+            self.backlog[0].extend(self.backlog.pop(msg_seq, ()))
+            if self.backlog[0]:
+                for cond in self.backlog_waiters.get(0, ()):
+                    cond.notify()
+
+    def wake_reader(self, skip=None):
+        '''
+        If nobody reads the socket, wake up one thread, that waits
+        in `get()` and has no messages yet, to become the reader.
+
+        Must be called with `backlog_lock` acquired.
+        '''
+        if self.read_lock.locked():
+            return
+        for (seq, conds) in self.backlog_waiters.items():
+            if self.backlog.get(seq):
+                # these threads are already notified
+                continue
+            for cond in conds:
+                if cond is not skip:
+                    cond.notify()
+                    return
 
     def nlm_request(self, msg, msg_type,
                     msg_flags=NLM_F_REQUEST | NLM_F_DUMP,
                     terminate=None,
-                    callback=None):
+                    callback=None,
+                    nla_filter=None,
+                    msg_filter=None,
+                    timeout=None,
+                    stream=False):
+        '''
+        Send the request and return the response messages.
+
+        With `nla_filter` only NLA with names from the list
+        are decoded in the response, and with `msg_filter`
+        the messages are filtered before decoding, see `get()`.
+
+        With `timeout` the request fails with `NetlinkTimeoutError`,
+        if not completed in `timeout` seconds, see also `deadline()`.
+
+        When the kernel table changes during a dump, the kernel marks
+        the dump with NLM_F_DUMP_INTR, and the snapshot may be torn.
+        With `dump_retries` set, such dumps are collected completely
+        and restarted up to `dump_retries` times, with the backoff
+        from `dump_backoff` up to `dump_backoff_max` seconds; if all
+        the tries fail, the last result is returned. The counters
+        `dump_interrupts` and `dump_restarts` report the interrupted
+        dumps and the restarts. Streamed dumps, see `nlm_stream()`,
+        are not restarted.
+
+        Being called via a `RequestPipeline`, the routine sends
+        non-dump requests without waiting for the response, and
+        returns nothing, see `pipeline()`.
+        '''
+        pipeline = getattr(self.pipeline_local, 'pipeline', None)
+        # NLM_F_ROOT is NLM_F_REPLACE for new* requests, so dumps
+        # are told apart as requests with NLM_F_ROOT and w/o ACK
+        if pipeline is not None and \
+                (msg_flags & NLM_F_ACK or not msg_flags & NLM_F_ROOT):
+            pipeline.submit(msg, msg_type, msg_flags,
+                            terminate, callback, nla_filter, msg_filter)
+            return
+        dump = msg_flags & NLM_F_DUMP == NLM_F_DUMP
+        if not dump or not self.dump_retries or stream:
+            for msg in self._nlm_request(msg, msg_type, msg_flags,
+                                         terminate, callback,
+                                         nla_filter, msg_filter,
+                                         timeout, {}):
+                yield msg
+            return
+        # collect the whole dump, since an interrupted one is restarted
+        deadline = self._deadline(timeout)
+        delay = self.dump_backoff
+        for retry in range(self.dump_retries + 1):
+            if retry:
+                # drop the rows collected by the message filter
+                reset = getattr(msg_filter, 'reset', None)
+                if reset is not None:
+                    reset()
+                self.dump_restarts += 1
+                time.sleep(delay)
+                delay = min(delay * 2, self.dump_backoff_max)
+            if deadline is not None:
+                timeout = max(0, deadline - monotonic())
+            state = {}
+            msgs = tuple(self._nlm_request(msg, msg_type, msg_flags,
+                                           terminate, callback,
+                                           nla_filter, msg_filter,
+                                           timeout, state))
+            if not state.get('interrupted'):
+                break
+        else:
+            log.warning('Dump %s interrupted after %s retries'
+                        % (msg_type, self.dump_retries))
+        for msg in msgs:
+            yield msg
+
+    def nlm_stream(self, msg, msg_type,
+                   msg_flags=NLM_F_REQUEST | NLM_F_DUMP,
+                   terminate=None,
+                   callback=None,
+                   nla_filter=None,
+                   msg_filter=None,
+                   timeout=None):
+        '''
+        The same as `nlm_request()`, but always returns a generator,
+        regardless of `config.nlm_generator`. The messages are
+        parsed and yielded as they are received, so the memory is
+        bound by one receive buffer, not by the dump size::
 
-        msg_seq = self.addr_pool.alloc()
-        with self.lock[msg_seq]:
-            try:
-                self.put(msg, msg_type, msg_flags, msg_seq=msg_seq)
-                for msg in self.get(msg_seq=msg_seq,
-                                    terminate=terminate,
-                                    callback=callback):
-                    yield msg
+            for msg in ip.nlm_stream(rtmsg(), RTM_GETROUTE):
+                if process(msg):
+                    break
 
-            except Exception:
-                raise
-            finally:
-                # Ban this msg_seq for 0xff rounds
-                #
-                # It's a long story. Modern kernels for RTM_SET.*
-                # operations always return NLMSG_ERROR(0) == success,
-                # even not setting NLM_F_MULTY flag on other response
-                # messages and thus w/o any NLMSG_DONE. So, how to detect
-                # the response end? One can not rely on NLMSG_ERROR on
-                # old kernels, but we have to support them too. Ty, we
-                # just ban msg_seq for several rounds, and NLMSG_ERROR,
-                # being received, will become orphaned and just dropped.
-                #
-                # Hack, but true.
-                self.addr_pool.free(msg_seq, ban=0xff)
+        The consumer may stop early, just closing the generator or
+        dropping it; then the request is cancelled, the rest of the
+        response is dropped by the reader, and the kernel dump is
+        drained before the next dump on the socket, see `cancel()`
+        and `drain()`.
+        '''
+        return self._genlm_request(msg, msg_type, msg_flags,
+                                   terminate, callback,
+                                   nla_filter, msg_filter,
+                                   timeout, stream=True)
+
+    def _nlm_request(self, msg, msg_type, msg_flags, terminate, callback,
+                     nla_filter, msg_filter, timeout, state):
+        # run one request, `state['interrupted']` is set, if the
+        # kernel marked the dump with NLM_F_DUMP_INTR
+        dump = msg_flags & NLM_F_DUMP == NLM_F_DUMP
+        if dump and self.dumps:
+            self.drain(timeout)
+        msg_seq = self.addr_pool.alloc()
+        # the msg_seq is used only by this call, so it needs no lock
+        self.lock.own(msg_seq)
+        if dump:
+            self.dumps.add(msg_seq)
+        try:
+            # register the filters before the request is sent,
+            # the response may be parsed by another thread
+            if nla_filter is not None:
+                nla_filter = frozenset(nla_filter)
+                self.marshal.nla_filters[msg_seq] = nla_filter
+            if msg_filter is not None:
+                self.marshal.msg_filters[msg_seq] = msg_filter
+            self.put(msg, msg_type, msg_flags, msg_seq=msg_seq)
+            response = self._genlm_get(msg_seq=msg_seq,
+                                       terminate=terminate,
+                                       callback=callback,
+                                       nla_filter=nla_filter,
+                                       msg_filter=msg_filter,
+                                       timeout=timeout)
+            for msg in response:
+                yield msg
+            if msg_seq in self.marshal.interrupted:
+                state['interrupted'] = True
+                self.dump_interrupts += 1
+                log.debug('Dump %s interrupted' % msg_seq)
+
+        except GeneratorExit:
+            # the consumer stopped early, see nlm_stream()
+            response.close()
+            self.cancel(msg_seq)
+            raise
+        except Exception:
+            raise
+        finally:
+            if nla_filter is not None:
+                self.marshal.nla_filters.pop(msg_seq, None)
+            if msg_filter is not None:
+                self.marshal.msg_filters.pop(msg_seq, None)
+            # Ban this msg_seq for 0xff rounds
+            #
+            # It's a long story. Modern kernels for RTM_SET.*
+            # operations always return NLMSG_ERROR(0) == success,
+            # even not setting NLM_F_MULTY flag on other response
+            # messages and thus w/o any NLMSG_DONE. So, how to detect
+            # the response end? One can not rely on NLMSG_ERROR on
+            # old kernels, but we have to support them too. Ty, we
+            # just ban msg_seq for several rounds, and NLMSG_ERROR,
+            # being received, will become orphaned and just dropped.
+            #
+            # Hack, but true.
+            self.marshal.interrupted.discard(msg_seq)
+            self.addr_pool.free(msg_seq, ban=0xff)
+            self.lock.disown(msg_seq)
+            if dump:
+                with self.backlog_lock:
+                    # the dump is still running, unless completed
+                    if msg_seq not in self.cancelled:
+                        self.dumps.discard(msg_seq)
 
 
 class BatchAddrPool(object):
@@ -919,24 +1985,84 @@ class NetlinkSocket(NetlinkMixin):
                 # --> monkey patch the socket
                 log.warning('patching socket.recv_into()')
 
-                def patch(data, bsize):
-                    data[0:] = self._sock.recv(bsize)
+                def patch(data, bsize=0, flags=0):
+                    chunk = self._sock.recv(bsize or len(data), flags)
+                    data[:len(chunk)] = chunk
+                    return len(chunk)
                 self._sock.recv_into = patch
             self.setsockopt(SOL_SOCKET, SO_SNDBUF, self._sndbuf)
             self.setsockopt(SOL_SOCKET, SO_RCVBUF, self._rcvbuf)
             if self.all_ns:
                 self.setsockopt(SOL_NETLINK, NETLINK_LISTEN_ALL_NSID, 1)
+            # optional features, the result is saved in capabilities:
+            #
+            # * strict_check -- the kernel filters dumps by the
+            #   request header and NLA (>= 4.20)
+            # * ext_ack -- the kernel error messages (>= 4.12)
+            # * cap_ack -- no request copy in errors (>= 4.3)
+            for (name, option) in (('strict_check', NETLINK_GET_STRICT_CHK),
+                                   ('ext_ack', NETLINK_EXT_ACK),
+                                   ('cap_ack', NETLINK_CAP_ACK)):
+                self.capabilities[name] = False
+                if getattr(self, name):
+                    try:
+                        self.setsockopt(SOL_NETLINK, option, 1)
+                        self.capabilities[name] = True
+                    except (OSError, IOError):
+                        pass
+
+    def recv_ft(self, bufsize=DEFAULT_RCVBUF, flags=0):
+        return self.recv_buffer(bufsize, flags)
+
+    def recv_buffer(self, bufsize, flags=0, buf=None):
+        '''
+        Receive one datagram into a reusable buffer and return
+        a copy of the received data, that is a `bytearray` of
+        the datagram size.
+
+        The buffer, `buf` or the socket receive buffer, grows
+        up to `bufsize` if required and is not shrunk. Unlike
+        `recv(bufsize)`, no `bufsize` bytes object is allocated
+        per datagram.
+
+        The datagram is received into the whole buffer, so a
+        smaller `bufsize` doesn't truncate it, if the buffer has
+        grown already: the kernel sizes dump datagrams after the
+        largest read, e.g. with `bufsize == 0`.
+
+        With `bufsize == -1` the datagram size is peeked with
+        `MSG_PEEK | MSG_TRUNC`, so datagrams of any size are
+        received completely.
+
+        The socket receive buffer is protected by `read_lock`,
+        other threads must use own buffers.
+        '''
+        if buf is None:
+            buf = self._recv_buffer
+            if buf is None:
+                buf = self._recv_buffer = bytearray(DEFAULT_RCVBUF)
+        if bufsize == -1:
+            bufsize = self._sock.recv_into(buf, 4,
+                                           flags | MSG_PEEK | MSG_TRUNC)
+        if len(buf) < bufsize:
+            buf.extend(b'\0' * (bufsize - len(buf)))
+        length = self._sock.recv_into(buf, len(buf), flags)
+        return buf[:length]
+
+    def setsockopt(self, level, optname, value):
+        if level == SOL_SOCKET:
+            # reset the cached SO_RCVBUF value
+            self._rcvbuf_size = None
+        return self._sock.setsockopt(level, optname, value)
 
     def __getattr__(self, attr):
         if attr in ('getsockname', 'getsockopt', 'makefile',
-                    'setsockopt', 'setblocking', 'settimeout',
+                    'setblocking', 'settimeout',
                     'gettimeout', 'shutdown', 'recvfrom',
                     'recvfrom_into', 'fileno'):
             return getattr(self._sock, attr)
         elif attr in ('_sendto', '_recv', '_recv_into'):
             return getattr(self._sock, attr.lstrip("_"))
-        elif attr == "recv_ft":
-            return self._sock.recv
 
         raise AttributeError(attr)
 
@@ -1015,6 +2141,28 @@ class NetlinkSocket(NetlinkMixin):
     def drop_membership(self, group):
         self.setsockopt(SOL_NETLINK, NETLINK_DROP_MEMBERSHIP, group)
 
+    def attach_filter(self, **spec):
+        '''
+        Attach a BPF filter, built from the spec, so the kernel drops
+        irrelevant messages, see `pyroute2.netlink.bpf`::
+
+            ip.bind()
+            ip.attach_filter(msg_types=(RTM_NEWROUTE, RTM_DELROUTE),
+                             table=10)
+
+        The filter replaces the previous one.
+        '''
+        code = nlmsg_filter(self.getsockname()[0], **spec)
+        fstring, self._fprog = compile_bpf(code)
+        self.setsockopt(SOL_SOCKET, SO_ATTACH_FILTER, fstring)
+
+    def detach_filter(self):
+        '''
+        Remove the BPF filter
+        '''
+        self.setsockopt(SOL_SOCKET, SO_DETACH_FILTER, 0)
+        self._fprog = None
+
     def close(self):
         '''
         Correctly close the socket and free all resources.
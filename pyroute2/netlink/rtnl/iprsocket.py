@@ -1,7 +1,7 @@
 
 from pyroute2 import config
 from pyroute2.common import Namespace
-from pyroute2.common import AddrPool
+from pyroute2.common import SeqPool
 from pyroute2.proxy import NetlinkProxy
 from pyroute2.netlink import NETLINK_ROUTE
 from pyroute2.netlink.nlsocket import NetlinkSocket
@@ -22,20 +22,24 @@ else:
 class IPRSocketMixin(object):
 
     def __init__(self, fileno=None, sndbuf=1048576, rcvbuf=1048576,
-                 all_ns=False):
+                 all_ns=False, strict_check=False, ext_ack=False,
+                 cap_ack=False):
         super(IPRSocketMixin, self).__init__(NETLINK_ROUTE, fileno=fileno,
                                              sndbuf=sndbuf, rcvbuf=rcvbuf,
-                                             all_ns=all_ns)
+                                             all_ns=all_ns,
+                                             strict_check=strict_check,
+                                             ext_ack=ext_ack,
+                                             cap_ack=cap_ack)
         self.marshal = MarshalRtnl()
         self._s_channel = None
-        send_ns = Namespace(self, {'addr_pool': AddrPool(0x10000, 0x1ffff),
+        send_ns = Namespace(self, {'addr_pool': SeqPool(0x10000, 0x1ffff),
                                    'monitor': False})
         self._sproxy = NetlinkProxy(policy='return', nl=send_ns)
         self._sproxy.pmap = {rtnl.RTM_NEWLINK: proxy_newlink,
                              rtnl.RTM_SETLINK: proxy_setlink}
         if config.kernel < [3, 3, 0]:
             self._recv_ns = Namespace(self,
-                                      {'addr_pool': AddrPool(0x20000, 0x2ffff),
+                                      {'addr_pool': SeqPool(0x20000, 0x2ffff),
                                        'monitor': False})
             self._sproxy.pmap[rtnl.RTM_DELLINK] = proxy_dellink
             # inject proxy hooks into recv() and...
@@ -46,7 +50,9 @@ class IPRSocketMixin(object):
             self.recv_ft = self._p_recv_ft
 
     def clone(self):
-        return type(self)(sndbuf=self._sndbuf, rcvbuf=self._rcvbuf)
+        return type(self)(sndbuf=self._sndbuf, rcvbuf=self._rcvbuf,
+                          strict_check=self.strict_check,
+                          ext_ack=self.ext_ack, cap_ack=self.cap_ack)
 
     def bind(self, groups=rtnl.RTMGRP_DEFAULTS, **kwarg):
         super(IPRSocketMixin, self).bind(groups, **kwarg)
@@ -62,19 +68,48 @@ class IPRSocketMixin(object):
                 if self._s_channel is not None:
                     return self._s_channel.send(ret['data'])
                 else:
-                    msgs = self.marshal.parse(ret['data'])
-                    for msg in msgs:
-                        seq = msg['header']['sequence_number']
-                        if seq in self.backlog:
-                            self.backlog[seq].append(msg)
-                        else:
-                            self.backlog[seq] = [msg]
+                    # deliver the response as if received from the kernel
+                    self.dispatch(self.marshal.parse(ret['data']))
                     return len(ret['data'])
             else:
                 ValueError('Incorrect verdict')
 
         return self._sendto(msg.data, addr)
 
+    def object_key(self, msg):
+        # the latest link, address, neighbour or route message
+        # describes the object state, see `limit_backlog()`
+        msg_type = msg['header']['type']
+        family = msg.get('family')
+        if msg_type in (rtnl.RTM_NEWLINK, rtnl.RTM_DELLINK):
+            return ('link', family, msg.get('index'))
+        elif msg_type in (rtnl.RTM_NEWADDR, rtnl.RTM_DELADDR):
+            return ('addr', family, msg.get('index'),
+                    msg.get('prefixlen'),
+                    msg.get_attr('IFA_ADDRESS'),
+                    msg.get_attr('IFA_LOCAL'))
+        elif msg_type in (rtnl.RTM_NEWNEIGH, rtnl.RTM_DELNEIGH):
+            if family == config.AF_BRIDGE:
+                # FDB records
+                return ('fdb', msg.get('ifindex'),
+                        msg.get_attr('NDA_LLADDR'),
+                        msg.get_attr('NDA_VLAN'),
+                        msg.get_attr('NDA_DST'))
+            return ('neigh', family, msg.get('ifindex'),
+                    msg.get_attr('NDA_DST'))
+        elif msg_type in (rtnl.RTM_NEWROUTE, rtnl.RTM_DELROUTE):
+            return ('route', family,
+                    msg.get_attr('RTA_TABLE', msg.get('table')),
+                    msg.get('dst_len'),
+                    msg.get('tos'),
+                    msg.get_attr('RTA_DST'),
+                    msg.get_attr('RTA_PRIORITY'))
+        return None
+
+    def batch_gated(self, msg_type):
+        # the proxy may handle requests in the userspace
+        return msg_type in self._sproxy.pmap
+
     def _p_recv_ft(self, bufsize, flags=0):
         data = self._recv_ft(bufsize, flags)
         ret = proxy_linkinfo(data, self._recv_ns)
@@ -8,6 +8,8 @@ from pyroute2.common import AF_MPLS
 from pyroute2.common import hexdump
 from pyroute2.common import map_namespace
 from pyroute2.netlink import nlmsg
+from pyroute2.netlink import NLM_F_ACK
+from pyroute2.netlink import NLM_F_DUMP
 from pyroute2.netlink import nla
 
 RTNH_F_DEAD = 1
@@ -17,6 +19,12 @@ RTNH_F_OFFLOAD = 8
 RTNH_F_LINKDOWN = 16
 (RTNH_F_NAMES, RTNH_F_VALUES) = map_namespace('RTNH_F', globals())
 
+# rtmsg flags
+RTM_F_NOTIFY = 0x100
+RTM_F_CLONED = 0x200
+RTM_F_EQUALIZE = 0x400
+RTM_F_PREFIX = 0x800
+
 LWTUNNEL_ENCAP_NONE = 0
 LWTUNNEL_ENCAP_MPLS = 1
 LWTUNNEL_ENCAP_IP = 2
@@ -412,7 +420,11 @@ class rtmsg(rtmsg_base, nlmsg):
     __slots__ = ()
 
     def encode(self):
-        if self.get('family') == AF_MPLS:
+        flags = self['header'].get('flags', 0)
+        dump = flags & NLM_F_DUMP == NLM_F_DUMP and not flags & NLM_F_ACK
+        # dumps must have the header fields unset, see the
+        # strict check in `RTNL_API._dump_request()`
+        if self.get('family') == AF_MPLS and not dump:
             # force fields
             self['dst_len'] = 20
             self['table'] = 254
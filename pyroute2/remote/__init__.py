@@ -133,9 +133,9 @@ def Server(trnsp_in, trnsp_out):
                 elif cmd['stage'] == 'reconstruct':
                     error = None
                     try:
-                        msg = cmd['argv'][0]()
-                        msg.load(pickle.loads(cmd['argv'][1]))
-                        msg.encode()
+                        # the message is sent encoded, see Client._gate()
+                        msg = cmd['argv'][0](cmd['argv'][1])
+                        msg.decode()
                         ipr.sendto_gate(msg, cmd['argv'][2])
                     except Exception as e:
                         error = e
@@ -179,12 +179,16 @@ class Client(object):
         self.sendto_gate = self._gate
 
     def _gate(self, msg, addr):
+        # send the message in the wire format, it is cheaper
+        # than the dump() dict, see also nlmsg_base.__reduce__()
+        msg.reset()
+        msg.encode()
         with self.cmdlock:
             self.trnsp_out.send({'stage': 'reconstruct',
                                  'cookie': None,
                                  'name': None,
                                  'argv': [type(msg),
-                                          pickle.dumps(msg.dump()),
+                                          msg.data,
                                           addr],
                                  'kwarg': None})
             ret = self.trnsp_in.recv_cmd()
@@ -273,6 +277,11 @@ class RemoteSocket(NetlinkMixin, Client):
         NetlinkMixin.close(self)
         Client.close(self)
 
+    def setsockopt(self, *argv, **kwarg):
+        # reset the cached SO_RCVBUF value, see NetlinkMixin.get()
+        self._rcvbuf_size = None
+        return Client.setsockopt(self, *argv, **kwarg)
+
     def _sendto(self, *argv, **kwarg):
         return Client.sendto(self, *argv, **kwarg)
 
@@ -2972,6 +2972,23 @@ class TestMisc(object):
             with IPDB() as ipdb:
                 ipdb.interfaces.test1984.remove().commit()
 
+    def test_watchdog_index(self):
+        with IPRoute() as ip:
+            (lo, ) = ip.get_links(1)
+        with IPDB() as ipdb:
+            wd0 = ipdb.watchdog('RTM_NEWLINK', ifname='lo')
+            wd1 = ipdb.watchdog('RTM_NEWLINK', ifname=self.ifname)
+            wd2 = ipdb.watchdog('RTM_DELLINK', ifname='lo')
+            # only the watchdogs for the message type and name
+            # are checked
+            assert ipdb._watchdogs.match(lo) == \
+                [x for x in ipdb._watchdogs if x[1] == wd0.cb]
+            ipdb._cbq.put(lo)
+            assert wd0.wait(5)
+            assert not wd1.wait(0.1)
+            assert not wd2.wait(0.1)
+            assert len(ipdb._watchdogs) == 0
+
     def test_global_only_routes(self):
         require_user('root')
         try:
@@ -1,13 +1,26 @@
 import os
 import time
 import errno
+import types
+import select
 import socket
+import threading
 from functools import partial
 from pyroute2 import IPRoute
 from pyroute2 import NetlinkError
 from pyroute2.common import uifname
 from pyroute2.common import AF_MPLS
 from pyroute2.netlink import nlmsg
+from pyroute2.netlink import NLM_F_ACK
+from pyroute2.netlink import NLM_F_DUMP
+from pyroute2.netlink import NLM_F_DUMP_FILTERED
+from pyroute2.netlink import NLMSG_OVERRUN
+from pyroute2.netlink import NLM_F_REQUEST
+from pyroute2.netlink.rtnl import RTM_GETLINK
+from pyroute2.netlink.rtnl import RTM_NEWLINK
+from pyroute2.netlink.rtnl import RTM_NEWADDR
+from pyroute2.netlink.rtnl import RTM_NEWROUTE
+from pyroute2.netlink.rtnl import RTM_DELROUTE
 from pyroute2.netlink.rtnl.req import IPRouteRequest
 from pyroute2.netlink.rtnl.ifinfmsg import ifinfmsg
 from pyroute2.netlink.rtnl.rtmsg import RTNH_F_ONLINK
@@ -110,11 +123,431 @@ class TestMisc(object):
         assert 101 not in self.ip.get_policy_map()
         assert 102 not in self.ip.get_policy_map()
 
+    def test_proxy_response(self):
+        # the userspace proxy responses are dispatched as the
+        # kernel responses, see `IPRSocketMixin._gate()`
+        def plugin(msg, nl):
+            raise OSError(errno.EPERM, 'proxy error')
+
+        self.ip._sproxy.pmap[RTM_NEWLINK] = plugin
+        msg = ifinfmsg()
+        msg['index'] = 1
+        with assert_raises(NetlinkError) as ctx:
+            self.ip.nlm_request(msg, RTM_NEWLINK,
+                                NLM_F_REQUEST | NLM_F_ACK)
+        assert ctx.exception.code == errno.EPERM
+        assert list(self.ip.backlog) == [0]
+
     def test_addrpool_expand(self):
         # see coverage
         for i in range(100):
             self.ip.get_addr()
 
+    def test_nla_filter(self):
+        full = self.ip.get_links()
+        links = self.ip.get_links(nla_filter=('ifname', 'IFLA_MTU'))
+        assert len(links) == len(full)
+        for (link, prime) in zip(links, full):
+            assert set([x[0] for x in link['attrs']]) == \
+                set(['IFLA_IFNAME', 'IFLA_MTU'])
+            assert link.get_attr('IFLA_IFNAME') == \
+                prime.get_attr('IFLA_IFNAME')
+            assert link.get_attr('IFLA_STATS64') is None
+        # NLA used by the match are decoded as well
+        lo = self.ip.get_links(ifname='lo', nla_filter=('mtu', ))
+        assert len(lo) == 1
+        assert lo[0].get_attr('IFLA_MTU') > 0
+        for addr in self.ip.get_addr(nla_filter=('address', )):
+            assert [x[0] for x in addr['attrs']] == ['IFA_ADDRESS']
+        # the filter is not kept after the request
+        assert not self.ip.marshal.nla_filters
+        assert self.ip.get_links()[0].get_attr('IFLA_STATS64') is not None
+
+    def test_msg_filter(self):
+        lo = self.ip.get_links(ifname='lo')
+        assert len(lo) == 1
+        assert lo[0].get_attr('IFLA_IFNAME') == 'lo'
+        assert len(self.ip.get_links(ifname='lo', mtu=1)) == 0
+        assert not self.ip.marshal.msg_filters
+
+    def test_columns(self):
+        links = self.ip.get_links()
+        columns = self.ip.get_links(columns=('index', 'ifname', 'mtu'))
+        assert columns.rows == len(links)
+        assert list(columns['index']) == [x['index'] for x in links]
+        assert columns['ifname'] == [x.get_attr('IFLA_IFNAME')
+                                     for x in links]
+        assert list(columns['mtu']) == [x.get_attr('IFLA_MTU')
+                                        for x in links]
+        lo = self.ip.get_links(ifname='lo', columns=('index', ))
+        assert list(lo['index']) == [1]
+        routes = self.ip.get_routes(table=254, columns=('table', 'oif'))
+        assert set(routes['table']) == set([254])
+
+    def test_dump_filter(self):
+        # the strict check is not enabled by default, so plain
+        # route dumps include the route exceptions
+        assert not self.ip.capabilities['strict_check']
+        for route in self.ip.get_routes():
+            assert not route['header']['flags'] & NLM_F_DUMP_FILTERED
+        with IPRoute(strict_check=True) as ip:
+            if not ip.capabilities['strict_check']:
+                raise SkipTest('strict check is not supported')
+            addrs = ip.get_addr(index=1)
+            assert addrs
+            for addr in addrs:
+                assert addr['index'] == 1
+                assert addr['header']['flags'] & NLM_F_DUMP_FILTERED
+            for route in ip.get_routes(table=255):
+                assert route.get_attr('RTA_TABLE') == 255
+                assert route['header']['flags'] & NLM_F_DUMP_FILTERED
+            # the kernel fails the dump for a missing interface
+            assert len(ip.get_addr(index=0x7fffffff)) == 0
+            assert len(ip.get_routes(oif=0x7fffffff)) == 0
+            # the same with the generator responses
+            from pyroute2 import config
+            config.nlm_generator = True
+            try:
+                with IPRoute(strict_check=True) as gip:
+                    assert len(tuple(gip.get_addr(index=0x7fffffff))) == 0
+                    assert len(tuple(gip.get_routes(oif=0x7fffffff))) == 0
+            finally:
+                config.nlm_generator = False
+            # other dumps pass the strict check
+            assert len(ip.get_links(ifname='lo')) == 1
+            assert len(ip.get_rules()) > 0
+
+    def test_ext_ack(self):
+        for cap_ack in (False, True):
+            with IPRoute(strict_check=True, ext_ack=True,
+                         cap_ack=cap_ack) as ip:
+                if not ip.capabilities['ext_ack'] or \
+                        not ip.capabilities['strict_check'] or \
+                        (cap_ack and not ip.capabilities['cap_ack']):
+                    raise SkipTest('extended ACK is not supported')
+                # the strict check rejects the flags in link requests
+                msg = ifinfmsg()
+                msg['index'] = 1
+                msg['flags'] = 1
+                ret = []
+                ip.put(msg, RTM_GETLINK, NLM_F_REQUEST, msg_seq=42)
+                try:
+                    ip.get(msg_seq=42, callback=ret.append)
+                except NetlinkError as e:
+                    error = e
+                else:
+                    raise AssertionError('NetlinkError expected')
+                assert error.code == errno.EINVAL
+                # the kernel message, not the strerror() fallback
+                assert error.args[1] != os.strerror(error.code)
+                (msg, ) = ret
+                assert msg['header']['ext_ack']['msg'] == error.args[1]
+                if cap_ack:
+                    # the request is not copied to the capped errors
+                    assert 'errmsg' not in msg['header']
+                else:
+                    assert msg['header']['errmsg']['index'] == 1
+
+    def test_bpf_filter(self):
+        require_user('root')
+        with IPRoute() as ip, IPRoute() as ip_links:
+            ip.bind()
+            ip.attach_filter(msg_types=(RTM_NEWROUTE, RTM_DELROUTE),
+                             table=(10, 1000), ifindex=1)
+            ip_links.bind()
+            ip_links.attach_filter(msg_types=RTM_NEWLINK, ifindex=1)
+            # responses to requests pass the filter
+            assert len(ip.get_links()) == len(self.ip.get_links())
+            assert ip.link_lookup(ifname='lo') == [1]
+            # emit link events on lo
+            (lo, ) = self.ip.get_links(1)
+            mtu = lo.get_attr('IFLA_MTU')
+            try:
+                self.ip.link('set', index=1, mtu=mtu - 1)
+            finally:
+                self.ip.link('set', index=1, mtu=mtu)
+            # the matching events are delivered
+            mtus = set()
+            while len(mtus) < 2 and \
+                    select.select([ip_links.fileno()], [], [], 1)[0]:
+                for msg in ip_links.get():
+                    assert msg['header']['type'] == RTM_NEWLINK
+                    assert msg['index'] == 1
+                    mtus.add(msg.get_attr('IFLA_MTU'))
+            assert mtus == set((mtu - 1, mtu))
+            # the rest are dropped in the kernel
+            assert not select.select([ip.fileno()], [], [], 0.1)[0]
+            ip.detach_filter()
+            ip_links.detach_filter()
+
+    def test_bpf_filter_long(self):
+        from pyroute2.netlink.bpf import nlmsg_filter
+        # jumps over 255 instructions don't fit the u8 offsets
+        assert nlmsg_filter(ifindex=list(range(1, 100)))
+        with assert_raises(ValueError):
+            nlmsg_filter(ifindex=list(range(1, 300)))
+
+    def test_callback_index(self):
+        ret = []
+
+        def cb(msg, tag):
+            # the socket is not blocked by callbacks
+            assert not self.ip.read_lock.locked()
+            ret.append((tag, msg['index']))
+
+        self.ip.register_callback(cb, args=('any', ), msg_type=RTM_NEWLINK)
+        self.ip.register_callback(cb, args=('lo', ), msg_type=RTM_NEWLINK,
+                                  key=('ifname', 'lo'))
+        self.ip.register_callback(cb, args=('addr', ), msg_type=RTM_NEWADDR)
+        links = [x['index'] for x in self.ip.get_links()]
+        assert [x[1] for x in ret if x[0] == 'any'] == links
+        assert [x for x in ret if x[0] != 'any'] == [('lo', 1)]
+        for _ in range(3):
+            self.ip.unregister_callback(cb)
+        assert len(self.ip.callbacks) == 0
+
+    def test_deadline(self):
+        from pyroute2 import NetlinkTimeoutError
+        # nobody responds to that msg_seq
+        with assert_raises(NetlinkTimeoutError):
+            self.ip.get(msg_seq=4242, timeout=0.1)
+        with self.ip.deadline(1):
+            assert self.ip.link_lookup(ifname='lo') == [1]
+        for _ in range(3):
+            with self.ip.deadline(0):
+                with assert_raises(NetlinkTimeoutError):
+                    self.ip.get_links()
+            # late responses are dropped, and the cancelled
+            # dump is drained before the next one
+            links = self.ip.get_links()
+            assert len(links) == len(set([x['index'] for x in links]))
+            assert self.ip.backlog == {0: []}
+        self.ip.put(ifinfmsg(), RTM_GETLINK, NLM_F_REQUEST | NLM_F_DUMP,
+                    msg_seq=4243)
+        self.ip.cancel(4243)
+        assert len(self.ip.get(timeout=0.1)) == 0
+        # the async cache sockets
+        with IPRoute() as ip:
+            ip.bind(async_cache=True)
+            # broadcast messages of other sockets are not dropped
+            ip.cancel(4243)
+            msg = ifinfmsg()
+            msg['header']['type'] = RTM_NEWLINK
+            msg['header']['flags'] = 0
+            msg['header']['sequence_number'] = 4243
+            msg['header']['pid'] = ip.epid + 1
+            ip.dispatch([msg])
+            assert msg in ip.get()
+            with assert_raises(NetlinkTimeoutError):
+                ip.get(msg_seq=4242, timeout=0.1)
+            with ip.deadline(1):
+                assert ip.link_lookup(ifname='lo') == [1]
+
+    def test_dump_intr(self):
+        from pyroute2.netlink.columns import Columns
+        links = self.ip.get_links()
+        seqs = []
+
+        def interrupt(count, msg):
+            # mark the first `count` dumps as interrupted
+            seq = msg['header']['sequence_number']
+            if seq not in seqs and len(seqs) < count:
+                seqs.append(seq)
+                self.ip.marshal.interrupted.add(seq)
+            return True
+
+        # no retries by default
+        ret = tuple(self.ip.nlm_request(ifinfmsg(), RTM_GETLINK,
+                                        NLM_F_REQUEST | NLM_F_DUMP,
+                                        msg_filter=partial(interrupt, 1)))
+        assert len(ret) == len(links)
+        assert self.ip.dump_interrupts == 1
+        assert self.ip.dump_restarts == 0
+        # restart the interrupted dumps
+        self.ip.dump_retries = 3
+        del seqs[:]
+        ret = tuple(self.ip.nlm_request(ifinfmsg(), RTM_GETLINK,
+                                        NLM_F_REQUEST | NLM_F_DUMP,
+                                        msg_filter=partial(interrupt, 2)))
+        assert len(ret) == len(links)
+        assert self.ip.dump_interrupts == 3
+        assert self.ip.dump_restarts == 2
+        # give up after dump_retries and return the last result
+        del seqs[:]
+        ret = tuple(self.ip.nlm_request(ifinfmsg(), RTM_GETLINK,
+                                        NLM_F_REQUEST | NLM_F_DUMP,
+                                        msg_filter=partial(interrupt, 8)))
+        assert len(ret) == len(links)
+        assert self.ip.dump_restarts == 5
+        # restarted dumps drop the collected columns
+        columns = Columns(ifinfmsg, ('index', ))
+        append = columns.append
+        del seqs[:]
+
+        def collect(msg):
+            interrupt(1, msg)
+            return append(msg)
+        columns.append = collect
+        self.ip.get_links(columns=columns)
+        assert columns.rows == len(links)
+        assert list(columns['index']) == [x['index'] for x in links]
+        assert self.ip.dump_restarts == 6
+
+    def test_backlog_limit(self):
+        links = self.ip.get_links()
+        index = [x['index'] for x in links]
+        # drop the oldest messages, the consumer gets a marker
+        self.ip.limit_backlog(2, policy='drop')
+        self.ip.dispatch(links)
+        assert len(self.ip.backlog[0]) == 2
+        assert self.ip.backlog[0].drops == len(links) - 2
+        msgs = self.ip.get()
+        assert msgs[0]['header']['type'] == NLMSG_OVERRUN
+        assert [x['index'] for x in msgs[1:]] == index[-2:]
+        # keep the latest message per object
+        self.ip.limit_backlog(len(links), policy='coalesce')
+        self.ip.dispatch(self.ip.get_links())
+        self.ip.dispatch(self.ip.get_links())
+        assert self.ip.backlog[0].coalesced == len(links)
+        assert self.ip.backlog[0].drops == 0
+        assert [x['index'] for x in self.ip.get()] == index
+        # spill the oldest messages to disk
+        self.ip.limit_backlog(1, policy='spill')
+        self.ip.dispatch(links)
+        assert self.ip.backlog[0].spilled == len(links) - 1
+        assert [x['index'] for x in self.ip.get()] == index
+        # the spill ring drops the oldest records
+        size = max([x['header']['length'] for x in links]) + 1
+        self.ip.limit_backlog(1, policy='spill', spill_size=size)
+        self.ip.dispatch(links)
+        assert self.ip.backlog[0].drops == len(links) - 2
+        msgs = self.ip.get()
+        assert msgs[0]['header']['type'] == NLMSG_OVERRUN
+        assert [x['index'] for x in msgs[1:]] == index[-2:]
+        # w/o a consumer waiting for the Zero queue the requests
+        # don't block
+        self.ip.limit_backlog(2, policy='block')
+        self.ip.dispatch(links)
+        assert self.ip.backlog[0].full()
+        assert self.ip.backlog[0].drops == 0
+        assert self.ip.link_lookup(ifname='lo') == [1]
+        assert len(self.ip.get()) == len(links)
+        self.ip.limit_backlog(None)
+        assert self.ip.buffer_queue.maxsize == 0
+
+    def test_stream(self):
+        links = self.ip.get_links()
+        routes = self.ip.get_routes()
+        ret = self.ip.get_links(stream=True)
+        assert isinstance(ret, types.GeneratorType)
+        assert [x['index'] for x in ret] == [x['index'] for x in links]
+        ret = self.ip.get_routes(stream=True, table=254)
+        assert isinstance(ret, types.GeneratorType)
+        assert len(tuple(ret)) == len([x for x in routes
+                                       if x.get_attr('RTA_TABLE') == 254])
+        assert len(tuple(self.ip.get_addr(index=0x7fffffff,
+                                          stream=True))) == 0
+        # stop early: the rest of the dump is dropped
+        for _ in range(3):
+            for route in self.ip.get_routes(stream=True):
+                break
+            assert len(self.ip.get_links()) == len(links)
+            assert self.ip.backlog == {0: []}
+        # columns ignore the stream mode
+        columns = self.ip.get_links(columns=('index', ), stream=True)
+        assert columns.rows == len(links)
+
+    def test_bufsize(self):
+        links = [x['index'] for x in self.ip.get_links()]
+        for bufsize in (-1, 0, 8192):
+            self.ip.put(ifinfmsg(), RTM_GETLINK, NLM_F_REQUEST | NLM_F_DUMP,
+                        msg_seq=42)
+            msgs = self.ip.get(bufsize=bufsize, msg_seq=42)
+            assert [x['index'] for x in msgs] == links
+        # the receive buffer is reused
+        buf = self.ip._recv_buffer
+        self.ip.get_links()
+        assert self.ip._recv_buffer is buf
+        # SO_RCVBUF is cached until setsockopt()
+        assert self.ip._rcvbuf_size > 0
+        self.ip.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
+        assert self.ip._rcvbuf_size is None
+
+    def test_threads(self):
+        errors = []
+
+        def t():
+            try:
+                for _ in range(50):
+                    assert self.ip.link('get', index=1)[0]['index'] == 1
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=t) for _ in range(8)]
+        [x.start() for x in threads]
+        [x.join() for x in threads]
+        assert not errors
+        assert not self.ip.backlog_waiters
+        assert not self.ip.read_lock.locked()
+
+    def test_pipeline(self):
+        with self.ip.pipeline(window=4) as pipeline:
+            futures = [pipeline.link('get', index=1) for _ in range(10)]
+            missing = pipeline.link('get', index=0x7fffffff)
+            # dumps are not pipelined
+            assert len(pipeline.get_links()) == len(self.ip.get_links())
+        assert all([x.done() for x in futures])
+        assert futures[-1].result()[0]['index'] == 1
+        assert isinstance(missing.exception(), NetlinkError)
+        assert len(tuple(pipeline.results())) == 11
+        assert list(self.ip.backlog) == [0]
+
+    def test_pipeline_generator(self):
+        from pyroute2 import config
+        config.nlm_generator = True
+        try:
+            with IPRoute() as ip:
+                with ip.pipeline() as pipeline:
+                    future = pipeline.link('get', index=1)
+                    assert len(pipeline.get_links()) == \
+                        len(self.ip.get_links())
+                assert future.result()[0]['index'] == 1
+        finally:
+            config.nlm_generator = False
+
+    def test_batch(self):
+        with self.ip.batch(bufsize=128) as batch:
+            futures = [batch.link('get', index=1) for _ in range(10)]
+            batch.link('get', index=0x7fffffff)
+            # dumps are done immediately
+            assert len(batch.get_links()) == len(self.ip.get_links())
+        status = batch.status()
+        assert len(status) == 11
+        assert status[:10] == [None] * 10
+        assert isinstance(status[10], NetlinkError)
+        assert futures[-1].result()[0]['index'] == 1
+        assert list(self.ip.backlog) == [0]
+
+    def test_overrun(self):
+        recv_ft = self.ip.recv_ft
+        errors = [socket.error(errno.ENOBUFS, 'No buffer space available')]
+
+        def overflow(*argv, **kwarg):
+            if errors:
+                raise errors.pop()
+            return recv_ft(*argv, **kwarg)
+
+        self.ip.bind()
+        self.ip.recv_ft = overflow
+        msgs = self.ip.get()
+        assert len(msgs) == 1
+        assert msgs[0]['header']['type'] == NLMSG_OVERRUN
+        assert msgs[0]['event'] == 'NLMSG_OVERRUN'
+        assert msgs[0]['groups'] == self.ip.groups
+        assert self.ip.overruns == 1
+        # requests work after the overrun
+        assert self.ip.link('get', index=1)[0]['index'] == 1
+
     def test_nla_compare(self):
         lvalue = self.ip.get_links()
         rvalue = self.ip.get_links()
@@ -130,6 +563,157 @@ def _callback(msg, obj):
     obj.cb_counter += 1
 
 
+class TestAsync(object):
+
+    def setup(self):
+        require_python(3)
+        import asyncio
+        from pyroute2.iproute.aio import AsyncIPRoute
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.ip = AsyncIPRoute()
+
+    def teardown(self):
+        import asyncio
+        self.ip.close()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_get_links(self):
+        with IPRoute() as ip:
+            links = ip.get_links()
+        assert len(self.run(self.ip.get_links())) == len(links)
+        (lo, ) = self.run(self.ip.get_links(1))
+        assert lo.get_attr('IFLA_IFNAME') == 'lo'
+        assert self.run(self.ip.link_lookup(ifname='lo')) == [1]
+        columns = self.run(self.ip.get_links(columns=('index', )))
+        assert list(columns['index']) == [x['index'] for x in links]
+
+    def test_concurrent(self):
+        import asyncio
+        coros = [self.ip.get_links() for _ in range(10)] + \
+            [self.ip.link('get', index=1) for _ in range(10)]
+        ret = self.run(asyncio.gather(*coros))
+        assert len(set([len(x) for x in ret[:10]])) == 1
+        assert all([x[0]['index'] == 1 for x in ret[10:]])
+        assert not self.ip.requests
+
+    def test_error(self):
+        with assert_raises(NetlinkError):
+            self.run(self.ip.link('get', index=0x7fffffff))
+        assert not self.ip.requests
+
+    def test_run_once(self):
+        from pyroute2.iproute.aio import RTNLProxy
+        calls = []
+        get_links = RTNLProxy.get_links
+
+        def counter(proxy, *argv, **kwarg):
+            calls.append(argv)
+            return get_links(proxy, *argv, **kwarg)
+
+        RTNLProxy.get_links = counter
+        try:
+            assert self.run(self.ip.link_lookup(ifname='lo')) == [1]
+        finally:
+            RTNLProxy.get_links = get_links
+        assert len(calls) == 1
+
+    def test_timeout(self):
+        from pyroute2 import NetlinkTimeoutError
+        with assert_raises(NetlinkTimeoutError):
+            self.run(self.ip.get_links(timeout=0))
+        assert not self.ip.requests
+        with IPRoute() as ip:
+            links = ip.get_links()
+        assert len(self.run(self.ip.get_links(timeout=5))) == len(links)
+        # cancel a running dump, the next dump waits for the rest
+        # of the cancelled one and does not fail with EBUSY
+        with assert_raises(NetlinkTimeoutError):
+            self.run(self.ip.nlm_request(ifinfmsg(), RTM_GETLINK,
+                                         timeout=0))
+        assert len(self.run(self.ip.get_links(timeout=5))) == len(links)
+        assert not self.ip.drains
+
+
+class TestPool(object):
+
+    def setup(self):
+        from pyroute2 import IPRoutePool
+        self.ip = IPRoutePool(max_size=3, timeout=1)
+
+    def teardown(self):
+        self.ip.close()
+
+    def test_threads(self):
+        with IPRoute() as ip:
+            links = len(ip.get_links())
+        ret = []
+
+        def t():
+            for _ in range(5):
+                ret.append(len(self.ip.get_links()))
+
+        threads = [threading.Thread(target=t) for _ in range(10)]
+        [x.start() for x in threads]
+        [x.join() for x in threads]
+        assert ret == [links] * 50
+        assert 0 < self.ip.size <= 3
+        assert len(self.ip.idle) == self.ip.size
+
+    def test_error(self):
+        with assert_raises(NetlinkError):
+            self.ip.link('get', index=0x7fffffff)
+        # the socket is returned to the pool
+        assert len(self.ip.idle) == self.ip.size == 1
+
+    def test_timeout(self):
+        from pyroute2.iproute.pool import PoolTimeout
+        with self.ip.socket() as s1, self.ip.socket(), self.ip.socket():
+            assert s1.link_lookup(ifname='lo') == [1]
+            with assert_raises(PoolTimeout):
+                self.ip.get_links()
+        assert len(self.ip.idle) == 3
+
+    def test_stream(self):
+        with IPRoute() as ip:
+            links = ip.get_links()
+        assert len(list(self.ip.get_links(stream=True))) == len(links)
+        assert len(self.ip.idle) == self.ip.size == 1
+        # not started generators return the socket as well
+        for _ in range(4):
+            ret = self.ip.get_links(stream=True)
+            assert self.ip.size == 1 and not self.ip.idle
+            del ret
+            assert len(self.ip.idle) == self.ip.size == 1
+        ret = self.ip.get_links(stream=True)
+        next(ret)
+        ret.close()
+        assert len(self.ip.idle) == self.ip.size == 1
+        assert len(self.ip.get_links()) == len(links)
+
+    def test_stream_deadline(self):
+        from pyroute2 import NetlinkTimeoutError
+        with self.ip.deadline(0.1):
+            ret = self.ip.get_links(stream=True)
+        # the deadline applies to the steps after the call as well
+        time.sleep(0.2)
+        with assert_raises(NetlinkTimeoutError):
+            next(ret)
+        assert len(self.ip.idle) == self.ip.size == 1
+
+    def test_shrink(self):
+        self.ip.idle_timeout = 0
+        with self.ip.socket(), self.ip.socket():
+            pass
+        time.sleep(0.01)
+        self.ip.get_links()
+        assert self.ip.size == 1
+
+
 class TestIPRoute(object):
 
     def setup(self):
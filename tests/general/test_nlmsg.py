@@ -1,5 +1,15 @@
+import array
+import pickle
+import struct
+from pyroute2 import config
 from pyroute2.common import load_dump
+from pyroute2.netlink import load_wire
+from pyroute2.netlink import nla
 from pyroute2.netlink import nlmsg
+from pyroute2.netlink import nlmsg_base
+from pyroute2.netlink import nlmsg_view
+from pyroute2.netlink.columns import Columns
+from pyroute2.netlink.rtnl.ifaddrmsg import ifaddrmsg
 from pyroute2.netlink.rtnl.iprsocket import MarshalRtnl
 from pyroute2.netlink.nl80211 import MarshalNl80211
 
@@ -32,6 +42,78 @@ class TestAttrs(object):
         assert self.msg.get_nested('B', 'D', 'G') is None
         assert self.msg.get_nested('C', 'D', 'E') is None
 
+    def test_index_update(self):
+        assert self.msg.get_attrs('A') == [2, 3, 4]
+        self.msg['attrs'].append(['A', 5])
+        assert self.msg.get_attrs('A') == [2, 3, 4, 5]
+        self.msg['attrs'].insert(0, ['A', 1])
+        assert self.msg.get_attr('A') == 1
+        del self.msg['attrs'][0]
+        self.msg['attrs'][0] = ['C', 8]
+        assert self.msg.get_attrs('A') == [3, 4, 5]
+        assert self.msg.get_attr('C') == 8
+        self.msg['attrs'].remove(['C', 8])
+        assert self.msg.get_attr('C') is None
+        self.msg['attrs'] = [['A', 9]]
+        assert self.msg.get_attrs('A') == [9]
+
+
+class mixed_fields(nla):
+    fields = (('family', 'B'),
+              ('__pad', '3x'),
+              ('index', 'I'),
+              ('port', '>H'),
+              ('proto', '>H'),
+              ('pair', '2I'),
+              ('mac', '=6s'),
+              ('offset', 'L'))
+
+
+class TestCompiledDecoder(object):
+
+    def setup(self):
+        payload = struct.pack('B3xI', 10, 2) + \
+            struct.pack('>HH', 8080, 17) + \
+            struct.pack('=II6s', 1, 2, b'\x00\x11\x22\x33\x44\x55') + \
+            struct.pack('L', 42)
+        self.data = struct.pack('HH', len(payload) + 4, 1) + payload
+
+    def decode(self, decoder=None):
+        msg = mixed_fields(self.data)
+        if decoder is not None:
+            msg._ft_decode = decoder
+        msg.decode()
+        return msg
+
+    def test_segments(self):
+        segments = mixed_fields.compile_fields()
+        assert segments[0][0].format in ('=B3xI', b'=B3xI')
+        assert segments[1][0].format in ('>HH', b'>HH')
+
+    def test_compare_generic(self):
+        compiled = self.decode()
+        generic = self.decode(nlmsg_base._ft_decode_generic)
+        assert dict(compiled) == dict(generic)
+        assert compiled['__pad'] == ()
+        assert compiled['port'] == 8080
+        assert compiled['pair'] == (1, 2)
+        assert compiled['offset'] == 42
+
+    def test_encode(self):
+        msg = mixed_fields()
+        msg['header']['type'] = 1
+        msg.setvalue(dict(self.decode()))
+        msg.encode()
+        assert msg.data[:msg.length] == self.data
+        assert msg.length == len(self.data)
+
+    def test_encode_variable(self):
+        msg = nla.asciiz()
+        msg['header']['type'] = 2
+        msg.setvalue('test')
+        msg.encode()
+        assert msg.data == struct.pack('HH5s3x', 9, 2, b'test')
+
 
 class TestNL(object):
 
@@ -70,6 +152,162 @@ class TestRtnl(TestNL):
         self.load_data(fname='decoder/gre_01', packets=2)
 
 
+class TestRtnlView(object):
+
+    def parse(self, fname, view):
+        with open(fname, 'r') as f:
+            return MarshalRtnl().parse(load_dump(f), view=view)
+
+    def test_addrmsg_ipv4(self):
+        full = self.parse('decoder/addrmsg_ipv4', view=False)
+        view = self.parse('decoder/addrmsg_ipv4', view=True)
+        assert isinstance(view[0], nlmsg_view)
+        assert view[0]['index'] == full[0]['index']
+        assert view[0]['prefixlen'] == full[0]['prefixlen']
+        assert view[0]['header'] == full[0]['header']
+        for name in ('IFA_ADDRESS', 'IFA_LABEL', 'IFA_CACHEINFO'):
+            assert view[0].get_attr(name) == full[0].get_attr(name)
+        assert view[0].get_attr('IFA_BROADCAST', 42) == 42
+        assert view[0].dump() == full[0].dump()
+
+    def test_gre(self):
+        full = self.parse('decoder/gre_01', view=False)
+        view = self.parse('decoder/gre_01', view=True)
+        assert len(view) == len(full) == 2
+        for idx in range(2):
+            path = ('IFLA_LINKINFO', 'IFLA_INFO_DATA')
+            assert view[idx].get_nested(*path) == full[idx].get_nested(*path)
+            assert view[idx].get_attr('IFLA_IFNAME') == \
+                full[idx].get_attr('IFLA_IFNAME')
+            assert view[idx] == full[idx]
+            assert view[idx].raw.tobytes() == \
+                bytes(full[idx].data[full[idx].offset:
+                                     full[idx].offset + full[idx].length])
+        assert view[0].get_attrs('IFLA_IFNAME') == \
+            full[0].get_attrs('IFLA_IFNAME')
+
+
+class TestMsgFilter(object):
+
+    def parse(self, fname, **kwarg):
+        marshal = MarshalRtnl()
+        marshal.msg_filters[1426284873] = lambda x: \
+            isinstance(x, nlmsg_view) and \
+            x.get_attr('IFLA_IFNAME') == kwarg['ifname']
+        with open(fname, 'r') as f:
+            return marshal.parse(load_dump(f))
+
+    def test_match(self):
+        msgs = self.parse('decoder/gre_01', ifname='mgre0')
+        assert len(msgs) == 2
+        assert not isinstance(msgs[0], nlmsg_view)
+        assert msgs[0].get_attr('IFLA_IFNAME') == 'mgre0'
+
+    def test_skip(self):
+        # the control message is not filtered
+        msgs = self.parse('decoder/gre_01', ifname='gre2')
+        assert len(msgs) == 1
+        assert msgs[0]['header']['type'] == 2
+
+
+class TestColumns(object):
+
+    names = ('index', 'prefixlen', 'IFA_ADDRESS', 'flags', 'IFA_BROADCAST')
+
+    def parse(self, view):
+        columns = Columns(ifaddrmsg, self.names)
+        with open('decoder/addrmsg_ipv4', 'r') as f:
+            for msg in MarshalRtnl().parse(load_dump(f), view=view):
+                assert columns.append(msg) is False
+        return columns
+
+    def test_types(self):
+        columns = self.parse(view=True)
+        assert columns.rows == 1
+        assert isinstance(columns['index'], array.array)
+        assert isinstance(columns['flags'], array.array)
+        assert isinstance(columns['IFA_ADDRESS'], list)
+        assert columns['IFA_ADDRESS'] == ['127.0.0.1']
+        assert columns['IFA_BROADCAST'] == [None]
+        assert list(columns['flags']) == [128]
+
+    def test_scalar_nla(self):
+        columns = Columns(ifaddrmsg, ('IFA_FLAGS', ))
+        with open('decoder/addrmsg_ipv4', 'r') as f:
+            for msg in MarshalRtnl().parse(load_dump(f), view=True):
+                columns.append(msg)
+        assert isinstance(columns['IFA_FLAGS'], array.array)
+        assert list(columns['IFA_FLAGS']) == [128]
+
+    def test_compare(self):
+        assert self.parse(view=True) == self.parse(view=False)
+
+
+class TestPool(object):
+
+    def parse(self):
+        with open('decoder/gre_01', 'r') as f:
+            return MarshalRtnl().parse(load_dump(f))
+
+    def test_reuse(self):
+        msg = self.parse()[0]
+        prime = msg.dump()
+        linkinfo = msg.get_attr('IFLA_LINKINFO')
+        msg.release()
+        msg.release()
+        assert msg.get('index') is None
+        again = self.parse()[0]
+        assert again is msg
+        assert again.dump() == prime
+        assert again.get_attr('IFLA_LINKINFO') is linkinfo
+        again.release()
+
+    def test_size(self):
+        size = config.nlm_pool_size
+        config.nlm_pool_size = 0
+        try:
+            msg = self.parse()[0]
+            msg.release()
+            assert self.parse()[0] is not msg
+        finally:
+            config.nlm_pool_size = size
+
+
+class TestPickle(object):
+
+    def parse(self, view=False):
+        with open('decoder/gre_01', 'r') as f:
+            return MarshalRtnl().parse(load_dump(f), view=view)
+
+    def test_wire(self):
+        msg = self.parse()[0]
+        msg['header']['target'] = 'localhost'
+        assert msg.__reduce__()[0] is load_wire
+        again = pickle.loads(pickle.dumps(msg))
+        assert type(again) is type(msg)
+        assert again == msg
+        assert again.dump() == msg.dump()
+        assert again['event'] == 'RTM_NEWLINK'
+        assert again['header']['target'] == 'localhost'
+        assert again.get_nested('IFLA_LINKINFO', 'IFLA_INFO_KIND') == 'gre'
+
+    def test_changed(self):
+        msg = self.parse()[0]
+        msg['index'] = 42
+        assert pickle.loads(pickle.dumps(msg))['index'] == 42
+        msg['attrs'].append(['IFLA_ADDRESS', '00:11:22:33:44:55'])
+        assert msg.wire_data() is None
+        again = pickle.loads(pickle.dumps(msg))
+        assert again.get_attrs('IFLA_ADDRESS')[-1] == '00:11:22:33:44:55'
+
+    def test_view(self):
+        view = self.parse(view=True)[0]
+        again = pickle.loads(pickle.dumps(view))
+        assert not isinstance(again, nlmsg_view)
+        assert again == view
+        assert again['event'] == 'RTM_NEWLINK'
+
+
 class TestNl80211(TestNL):
 
     marshal = MarshalNl80211
@@ -1,4 +1,5 @@
 from pyroute2.common import AddrPool
+from pyroute2.common import SeqPool
 from pyroute2.common import hexdump
 from pyroute2.common import hexload
 from pyroute2.common import uuid32
@@ -108,6 +109,71 @@ class TestAddrPool(object):
             pass
 
 
+class TestSeqPool(object):
+
+    def test_alloc(self):
+
+        sp = SeqPool(minaddr=1, maxaddr=1024)
+        assert set([sp.alloc() for _ in range(1024)]) == set(range(1, 1025))
+        assert sp.allocated == 1024
+        try:
+            sp.alloc()
+        except KeyError:
+            pass
+        else:
+            raise AssertionError('KeyError expected')
+
+    def test_ring(self):
+
+        sp = SeqPool(minaddr=1, maxaddr=16)
+        f = sp.alloc()
+        sp.free(f)
+        # the freed number is reused after a full round
+        assert [sp.alloc() for _ in range(15)] == list(range(2, 17))
+        assert sp.alloc() == f
+
+    def test_ban(self):
+
+        sp = SeqPool(minaddr=1, maxaddr=4)
+        f = sp.alloc()
+        sp.free(f, ban=10)
+        for _ in range(9):
+            sp.free(sp.alloc())
+            assert sp.allocated == 1
+        sp.free(sp.alloc())
+        assert sp.allocated == 0
+
+    def test_release(self):
+
+        sp = SeqPool(minaddr=1, maxaddr=4, release=2)
+        sp.alloc()
+        sp.alloc()
+        assert sp.allocated == 2
+        sp.alloc()
+        assert sp.allocated == 2
+
+    def test_callback(self):
+
+        released = []
+        sp = SeqPool(minaddr=1, maxaddr=4, callback=released.append)
+        f = sp.alloc()
+        sp.free(f, ban=2)
+        sp.free(sp.alloc())
+        assert released == []
+        sp.free(sp.alloc())
+        assert released == [f]
+
+    def test_free_fail(self):
+
+        sp = SeqPool(minaddr=1, maxaddr=1024)
+        try:
+            sp.free(1)
+        except KeyError:
+            pass
+        else:
+            raise AssertionError('KeyError expected')
+
+
 class TestCommon(object):
 
     def test_hexdump(self):